@@ -0,0 +1,114 @@
+"""
+Compares SBERT embedding storage precisions against the float32 baseline.
+
+Reports memory, similarity throughput and top-10 overlap for each precision.
+Run from the `api` directory:
+
+    python -m benchmarks.embedding_precision --posts 50000
+    python -m benchmarks.embedding_precision --from-file ../api/data/sbert_matrix.npz
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from embedding_quantization import QuantizedEmbeddings, SUPPORTED_PRECISIONS
+
+TOP_K = 10
+
+
+def synthetic_embeddings(
+    n_posts: int, dim: int, n_topics: int, seed: int
+) -> np.ndarray:
+    """Clustered random vectors, roughly mimicking posts grouped by destination/theme."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    assignments = rng.integers(0, n_topics, size=n_posts)
+    noise = rng.standard_normal((n_posts, dim)).astype(np.float32)
+    return topics[assignments] + 0.8 * noise
+
+
+def top_k_indices(similarities: np.ndarray, k: int) -> np.ndarray:
+    return np.argpartition(-similarities, k, axis=1)[:, :k]
+
+
+def run(embeddings: np.ndarray, n_queries: int, repeats: int, seed: int) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(
+        len(embeddings), size=min(n_queries, len(embeddings)), replace=False
+    )
+    queries = embeddings[query_rows]
+
+    baseline_top_k = None
+    results = []
+
+    for precision in SUPPORTED_PRECISIONS:
+        store = QuantizedEmbeddings.from_float(embeddings, precision)
+
+        store.cosine_similarity(queries[:1])  # Warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            similarities = store.cosine_similarity(queries)
+        elapsed = (time.perf_counter() - start) / repeats
+
+        top_k = top_k_indices(similarities, TOP_K)
+        if baseline_top_k is None:
+            baseline_top_k = top_k
+
+        overlap = np.mean(
+            [
+                len(np.intersect1d(row, base)) / TOP_K
+                for row, base in zip(top_k, baseline_top_k)
+            ]
+        )
+
+        results.append(
+            {
+                "precision": precision,
+                "memory_mb": store.nbytes / 1024**2,
+                "queries_per_second": len(queries) / elapsed,
+                "rows_scored_per_second": len(queries) * len(store) / elapsed,
+                "top10_overlap": float(overlap),
+            }
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--from-file", help="Use an existing sbert_matrix.npz instead")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.from_file:
+        embeddings = QuantizedEmbeddings.load(args.from_file).to_float32()
+    else:
+        embeddings = synthetic_embeddings(args.posts, args.dim, args.topics, args.seed)
+
+    results = run(embeddings, args.queries, args.repeats, args.seed)
+
+    print(f"📊 {len(embeddings)} embeddings x {embeddings.shape[1]} dims")
+    print(
+        f"{'precision':>10} {'memory MB':>10} {'queries/s':>10} {'top-10 overlap':>15}"
+    )
+    for r in results:
+        print(
+            f"{r['precision']:>10} {r['memory_mb']:>10.1f} "
+            f"{r['queries_per_second']:>10.1f} {r['top10_overlap']:>15.3f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
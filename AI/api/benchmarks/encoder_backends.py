@@ -0,0 +1,105 @@
+"""
+Compares SBERT encoder backends on the same posts.
+
+Checks that every backend produces embeddings equivalent to the PyTorch default
+(per-post cosine and top-10 neighbour overlap) and reports encoding throughput.
+Run from the `api` directory:
+
+    python -m benchmarks.encoder_backends --posts 2000 --threads 4
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from constants import PATH_POSTS_CSV
+from sbert_encoders import create_sbert_encoder
+
+TOP_K = 10
+BACKENDS = [("pytorch", False), ("onnx", False), ("onnx", True)]
+
+
+def load_texts(n_posts: int) -> list[str]:
+    df = pd.read_csv(PATH_POSTS_CSV)
+    texts = (df["Caption"].fillna("") + " " + df["Body"].fillna("")).tolist()
+    if not texts:
+        raise SystemExit(f"❌ No posts found in {PATH_POSTS_CSV}")
+    # Repeat the corpus if it is smaller than requested
+    return (texts * (n_posts // len(texts) + 1))[:n_posts]
+
+
+def top_k_neighbours(embeddings: np.ndarray, k: int) -> np.ndarray:
+    similarities = embeddings @ embeddings.T
+    np.fill_diagonal(similarities, -np.inf)
+    k = min(k, len(embeddings) - 1)
+    return np.argpartition(-similarities, k, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    texts = load_texts(args.posts)
+    baseline = None
+    baseline_neighbours = None
+    results = []
+
+    for backend, quantized in BACKENDS:
+        encoder = create_sbert_encoder(
+            backend, quantized, batch_size=args.batch_size, num_threads=args.threads
+        )
+        encoder.encode(texts[: args.batch_size])  # Warm-up
+
+        start = time.perf_counter()
+        embeddings = encoder.encode(texts)
+        elapsed = time.perf_counter() - start
+
+        if baseline is None:
+            baseline = embeddings
+            baseline_neighbours = top_k_neighbours(embeddings, TOP_K)
+
+        cosines = np.sum(embeddings * baseline, axis=1)
+        neighbours = top_k_neighbours(embeddings, TOP_K)
+        overlap = np.mean(
+            [
+                len(np.intersect1d(row, base)) / neighbours.shape[1]
+                for row, base in zip(neighbours, baseline_neighbours)
+            ]
+        )
+
+        results.append(
+            {
+                "backend": encoder.name,
+                "posts_per_second": len(texts) / elapsed,
+                "mean_cosine_to_pytorch": float(cosines.mean()),
+                "min_cosine_to_pytorch": float(cosines.min()),
+                "top10_overlap": float(overlap),
+            }
+        )
+
+    print(
+        f"📊 {len(texts)} posts, batch size {args.batch_size}, threads {args.threads}"
+    )
+    print(
+        f"{'backend':>10} {'posts/s':>9} {'mean cos':>9} {'min cos':>9} {'top-10':>7}"
+    )
+    for r in results:
+        print(
+            f"{r['backend']:>10} {r['posts_per_second']:>9.1f} "
+            f"{r['mean_cosine_to_pytorch']:>9.4f} {r['min_cosine_to_pytorch']:>9.4f} "
+            f"{r['top10_overlap']:>7.3f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
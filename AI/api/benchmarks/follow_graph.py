@@ -0,0 +1,153 @@
+"""
+Load phase of the user similarity job: full-table dicts vs the compact follow graph.
+
+For each scale, generates a corpus (see `synthetic_corpus`), loads it into the SQLite
+stand-in and reports the time of:
+
+    dicts         get_user_followings_map + get_post_user_mapping (the former load)
+    graph_full    load_follow_graph with no saved graph (first run)
+    graph_idle    load_follow_graph again, nothing changed in between
+    graph_delta   ... after --delta new follows and new posts
+    graph_unfollow ... after --delta unfollows (only their followers are reloaded)
+
+and checks the graph against the dicts. Memory is what the dicts retain (tracemalloc)
+vs the size of the graph arrays. Run from the `api` directory:
+
+    python -m benchmarks.follow_graph --posts 100000 --users 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+import numpy as np
+from benchmarks.synthetic_corpus import SqliteStandIn, SyntheticCorpus
+
+
+def timed(step: str, run) -> tuple[dict, object]:
+    start = time.perf_counter()
+    value = run()
+    return {"step": step, "seconds": time.perf_counter() - start}, value
+
+
+def retained_mib(run) -> float:
+    """Memory still held by the result of `run` (traced separately: tracing is slow)."""
+    tracemalloc.start()
+    value = run()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return retained / 2**20
+
+
+def run_scale(args, n_posts: int, modules: dict) -> list[dict]:
+    import follow_graph
+
+    database_operations = modules["database_operations"]
+    corpus = SyntheticCorpus.generate(
+        n_posts,
+        n_users=args.users or None,
+        follows_per_user=args.follows_per_user,
+        words_per_post=5,
+        likes_per_user=0,
+        seed=args.seed,
+    )
+    rng = np.random.default_rng(args.seed)
+    steps = []
+
+    with tempfile.TemporaryDirectory(prefix="follow-graph-bench-") as workdir:
+        database = SqliteStandIn(os.path.join(workdir, "bench.sqlite"))
+        database.load(corpus)
+        database_operations.engine = database.engine
+        path = os.path.join(workdir, "follow_graph.npz")
+
+        def load_dicts():
+            return (
+                database_operations.get_user_followings_map(),
+                database_operations.get_post_user_mapping(),
+            )
+
+        def load_graph():
+            return follow_graph.load_follow_graph(path)
+
+        step, (followings, post_users) = timed("dicts", load_dicts)
+        steps.append(step)
+
+        follow_graph._graph = None
+        step, graph = timed("graph_full", load_graph)
+        steps.append(step)
+        check(graph, followings, post_users)
+        del followings, post_users
+
+        step, graph = timed("graph_idle", load_graph)
+        steps.append(step)
+
+        # Follows between users not yet following each other, and posts by them
+        users = corpus.user_ids
+        pairs = rng.integers(len(users), size=(args.delta * 2, 2))
+        known = {(f["UserIdFollowing"], f["UserIdFollowed"]) for f in corpus.follows}
+        new_follows = []
+        for a, b in pairs:
+            pair = (users[a], users[b])
+            if a != b and pair not in known and len(new_follows) < args.delta:
+                known.add(pair)
+                new_follows.append(
+                    {"UserIdFollowing": pair[0], "UserIdFollowed": pair[1]}
+                )
+        database.follow(new_follows)
+        database.insert_posts(corpus.new_posts(args.delta, 5, seed=args.seed + 1))
+        step, graph = timed("graph_delta", load_graph)
+        steps.append(step)
+        check(graph, *load_dicts())
+
+        database.unfollow(new_follows)
+        step, graph = timed("graph_unfollow", load_graph)
+        steps.append(step)
+        check(graph, *load_dicts())
+
+        steps.append({"step": "dicts_memory", "mib": retained_mib(load_dicts)})
+        steps.append({"step": "graph_memory", "mib": graph.nbytes / 2**20})
+        follow_graph._graph = None
+
+    return steps
+
+
+def check(graph, followings: dict, post_users: dict):
+    for user_id, followed in followings.items():
+        assert set(graph.followed(user_id).tolist()) == followed, user_id
+    assert graph.n_follows == sum(len(followed) for followed in followings.values())
+
+    posts_by_user = defaultdict(set)
+    for post_id, user_id in post_users.items():
+        posts_by_user[user_id].add(post_id)
+    grouped = graph.posts_by_user()
+    assert {user: set(posts) for user, posts in grouped.items()} == posts_by_user
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--posts", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--users", type=int, help="Default: one user per 10 posts")
+    parser.add_argument("--follows-per-user", type=float, default=20.0)
+    parser.add_argument("--delta", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import database_operations
+
+    modules = {"database_operations": database_operations}
+    for n_posts in args.posts:
+        print(f"📊 {n_posts} posts")
+        for step in run_scale(args, n_posts, modules):
+            if "mib" in step:
+                print(f"{step['step']:>14}  {step['mib']:8.1f} MiB")
+            else:
+                print(f"{step['step']:>14}  {step['seconds']:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
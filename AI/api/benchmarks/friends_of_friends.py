@@ -0,0 +1,81 @@
+"""
+Friends-of-friends candidates (see `friends_of_friends`) on large synthetic follow graphs.
+
+Each user follows a Poisson(--follows-per-user) number of accounts picked with a
+Zipf-like popularity (a few accounts have a large share of all followers), and
+--spam-accounts users follow --spam-degree accounts each, the high-degree case the
+intermediary cap is for. Reports the time per run, the users left without any
+candidate and the mean candidates per user. Run from the `api` directory:
+
+    python -m benchmarks.friends_of_friends --users 100000 300000
+"""
+
+import argparse
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def synthetic_graph(args, n_users: int):
+    from follow_graph import FollowGraph
+
+    rng = np.random.default_rng(args.seed)
+    degrees = rng.poisson(args.follows_per_user, size=n_users)
+    spam = rng.choice(n_users, size=min(args.spam_accounts, n_users), replace=False)
+    degrees[spam] = args.spam_degree
+
+    popularity = 1 / np.arange(1, n_users + 1) ** args.popularity_exponent
+    popularity = rng.permutation(popularity / popularity.sum())
+    followers = np.repeat(np.arange(n_users), degrees)
+    followed = rng.choice(n_users, size=len(followers), p=popularity)
+
+    adjacency = csr_matrix(
+        (np.ones(len(followers), dtype=np.int8), (followers, followed)),
+        shape=(n_users, n_users),
+    )
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    adjacency.sum_duplicates()
+    adjacency.sort_indices()
+    user_ids = np.array([f"user-{i:08d}" for i in range(n_users)])
+    return FollowGraph(
+        user_ids,
+        adjacency.indptr.astype(np.int64),
+        adjacency.indices.astype(np.int32),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, nargs="+", default=[100000, 300000])
+    parser.add_argument("--follows-per-user", type=float, default=20.0)
+    parser.add_argument("--popularity-exponent", type=float, default=0.8)
+    parser.add_argument("--spam-accounts", type=int, default=20)
+    parser.add_argument("--spam-degree", type=int, default=5000)
+    parser.add_argument("--max-degree", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from constants import FOF_MAX_INTERMEDIARY_DEGREE
+    from friends_of_friends import friends_of_friends
+
+    max_degree = args.max_degree or FOF_MAX_INTERMEDIARY_DEGREE
+    for n_users in args.users:
+        graph = synthetic_graph(args, n_users)
+        start = time.perf_counter()
+        candidates, _ = friends_of_friends(graph, max_degree=max_degree)
+        seconds = time.perf_counter() - start
+
+        found = (candidates >= 0).sum(axis=1)
+        print(
+            f"📊 {n_users} users, {graph.n_follows} follows, "
+            f"max degree {max_degree}: {seconds:.2f} s, "
+            f"{(found == 0).mean():.2%} without candidates, "
+            f"{found.mean():.1f} candidates per user"
+        )
+
+
+if __name__ == "__main__":
+    main()
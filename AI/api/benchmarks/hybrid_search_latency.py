@@ -0,0 +1,101 @@
+"""
+Per-query latency of hybrid (postings + dense re-scoring) vs full-scan semantic search.
+
+Builds a synthetic travel corpus with random embeddings, so only retrieval cost is
+measured (query encoding is excluded). Run from the `api` directory:
+
+    python -m benchmarks.hybrid_search_latency --posts 10000 100000
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from lexical_index import LexicalIndex
+from semantic_search import SemanticSearchIndex
+
+DESTINATIONS = ["paris", "rome", "lisbon", "tokyo", "bali", "zermatt", "cusco", "oslo"]
+THEMES = ["hiking", "museum", "beach", "food", "nightlife", "surf", "castle", "market"]
+FILLER = [f"word{i}" for i in range(5000)]
+
+KEYWORD_QUERIES = [
+    "paris museum",
+    "surf lisbon",
+    "zermatt hiking",
+    "tokyo food market",
+    "rome castle",
+]
+
+
+def synthetic_corpus(n_posts: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    destinations = rng.choice(DESTINATIONS, n_posts)
+    themes = rng.choice(THEMES, n_posts)
+    bodies = [
+        " ".join(rng.choice(FILLER, 40)) + f" {theme} {theme}" for theme in themes
+    ]
+    df = pd.DataFrame(
+        {
+            "PostId": [str(i) for i in range(n_posts)],
+            "Caption": [f"{t} trip" for t in themes],
+            "Body": bodies,
+            "Location": destinations,
+            "Tags": themes,
+        }
+    )
+    embeddings = rng.standard_normal((n_posts, dim)).astype(np.float32)
+    return df, embeddings
+
+
+def time_queries(fn, repeats: int) -> float:
+    """Returns the mean latency in milliseconds over all keyword queries."""
+    fn(KEYWORD_QUERIES[0])  # Warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in KEYWORD_QUERIES:
+            fn(query)
+    return (time.perf_counter() - start) * 1000 / (repeats * len(KEYWORD_QUERIES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for n_posts in args.posts:
+        df, embeddings = synthetic_corpus(n_posts, args.dim, seed=42)
+        vectorizer = TfidfVectorizer(stop_words="english")
+        vectorizer.fit(df["Caption"] + " " + df["Body"])
+        index = SemanticSearchIndex.from_arrays(
+            df["PostId"], embeddings, LexicalIndex.build(df, vectorizer)
+        )
+        query_embedding = embeddings[0]
+
+        semantic_ms = time_queries(
+            lambda q: index.search(query_embedding.reshape(1, -1), 10), args.repeats
+        )
+        hybrid_ms = time_queries(
+            lambda q: index.search_hybrid(q, query_embedding, 10), args.repeats
+        )
+        results.append(
+            {"posts": n_posts, "semantic_ms": semantic_ms, "hybrid_ms": hybrid_ms}
+        )
+
+    print(f"{'posts':>8} {'semantic ms':>12} {'hybrid ms':>10}")
+    for r in results:
+        print(f"{r['posts']:>8} {r['semantic_ms']:>12.2f} {r['hybrid_ms']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: parse-failure rate and wasted generation time with and without JSON repair.
+
+Runs single-shot generations against a stub Ollama server that breaks `--invalid-rate`
+of its outputs (code fences, trailing commas, surrounding prose, truncation or
+unrecoverable garbage), first with strict json.loads and no retry (the old behaviour),
+then with repair and one regeneration. Run from the `api` directory:
+
+    python -m benchmarks.itinerary_json_repair --runs 50 --invalid-rate 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from benchmarks.stub_ollama import MALFORMATIONS, StubOllamaServer
+
+
+async def run_setting(label: str, repair: bool, retries: int, args) -> dict:
+    import itinerary_generator
+    from generation_stats import GenerationStats
+
+    itinerary_generator.LLM_JSON_REPAIR = repair
+    itinerary_generator.LLM_JSON_RETRIES = retries
+    stats = itinerary_generator.generation_stats = GenerationStats()
+
+    failed_requests = 0
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        try:
+            await itinerary_generator._generate_itinerary("Paris", args.days, [])
+        except ValueError:
+            failed_requests += 1
+
+    return {
+        "setting": label,
+        "requests": args.runs,
+        "failed_requests": failed_requests,
+        "wall_seconds": time.perf_counter() - start,
+        **stats.snapshot(),
+    }
+
+
+async def main_async(args):
+    stub = StubOllamaServer(
+        chars_per_second=args.chars_per_second,
+        invalid_rate=args.invalid_rate,
+        malformations=MALFORMATIONS,
+    ).start()
+    os.environ["OLLAMA_HOST"] = stub.url
+
+    results = [
+        await run_setting("strict", repair=False, retries=0, args=args),
+        await run_setting("repair+retry", repair=True, retries=1, args=args),
+    ]
+
+    stub.stop()
+
+    print(
+        f"{'setting':>13} {'failed reqs':>12} {'parse fail':>11} {'unusable':>9} "
+        f"{'retries':>8} {'gen s':>7} {'wasted s':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['setting']:>13} {r['failed_requests']:>5}/{r['requests']:<6} "
+            f"{r['parse_failure_rate']:>11.1%} {r['unusable_rate']:>9.1%} "
+            f"{r['retries']:>8} {r['generation_seconds']:>7.1f} {r['wasted_seconds']:>9.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--invalid-rate", type=float, default=0.3)
+    parser.add_argument("--chars-per-second", type=float, default=20000.0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Load test: similarity-endpoint latency while itinerary generations are running.
+
+Starts a stub Ollama server, fires concurrent /generate-itinerary requests at the app
+and probes /similar-posts at the same time. Redis is replaced with fakeredis so only
+event-loop behaviour is measured. Run from the `api` directory:
+
+    python -m benchmarks.itinerary_load --generations 12 --generation-seconds 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+async def probe(http, seconds: float) -> np.ndarray:
+    """Sequential /similar-posts requests for `seconds`, returns latencies in ms."""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await http.get("/similar-posts/bench-post")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def summarize(label: str, latencies: np.ndarray) -> dict:
+    return {
+        "phase": label,
+        "requests": int(len(latencies)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+    }
+
+
+async def main_async(args):
+    import fakeredis
+    import httpx
+
+    stub = StubOllamaServer(args.generation_seconds).start()
+    os.environ["OLLAMA_HOST"] = stub.url
+
+    import main
+    from itinerary_cache import itinerary_cache
+
+    itinerary_cache.enabled = False  # Every request should reach the model
+
+    main.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    main.redis_client.set("similar:bench-post", ",".join(str(i) for i in range(10)))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as http:
+        idle = await probe(http, args.probe_seconds)
+
+        generations = [
+            asyncio.create_task(
+                http.post(
+                    "/generate-itinerary",
+                    json={"destination": "Paris", "days": 3, "preferences": []},
+                )
+            )
+            for _ in range(args.generations)
+        ]
+        await asyncio.sleep(0.05)
+        busy = await probe(http, args.probe_seconds)
+        responses = await asyncio.gather(*generations)
+
+    stub.stop()
+
+    statuses = {}
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    results = {
+        "probes": [summarize("idle", idle), summarize("generating", busy)],
+        "generation_statuses": statuses,
+    }
+
+    print(f"{'phase':>11} {'reqs':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for r in results["probes"]:
+        print(
+            f"{r['phase']:>11} {r['requests']:>6} {r['p50_ms']:>8.2f} "
+            f"{r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}"
+        )
+    print(f"Generation responses by status: {statuses}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--generations", type=int, default=12)
+    parser.add_argument("--generation-seconds", type=float, default=3.0)
+    parser.add_argument("--probe-seconds", type=float, default=2.0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
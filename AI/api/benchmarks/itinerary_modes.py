@@ -0,0 +1,87 @@
+"""
+Benchmark: single-shot vs parallel per-day itinerary generation.
+
+Runs both ITINERARY_GENERATION_MODEs against a stub Ollama server whose generation
+time is proportional to the output length and which serves `--parallel` generations
+at once (like OLLAMA_NUM_PARALLEL). `--invalid-rate` truncates that share of outputs
+to show the effect of per-day retries. Run from the `api` directory:
+
+    python -m benchmarks.itinerary_modes --days 3 7 10 --parallel 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+async def run_mode(mode: str, days: int, runs: int) -> dict:
+    import itinerary_generator
+
+    itinerary_generator.ITINERARY_GENERATION_MODE = mode
+    latencies, failures = [], 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            itinerary = await itinerary_generator.generate_itinerary("Paris", days, [])
+            assert len(itinerary["days"]) == days
+            latencies.append((time.perf_counter() - start) * 1000)
+        except ValueError:
+            failures += 1
+
+    return {
+        "mode": mode,
+        "days": days,
+        "runs": runs,
+        "failures": failures,
+        "mean_ms": float(np.mean(latencies)) if latencies else None,
+    }
+
+
+async def main_async(args):
+    stub = StubOllamaServer(
+        chars_per_second=args.chars_per_second,
+        parallel=args.parallel,
+        invalid_rate=args.invalid_rate,
+    ).start()
+    os.environ["OLLAMA_HOST"] = stub.url
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.parallel)
+
+    from itinerary_cache import itinerary_cache
+
+    itinerary_cache.enabled = False  # Every request should reach the model
+
+    results = []
+    for days in args.days:
+        for mode in ("single", "parallel"):
+            results.append(await run_mode(mode, days, args.runs))
+
+    stub.stop()
+
+    print(f"{'mode':>9} {'days':>5} {'failed':>7} {'mean ms':>9}")
+    for r in results:
+        mean = f"{r['mean_ms']:>9.0f}" if r["mean_ms"] is not None else f"{'-':>9}"
+        print(f"{r['mode']:>9} {r['days']:>5} {r['failures']:>3}/{r['runs']:<3} {mean}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 10])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--chars-per-second", type=float, default=2000.0)
+    parser.add_argument("--invalid-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: time to first itinerary day over SSE vs the blocking endpoint.
+
+Starts a stub Ollama server that streams its output over `--generation-seconds`, then
+measures /generate-itinerary (full response) and /generate-itinerary/stream (first
+`day` event, and `done`). The app is served by uvicorn on a local port because the
+in-process ASGI transport buffers whole responses. Run from the `api` directory:
+
+    python -m benchmarks.itinerary_streaming --days 5 --generation-seconds 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+async def time_blocking(http, payload: dict) -> dict:
+    start = time.perf_counter()
+    response = await http.post("/generate-itinerary", json=payload)
+    response.raise_for_status()
+    total = (time.perf_counter() - start) * 1000
+    return {
+        "endpoint": "blocking",
+        "first_day_ms": total,
+        "total_ms": total,
+        "days": len(response.json()["days"]),
+    }
+
+
+async def time_streaming(http, payload: dict) -> dict:
+    start = time.perf_counter()
+    first_day = None
+    days = 0
+    event = None
+
+    async with http.stream(
+        "POST", "/generate-itinerary/stream", json=payload
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: ") and event == "day":
+                days += 1
+                if first_day is None:
+                    first_day = (time.perf_counter() - start) * 1000
+            elif line.startswith("data: ") and event == "error":
+                raise RuntimeError(line)
+
+    total = (time.perf_counter() - start) * 1000
+    return {
+        "endpoint": "stream",
+        "first_day_ms": first_day,
+        "total_ms": total,
+        "days": days,
+    }
+
+
+async def main_async(args):
+    import httpx
+    import uvicorn
+
+    stub = StubOllamaServer(args.generation_seconds).start()
+    os.environ["OLLAMA_HOST"] = stub.url
+
+    import main
+    from itinerary_cache import itinerary_cache
+
+    itinerary_cache.enabled = False  # Every request should reach the model
+
+    server = uvicorn.Server(
+        uvicorn.Config(main.app, port=args.port, log_level="warning", lifespan="off")
+    )
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    payload = {"destination": "Paris", "days": args.days, "preferences": []}
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.port}", timeout=None
+    ) as http:
+        results = [
+            await time_blocking(http, payload),
+            await time_streaming(http, payload),
+        ]
+
+    server.should_exit = True
+    await serving
+    stub.stop()
+
+    print(f"{'endpoint':>9} {'days':>5} {'first day ms':>13} {'total ms':>9}")
+    for r in results:
+        print(
+            f"{r['endpoint']:>9} {r['days']:>5} {r['first_day_ms']:>13.0f} {r['total_ms']:>9.0f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--generation-seconds", type=float, default=4.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: first itinerary request after startup with and without the model preload.
+
+Uses a stub Ollama server that takes `--load-seconds` to load the model on first use.
+Reports end-to-end latency of the first request and the cold/warm time-to-first-token
+metric recorded by the LLM client. Run from the `api` directory:
+
+    python -m benchmarks.llm_warmup --load-seconds 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+async def first_request(preload: bool, args) -> dict:
+    import llm_client
+    import itinerary_generator
+    from generation_stats import FirstTokenStats
+
+    stub = StubOllamaServer(args.generation_seconds, load_seconds=args.load_seconds)
+    stub.start()
+    llm_client.client = llm_client.AsyncClient(host=stub.url)
+    stats = llm_client.first_token_stats = FirstTokenStats()
+
+    preload_seconds = await llm_client.warm_up_model() if preload else 0.0
+
+    start = time.perf_counter()
+    await itinerary_generator._generate_itinerary("Paris", 3, [])
+    latency = time.perf_counter() - start
+    stub.stop()
+
+    return {
+        "preload": preload,
+        "preload_seconds": preload_seconds,
+        "first_request_seconds": latency,
+        "first_token": stats.snapshot(),
+    }
+
+
+async def main_async(args):
+    os.environ["LLM_KEEP_ALIVE_PING_MINUTES"] = "0"
+
+    results = [await first_request(False, args), await first_request(True, args)]
+
+    print(f"{'preload':>8} {'preload s':>10} {'1st request s':>14} {'first token':>20}")
+    for r in results:
+        state = "cold" if r["first_token"]["cold"]["count"] else "warm"
+        first_token = f"{r['first_token'][state]['mean_seconds']:.2f}s ({state})"
+        print(
+            f"{str(r['preload']):>8} {r['preload_seconds']:>10.2f} "
+            f"{r['first_request_seconds']:>14.2f} {first_token:>20}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--load-seconds", type=float, default=5.0)
+    parser.add_argument("--generation-seconds", type=float, default=1.0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Partitioned full rebuild (see `partitioned_similarity`) with 1 and N worker processes.
+
+For each scale, generates a corpus (see `synthetic_corpus`), loads it into the SQLite
+stand-in and times:
+
+    single        the three initialize_* startpoints in this process
+    workers=N     run_coordinator with N `python -m partitioned_similarity worker`
+                  processes on a local Redis stand-in (fakeredis over TCP)
+
+and reports, per worker count, the overlap of the stored top-TOP_N_SIMILAR_POSTS lists
+with the single-process ones (the SBERT calibration range is estimated from a sample
+before the blocks run, so a few near-ties may order differently). With one CPU the
+worker runs only show the overhead of the queue; speed-up needs a core per worker.
+Run from the `api` directory:
+
+    python -m benchmarks.partitioned_similarity --posts 2000 --workers 1 2 4
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.pipeline import HashingEncoder
+from benchmarks.synthetic_corpus import SqliteStandIn, SyntheticCorpus
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_redis_server():
+    """fakeredis served over TCP on a free port, so worker processes can reach it."""
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"redis://{host}:{port}/0"
+
+
+def stored_lists(redis_client, post_ids, top_n: int, chunk: int = 200) -> dict:
+    # Chunked: fakeredis over TCP cannot send very large replies in one write
+    values = []
+    for start in range(0, len(post_ids), chunk):
+        keys = [f"similar:{post_id}" for post_id in post_ids[start : start + chunk]]
+        values.extend(redis_client.mget(keys))
+    return {
+        post_id: value.split(",")[:top_n] if value else []
+        for post_id, value in zip(post_ids, values)
+    }
+
+
+def overlap(reference: dict, candidate: dict) -> float:
+    shares = [
+        len(set(similar) & set(candidate.get(post_id, []))) / len(similar)
+        for post_id, similar in reference.items()
+        if similar
+    ]
+    return sum(shares) / len(shares)
+
+
+def run_scale(args, n_posts: int, modules: dict) -> dict:
+    import fakeredis
+    import redis
+    from constants import TOP_N_SIMILAR_POSTS
+
+    posts = modules["post_similarity_handlers"]
+    partitioned = modules["partitioned_similarity"]
+    corpus = SyntheticCorpus.generate(
+        n_posts, words_per_post=args.words_per_post, seed=args.seed
+    )
+    post_ids = [p["PostId"] for p in corpus.posts]
+    result = {"posts": n_posts, "runs": []}
+
+    with tempfile.TemporaryDirectory(prefix="partitioned-bench-") as workdir:
+        database = SqliteStandIn(os.path.join(workdir, "bench.sqlite"))
+        database.load(corpus)
+        for name in ("database_operations", "utils"):
+            modules[name].engine = database.engine
+
+        cwd = os.getcwd()
+        try:
+            # Single process, on its own server so the runs do not share lists
+            api_dir = os.path.join(workdir, "single", "api")
+            os.makedirs(os.path.join(api_dir, "data"))
+            os.chdir(api_dir)
+            posts.redis_client = fakeredis.FakeRedis(
+                server=fakeredis.FakeServer(), decode_responses=True
+            )
+            start = time.perf_counter()
+            posts.initialize_TFIDF_post_similarity_startpoint()
+            posts.initialize_SBERT_post_similarity_startpoint()
+            posts.initialize_combined_similarity_redis_startpoint()
+            seconds = time.perf_counter() - start
+            reference = stored_lists(posts.redis_client, post_ids, TOP_N_SIMILAR_POSTS)
+            result["runs"].append({"run": "single", "seconds": seconds})
+
+            for n_workers in args.workers:
+                server, url = start_redis_server()
+                api_dir = os.path.join(workdir, f"workers-{n_workers}", "api")
+                os.makedirs(os.path.join(api_dir, "data"))
+                os.chdir(api_dir)
+                jobs = os.path.join(api_dir, "data", "partition_jobs")
+                posts.redis_client = redis.Redis.from_url(url, decode_responses=True)
+
+                workers = [
+                    subprocess.Popen(
+                        [sys.executable, "-m", "partitioned_similarity", "worker"]
+                        + ["--redis-url", url, "--directory", jobs],
+                        cwd=API_DIR,
+                        env={**os.environ, "LOG_LEVEL": "WARNING"},
+                    )
+                    for _ in range(n_workers)
+                ]
+                try:
+                    start = time.perf_counter()
+                    partitioned.run_coordinator(
+                        redis.Redis.from_url(url),
+                        jobs,
+                        args.block_size,
+                        write_matrices=not args.no_matrices,
+                    )
+                    seconds = time.perf_counter() - start
+                    stored = stored_lists(
+                        posts.redis_client, post_ids, TOP_N_SIMILAR_POSTS
+                    )
+                finally:
+                    for worker in workers:
+                        worker.terminate()
+                        worker.wait()
+                    server.shutdown()
+                    server.server_close()
+
+                result["runs"].append(
+                    {
+                        "run": f"workers={n_workers}",
+                        "seconds": seconds,
+                        "overlap": overlap(reference, stored),
+                    }
+                )
+        finally:
+            os.chdir(cwd)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--posts", type=int, nargs="+", default=[2000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument("--words-per-post", type=int, default=40)
+    parser.add_argument(
+        "--no-matrices",
+        action="store_true",
+        help="Skip the dense similarity CSVs in the partitioned runs",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import database_operations
+    import partitioned_similarity
+    import post_similarity_handlers
+    import sbert_encoders
+    import utils
+
+    sbert_encoders._encoder = HashingEncoder()
+    modules = {
+        "database_operations": database_operations,
+        "utils": utils,
+        "post_similarity_handlers": post_similarity_handlers,
+        "partitioned_similarity": partitioned_similarity,
+    }
+
+    for n_posts in args.posts:
+        scale = run_scale(args, n_posts, modules)
+        print(f"📊 {scale['posts']} posts")
+        for run in scale["runs"]:
+            line = f"{run['run']:>12}  {run['seconds']:8.2f} s"
+            if "overlap" in run:
+                line += f"  top-N overlap {run['overlap']:.3f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
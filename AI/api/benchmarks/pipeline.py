@@ -0,0 +1,413 @@
+"""
+End-to-end benchmark of the similarity pipeline on a synthetic corpus.
+
+For each scale, generates a corpus (see `synthetic_corpus`), loads it into a SQLite
+stand-in for SQL Server and points `database_operations`/`utils` at it, replaces the
+module Redis clients with one fakeredis server, and times:
+
+    init          the three initialize_* startpoints (TF-IDF, SBERT, Redis)
+    insert_tick   update_similarity_for_posts with --tick-size new posts
+    update_tick   ... with --tick-size edited posts
+    delete_tick   ... with --tick-size deleted posts
+    users         update_similarity_for_users
+    exclusions    refresh_viewer_exclusions (own/liked/saved post sets)
+    fallbacks     refresh_fallback_posts, after --tick-size posts are added that the
+                  similarity jobs have not seen yet
+    read_posts    GET /similar-posts/{id}, sequential requests
+    read_viewer   GET /similar-posts/{id}?viewer_id=..., filtered in one Lua call
+    read_new      GET /similar-posts/{id} of the unseen posts (fallback lists)
+    read_304      GET /similar-posts/{id} with the ETag of a previous read (304s)
+    read_users    GET /similar-users/{id}, sequential requests
+
+Each step also reports its per-stage breakdown from the `ai_stage_duration_seconds`
+metric. Data files go to a temporary directory, never to `api/data`. The pipeline keeps
+dense post x post matrices, so scales whose matrices do not fit in --memory-budget-gb
+skip the pipeline steps (and read endpoints are served from synthetic Redis lists).
+
+By default posts are embedded with a fast hashing stand-in for SBERT, so the timings
+measure the pipeline rather than the model; use --encoder configured for the real one.
+Run from the `api` directory:
+
+    python -m benchmarks.pipeline --posts 1000 10000 100000 --json pipeline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import zlib
+import numpy as np
+from benchmarks.synthetic_corpus import SqliteStandIn, SyntheticCorpus
+from sbert_encoders import SbertEncoder
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_STEPS = ["init", "insert_tick", "update_tick", "delete_tick", "users"]
+
+
+class HashingEncoder(SbertEncoder):
+    """
+    Stand-in for SBERT: each token maps to a fixed random vector and a text embeds to
+    the normalized sum. Same-topic posts share tokens, so they still end up similar.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 384, buckets: int = 1 << 14, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.table = rng.standard_normal((buckets, dim)).astype(np.float32)
+        self.buckets = buckets
+
+    def encode(self, texts) -> np.ndarray:
+        texts = [str(t) for t in texts]
+        embeddings = np.zeros((len(texts), self.table.shape[1]), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = [
+                zlib.crc32(t.encode()) % self.buckets for t in text.lower().split()
+            ]
+            if tokens:
+                embeddings[i] = self.table[tokens].sum(axis=0)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+def stage_totals() -> dict:
+    """Cumulative seconds per pipeline stage, from the stage-duration metric."""
+    from observability import STAGE_DURATION
+
+    totals = {}
+    for metric in STAGE_DURATION.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_sum"):
+                key = f"{sample.labels['pipeline']}.{sample.labels['stage']}"
+                totals[key] = sample.value
+    return totals
+
+
+def timed(step: str, run) -> dict:
+    before = stage_totals()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    after = stage_totals()
+    stages = {
+        name: round(total - before.get(name, 0.0), 4)
+        for name, total in after.items()
+        if total - before.get(name, 0.0) > 0
+    }
+    return {"step": step, "seconds": seconds, "stages": stages}
+
+
+def dense_matrix_gb(n_posts: int) -> float:
+    """Rough peak memory of the pipeline: a few float64 post x post matrices at once."""
+    return 6 * n_posts**2 * 8 / 1024**3
+
+
+def time_reads(
+    app,
+    path_prefix: str,
+    ids: list[str],
+    n_requests: int,
+    query: str = "",
+    revalidate: bool = False,
+) -> dict:
+    import asyncio
+    import httpx
+
+    async def run():
+        latencies = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as http:
+            etags = {}
+            if revalidate:
+                # Clients that kept the previous response send back its ETag
+                for path in {f"{path_prefix}/{i}{query}" for i in ids[:n_requests]}:
+                    etags[path] = (await http.get(path)).headers["ETag"]
+            for i in range(n_requests):
+                path = f"{path_prefix}/{ids[i % len(ids)]}{query}"
+                headers = {"If-None-Match": etags[path]} if path in etags else {}
+                start = time.perf_counter()
+                response = await http.get(path, headers=headers)
+                if response.is_error:  # A 304 is not an error here
+                    response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+        return np.array(latencies)
+
+    latencies = asyncio.run(run())
+    return {
+        "requests": n_requests,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "requests_per_second": float(n_requests / (latencies.sum() / 1000)),
+    }
+
+
+def run_scale(args, n_posts: int, modules: dict) -> dict:
+    import fakeredis
+
+    corpus = SyntheticCorpus.generate(
+        n_posts,
+        n_users=args.users or None,
+        follows_per_user=args.follows_per_user,
+        words_per_post=args.words_per_post,
+        seed=args.seed,
+    )
+    result = {
+        "posts": n_posts,
+        "users": len(corpus.user_ids),
+        "follows": len(corpus.follows),
+        "steps": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="pipeline-bench-") as workdir:
+        # Data paths are relative ("../api/data/..."), so a scratch `api` cwd redirects them
+        api_dir = os.path.join(workdir, "api")
+        os.makedirs(os.path.join(api_dir, "data"))
+        if args.encoder == "configured":
+            for name in ("sbert_model", "sbert_model_onnx"):
+                source = os.path.join(API_DIR, "data", name)
+                if os.path.exists(source):
+                    os.symlink(source, os.path.join(api_dir, "data", name))
+
+        database = SqliteStandIn(os.path.join(workdir, "bench.sqlite"))
+        database.load(corpus)
+        for name in ("database_operations", "utils"):
+            modules[name].engine = database.engine
+        modules["follow_graph"]._graph = None  # Cached from the previous scale
+
+        server = fakeredis.FakeServer()
+        for name in (
+            "post_similarity_handlers",
+            "user_similarity_handlers",
+            "viewer_exclusions",
+            "fallback_lists",
+            "main",
+        ):
+            modules[name].redis_client = fakeredis.FakeRedis(
+                server=server, decode_responses=True
+            )
+        redis_client = modules["main"].redis_client
+
+        posts = modules["post_similarity_handlers"]
+        users = modules["user_similarity_handlers"]
+        cwd = os.getcwd()
+        os.chdir(api_dir)
+        try:
+            needed_gb = dense_matrix_gb(n_posts)
+            if needed_gb > args.memory_budget_gb:
+                reason = (
+                    f"dense similarity matrices need ~{needed_gb:.0f} GB, "
+                    f"budget is {args.memory_budget_gb:.0f} GB"
+                )
+                for step in PIPELINE_STEPS:
+                    result["steps"].append({"step": step, "skipped": reason})
+                fill_synthetic_lists(redis_client, corpus, args.seed)
+            else:
+                run_pipeline_steps(
+                    args, corpus, database, posts, users, modules, result
+                )
+            result["steps"].append(
+                timed(
+                    "exclusions", modules["viewer_exclusions"].refresh_viewer_exclusions
+                )
+            )
+
+            new_posts = corpus.new_posts(
+                args.tick_size, args.words_per_post, seed=args.seed + 4
+            )
+            database.insert_posts(new_posts)
+            result["steps"].append(
+                timed("fallbacks", modules["fallback_lists"].refresh_fallback_posts)
+            )
+
+            result["redis_keys"] = redis_client.dbsize()
+            post_ids = [p["PostId"] for p in corpus.posts]
+            new_post_ids = [p["PostId"] for p in new_posts]
+            viewer = f"?viewer_id={corpus.user_ids[0]}"
+            for step, prefix, ids, query, revalidate in (
+                ("read_posts", "/similar-posts", post_ids, "", False),
+                ("read_viewer", "/similar-posts", post_ids, viewer, False),
+                ("read_new", "/similar-posts", new_post_ids, "", False),
+                ("read_304", "/similar-posts", post_ids, "", True),
+                ("read_users", "/similar-users", corpus.user_ids, "", False),
+            ):
+                result["steps"].append(
+                    {
+                        "step": step,
+                        **time_reads(
+                            modules["main"].app,
+                            prefix,
+                            ids,
+                            args.reads,
+                            query,
+                            revalidate,
+                        ),
+                    }
+                )
+        finally:
+            os.chdir(cwd)
+
+    return result
+
+
+def run_pipeline_steps(args, corpus, database, posts, users, modules, result):
+    steps = result["steps"]
+
+    def init():
+        posts.initialize_TFIDF_post_similarity_startpoint()
+        posts.initialize_SBERT_post_similarity_startpoint()
+        posts.initialize_combined_similarity_redis_startpoint()
+
+    def tick():
+        posts.update_similarity_for_posts()
+        modules["database_operations"].delete_processed_data()
+
+    steps.append(timed("init", init))
+
+    new_posts = corpus.new_posts(
+        args.tick_size, args.words_per_post, seed=args.seed + 1
+    )
+    database.insert_posts(new_posts)
+    steps.append(timed("insert_tick", tick))
+
+    edited = corpus.edited_posts(
+        args.tick_size, args.words_per_post, seed=args.seed + 2
+    )
+    database.update_posts(edited)
+    steps.append(timed("update_tick", tick))
+
+    deleted = [p["PostId"] for p in new_posts]
+    database.delete_posts(deleted)
+    steps.append(timed("delete_tick", tick))
+
+    steps.append(timed("users", users.update_similarity_for_users))
+
+
+def fill_synthetic_lists(redis_client, corpus, seed: int):
+    """Random Top-N lists, so the read endpoints can be timed without the pipeline."""
+    from constants import SIMILAR_POSTS_STORED, TOP_N_SIMILAR_USERS
+
+    rng = np.random.default_rng(seed)
+    post_ids = np.array([p["PostId"] for p in corpus.posts])
+    user_ids = np.array(corpus.user_ids)
+    pipeline = redis_client.pipeline()
+    for post_id in post_ids:
+        similar = rng.choice(post_ids, size=min(SIMILAR_POSTS_STORED, len(post_ids)))
+        pipeline.set(f"similar:{post_id}", ",".join(similar))
+    for user_id in user_ids:
+        similar = rng.choice(user_ids, size=min(TOP_N_SIMILAR_USERS, len(user_ids)))
+        pipeline.set(f"similar_users:{user_id}", ",".join(similar))
+    pipeline.execute()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=API_DIR,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def default_memory_budget_gb() -> float:
+    try:
+        available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError):
+        return 8.0
+    return available / 1024**3 * 0.75
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--posts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--users", type=int, help="Default: one user per 10 posts")
+    parser.add_argument("--follows-per-user", type=float, default=20.0)
+    parser.add_argument("--words-per-post", type=int, default=40)
+    parser.add_argument("--tick-size", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument(
+        "--encoder", choices=["hashing", "configured"], default="hashing"
+    )
+    parser.add_argument(
+        "--memory-budget-gb", type=float, default=default_memory_budget_gb()
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    import database_operations
+    import fallback_lists
+    import follow_graph
+    import main as app_module
+    import post_similarity_handlers
+    import sbert_encoders
+    import user_similarity_handlers
+    import utils
+    import viewer_exclusions
+
+    if args.encoder == "hashing":
+        sbert_encoders._encoder = HashingEncoder()
+
+    modules = {
+        "database_operations": database_operations,
+        "follow_graph": follow_graph,
+        "utils": utils,
+        "post_similarity_handlers": post_similarity_handlers,
+        "user_similarity_handlers": user_similarity_handlers,
+        "viewer_exclusions": viewer_exclusions,
+        "fallback_lists": fallback_lists,
+        "main": app_module,
+    }
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "encoder": args.encoder,
+        "parameters": {
+            "follows_per_user": args.follows_per_user,
+            "words_per_post": args.words_per_post,
+            "tick_size": args.tick_size,
+            "reads": args.reads,
+            "seed": args.seed,
+        },
+        "scales": [],
+    }
+
+    for n_posts in args.posts:
+        scale = run_scale(args, n_posts, modules)
+        results["scales"].append(scale)
+
+        print(
+            f"📊 {scale['posts']} posts, {scale['users']} users, "
+            f"{scale['follows']} follows, {scale['redis_keys']} Redis keys"
+        )
+        for step in scale["steps"]:
+            if "skipped" in step:
+                print(f"{step['step']:>12}  skipped: {step['skipped']}")
+            elif "requests" in step:
+                print(
+                    f"{step['step']:>12}  p50 {step['p50_ms']:.2f} ms, "
+                    f"p99 {step['p99_ms']:.2f} ms, {step['requests_per_second']:.0f} req/s"
+                )
+            else:
+                slowest = sorted(step["stages"].items(), key=lambda s: -s[1])[:3]
+                breakdown = ", ".join(f"{name} {sec:.2f}s" for name, sec in slowest)
+                print(f"{step['step']:>12}  {step['seconds']:8.2f} s  ({breakdown})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
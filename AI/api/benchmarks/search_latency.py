@@ -0,0 +1,117 @@
+"""
+Latency of the semantic search service under concurrent queries.
+
+Compares batched query handling against one-query-at-a-time (batch size 1) at several
+concurrency levels. Uses the published search index when present, a synthetic one
+otherwise. Run from the `api` directory:
+
+    python -m benchmarks.search_latency --concurrency 1 8 32 128
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+from index_generations import GenerationStore
+from semantic_search import SemanticSearchIndex, SemanticSearchService
+from sbert_encoders import get_sbert_encoder
+
+QUERIES = [
+    "Best places to visit in Paris for a 3-day trip",
+    "hiking trails in the alps",
+    "cheap street food in Bangkok",
+    "romantic weekend in Venice",
+    "surfing beaches in Portugal",
+    "museums and galleries in London",
+    "road trip across Iceland",
+    "family friendly things to do in Barcelona",
+]
+
+
+def build_index(n_posts: int, dim: int) -> SemanticSearchIndex:
+    if GenerationStore().current() is not None:
+        index = SemanticSearchIndex()
+        index.refresh_if_stale()
+        return index
+
+    rng = np.random.default_rng(42)
+    embeddings = rng.standard_normal((n_posts, dim)).astype(np.float32)
+    return SemanticSearchIndex.from_arrays([str(i) for i in range(n_posts)], embeddings)
+
+
+async def run_level(service, concurrency: int, n_requests: int, unique: bool) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        query = QUERIES[i % len(QUERIES)]
+        if unique:
+            query = f"{query} {i}"  # Defeat the query cache
+        async with semaphore:
+            start = time.perf_counter()
+            await service.search(query, 10)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "queries_per_second": n_requests / elapsed,
+    }
+
+
+async def main_async(args):
+    index = build_index(args.posts, args.dim)
+    encoder = get_sbert_encoder()
+    encoder.encode(["warm up"])
+
+    results = []
+    for mode, batch_size in (("batched", args.batch_size), ("unbatched", 1)):
+        for concurrency in args.concurrency:
+            service = SemanticSearchService(
+                index=index, encoder=encoder, max_batch_size=batch_size
+            )
+            result = await run_level(
+                service, concurrency, args.requests, unique=not args.cached
+            )
+            result["mode"] = mode
+            results.append(result)
+
+    print(
+        f"{'mode':>10} {'conc':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/s':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:>10} {r['concurrency']:>5} {r['p50_ms']:>8.1f} "
+            f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['queries_per_second']:>8.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument(
+        "--cached", action="store_true", help="Repeat queries so the LRU cache is hit"
+    )
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: API import time and time from startup to the first /similar-posts answer.
+
+Each run happens in a fresh interpreter. The child imports `main`, records which heavy
+modules got loaded, then runs the app lifespan (against a stub Ollama server with a
+slow model load and fakeredis; the scheduler's similarity jobs are removed since they
+need the database) and times the first /similar-posts request. Run from the `api`
+directory:
+
+    python -m benchmarks.startup_time --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import numpy as np
+
+HEAVY_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "onnxruntime",
+    "sklearn",
+    "scipy",
+    "pandas",
+    "sqlalchemy",
+)
+
+
+async def child(load_seconds: float) -> dict:
+    from benchmarks.stub_ollama import StubOllamaServer
+    import os
+
+    stub = StubOllamaServer(load_seconds=load_seconds).start()
+    os.environ["OLLAMA_HOST"] = stub.url
+
+    start = time.perf_counter()
+    import main
+
+    import_seconds = time.perf_counter() - start
+    heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    import fakeredis
+    import httpx
+
+    main.redis_client = fakeredis.FakeRedis(decode_responses=True)
+    main.redis_client.set("similar:bench-post", "1,2,3")
+    main.scheduler.remove_all_jobs()
+
+    async with main.app.router.lifespan_context(main.app):
+        ready_seconds = time.perf_counter() - start
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://b") as http:
+            response = await http.get("/similar-posts/bench-post")
+            response.raise_for_status()
+        first_read_seconds = time.perf_counter() - start
+
+    stub.stop()
+    return {
+        "import_seconds": import_seconds,
+        "ready_seconds": ready_seconds,
+        "first_read_seconds": first_read_seconds,
+        "heavy_modules_imported": heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--load-seconds", type=float, default=3.0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args.load_seconds))))
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup_time", "--child"]
+            + ["--load-seconds", str(args.load_seconds)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {
+        metric: float(np.median([r[metric] for r in runs]))
+        for metric in ("import_seconds", "ready_seconds", "first_read_seconds")
+    }
+    results["heavy_modules_imported"] = runs[0]["heavy_modules_imported"]
+    results["runs"] = runs
+
+    print(f"import main:          {results['import_seconds'] * 1000:>8.0f} ms")
+    print(f"lifespan ready:       {results['ready_seconds'] * 1000:>8.0f} ms")
+    print(f"first /similar-posts: {results['first_read_seconds'] * 1000:>8.0f} ms")
+    print(f"heavy modules loaded: {results['heavy_modules_imported'] or 'none'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Minimal local stand-in for the Ollama HTTP API, used by the itinerary benchmarks.
+
+Answers /api/chat after a configurable delay with a valid itinerary (or activities
+array) for the prompt, and /api/tags with an empty model list. With `"stream": true`
+the content is sent as NDJSON chunks spread evenly over the delay, like Ollama does.
+
+The delay is fixed per request, or proportional to the output size with
+`chars_per_second` (closer to real decoding). `parallel` caps concurrent generations
+like OLLAMA_NUM_PARALLEL, and `invalid_rate` breaks that share of the outputs in one
+of the ways `malformations` lists (truncation by default). `load_seconds` emulates
+loading the model on the first request (or after a `keep_alive` of 0 unloaded it), and
+responses report load_duration / prompt_eval_duration like Ollama.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_activities(day: int, count: int = 3) -> list[dict]:
+    return [
+        {
+            "title": f"Day {day} activity {i + 1}",
+            "description": "A stub activity generated for benchmarking.",
+            "location": f"Stub street {day}{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def fake_response_content(prompt: str) -> str:
+    if "outline" in prompt:
+        days = int(re.search(r"(\d+)-day", prompt).group(1))
+        return json.dumps(
+            [
+                {
+                    "day": day,
+                    "theme": f"Stub theme {day}",
+                    "highlights": [f"Sight {day}"],
+                }
+                for day in range(1, days + 1)
+            ]
+        )
+
+    if "JSON array" in prompt:
+        return json.dumps(fake_activities(1))
+
+    days = int(re.search(r"(\d+)-day", prompt).group(1)) if "-day" in prompt else 3
+    destination = re.search(r"itinerary for (.+?)[\.\s]", prompt)
+    return json.dumps(
+        {
+            "destination": destination.group(1) if destination else "Stubville",
+            "days": [
+                {"day": day, "activities": fake_activities(day)}
+                for day in range(1, days + 1)
+            ],
+        }
+    )
+
+
+MALFORMATIONS = ("truncate", "code_fence", "trailing_comma", "prose", "garbage")
+
+
+def malform(content: str, kind: str) -> str:
+    """Breaks valid JSON output the way local models typically do."""
+    if kind == "truncate":
+        return content[: len(content) * 3 // 4]
+    if kind == "code_fence":
+        return f"```json\n{content}\n```"
+    if kind == "trailing_comma":
+        return content.replace("}]", "},]")
+    if kind == "prose":
+        return f"Here is your itinerary:\n{content}\nEnjoy your trip!"
+    return content.replace('"', "'")  # "garbage": not recoverable
+
+
+class StubOllamaServer:
+    def __init__(
+        self,
+        generation_seconds: float = 2.0,
+        port: int = 0,
+        chars_per_second: float = None,
+        parallel: int = None,
+        invalid_rate: float = 0.0,
+        malformations: tuple[str] = ("truncate",),
+        load_seconds: float = 0.0,
+    ):
+        self.generation_seconds = generation_seconds
+        self.chars_per_second = chars_per_second
+        self.invalid_rate = invalid_rate
+        self.malformations = malformations
+        self.slots = threading.Semaphore(parallel) if parallel else None
+        self.load_seconds = load_seconds
+        self.loaded = False
+        self._load_lock = threading.Lock()
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Needed for chunked streaming responses
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: dict):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(
+                self,
+                model: str,
+                content: str,
+                seconds: float,
+                timings: dict,
+                chunks: int = 40,
+            ):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def write_line(payload: dict):
+                    line = json.dumps(payload).encode() + b"\n"
+                    self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+                    self.wfile.flush()
+
+                size = max(1, -(-len(content) // chunks))
+                for start in range(0, len(content), size):
+                    time.sleep(seconds / chunks)
+                    write_line(
+                        {
+                            "model": model,
+                            "message": {
+                                "role": "assistant",
+                                "content": content[start : start + size],
+                            },
+                            "done": False,
+                        }
+                    )
+                write_line(
+                    {
+                        "model": model,
+                        "message": {"role": "assistant", "content": ""},
+                        "done": True,
+                        **timings,
+                    }
+                )
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                self._send_json({"models": []})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+
+                if self.path == "/api/chat":
+                    prompt = request["messages"][-1]["content"]
+                    content = server.content_for(prompt)
+                    seconds = server.seconds_for(content)
+                    if server.slots:
+                        server.slots.acquire()
+                    try:
+                        timings = server.load(request.get("keep_alive"))
+                        if request.get("stream"):
+                            self._send_stream(
+                                request.get("model"), content, seconds, timings
+                            )
+                            return
+
+                        time.sleep(seconds)
+                        self._send_json(
+                            {
+                                "model": request.get("model"),
+                                "message": {"role": "assistant", "content": content},
+                                "done": True,
+                                **timings,
+                            }
+                        )
+                    finally:
+                        if server.slots:
+                            server.slots.release()
+                elif self.path == "/api/generate":
+                    timings = server.load(request.get("keep_alive"))
+                    self._send_json(
+                        {
+                            "model": request.get("model"),
+                            "response": "",
+                            "done": True,
+                            **timings,
+                        }
+                    )
+                else:
+                    self._send_json({"model": request.get("model"), "done": True})
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def load(self, keep_alive=None) -> dict:
+        """Loads the model if needed; returns the Ollama timing fields of the request."""
+        with self._load_lock:
+            load_seconds = 0.0
+            if not self.loaded:
+                time.sleep(self.load_seconds)
+                load_seconds = self.load_seconds
+            self.loaded = keep_alive not in (0, "0")
+
+        return {
+            "load_duration": int((load_seconds + 0.001) * 1e9),
+            "prompt_eval_duration": int(0.05 * 1e9),
+        }
+
+    def content_for(self, prompt: str) -> str:
+        content = fake_response_content(prompt)
+        if random.random() < self.invalid_rate:
+            return malform(content, random.choice(self.malformations))
+        return content
+
+    def seconds_for(self, content: str) -> float:
+        if self.chars_per_second:
+            return len(content) / self.chars_per_second
+        return self.generation_seconds
+
+    def start(self) -> "StubOllamaServer":
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
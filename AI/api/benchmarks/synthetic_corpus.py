@@ -0,0 +1,359 @@
+"""
+Synthetic travel-post corpus and a SQLite stand-in for the SQL Server schema.
+
+Posts are spread over users with a long tail (a few prolific users, many with one post
+or none), each post belongs to a destination and carries tags drawn from its theme,
+users follow a configurable number of others and like/save random posts. Everything is seeded, so a given set of
+parameters always produces the same corpus.
+"""
+
+import uuid
+from dataclasses import dataclass, field
+import numpy as np
+from sqlalchemy import create_engine, text
+
+DESTINATIONS = [
+    "Paris, France",
+    "Rome, Italy",
+    "Barcelona, Spain",
+    "Lisbon, Portugal",
+    "London, United Kingdom",
+    "Amsterdam, Netherlands",
+    "Prague, Czech Republic",
+    "Vienna, Austria",
+    "Reykjavik, Iceland",
+    "Kyoto, Japan",
+    "Tokyo, Japan",
+    "Bangkok, Thailand",
+    "Bali, Indonesia",
+    "Hanoi, Vietnam",
+    "Marrakech, Morocco",
+    "Cape Town, South Africa",
+    "New York, United States",
+    "Mexico City, Mexico",
+    "Cusco, Peru",
+    "Buenos Aires, Argentina",
+    "Sydney, Australia",
+    "Queenstown, New Zealand",
+    "Dubrovnik, Croatia",
+    "Santorini, Greece",
+    "Zermatt, Switzerland",
+]
+
+THEMES = {
+    "food": ["street food", "market", "tasting menu", "wine", "coffee", "bakery"],
+    "hiking": ["trail", "summit", "glacier", "waterfall", "valley", "ridge"],
+    "beach": ["beach", "surf", "snorkeling", "sunset", "cove", "boat trip"],
+    "culture": ["museum", "gallery", "cathedral", "old town", "temple", "palace"],
+    "nightlife": ["rooftop bar", "live music", "club", "jazz", "cocktails", "festival"],
+    "budget": ["hostel", "free walking tour", "night bus", "cheap eats", "camping"],
+}
+
+ADJECTIVES = [
+    "amazing",
+    "quiet",
+    "crowded",
+    "hidden",
+    "beautiful",
+    "overrated",
+    "unforgettable",
+    "cozy",
+    "breathtaking",
+    "local",
+]
+
+FILLER = [
+    "we spent the morning exploring",
+    "definitely worth the early start",
+    "the view from the top was",
+    "ask the locals for directions to",
+    "book tickets in advance for",
+    "we walked back through",
+    "perfect spot to relax after",
+    "do not miss",
+]
+
+
+@dataclass
+class SyntheticCorpus:
+    """Rows for the Posts, Follows, Likes and Saves tables, as lists of dicts."""
+
+    posts: list[dict]
+    user_ids: list[str]
+    follows: list[dict]
+    likes: list[dict] = field(default_factory=list)
+    saves: list[dict] = field(default_factory=list)
+
+    @classmethod
+    def generate(
+        cls,
+        n_posts: int,
+        n_users: int = None,
+        follows_per_user: float = 20.0,
+        words_per_post: int = 40,
+        seed: int = 42,
+        likes_per_user: float = 10.0,
+    ) -> "SyntheticCorpus":
+        """
+        Args:
+            n_users: Defaults to one user per 10 posts.
+            follows_per_user: Mean number of users each user follows.
+            words_per_post: Mean length of a post body in words.
+            likes_per_user: Mean number of posts each user likes (and half as many saves).
+        """
+        rng = np.random.default_rng(seed)
+        n_users = n_users or max(1, n_posts // 10)
+        user_ids = [_uuid(rng) for _ in range(n_users)]
+
+        # Long-tailed activity: some users post a lot, some never
+        weights = rng.zipf(1.6, size=n_users).astype(np.float64)
+        weights[rng.random(n_users) < 0.2] = 0
+        if not weights.any():
+            weights[:] = 1
+        authors = rng.choice(n_users, size=n_posts, p=weights / weights.sum())
+
+        theme_names = list(THEMES)
+        posts = []
+        for author in authors:
+            destination = DESTINATIONS[rng.integers(len(DESTINATIONS))]
+            theme = theme_names[rng.integers(len(theme_names))]
+            posts.append(
+                {
+                    "PostId": _uuid(rng),
+                    "UserId": user_ids[author],
+                    **_post_content(rng, destination, theme, words_per_post),
+                }
+            )
+
+        follows = []
+        for follower in range(n_users):
+            count = min(rng.poisson(follows_per_user), n_users - 1)
+            followed = rng.choice(n_users, size=count + 1, replace=False)
+            for other in followed[followed != follower][:count]:
+                follows.append(
+                    {
+                        "UserIdFollowing": user_ids[follower],
+                        "UserIdFollowed": user_ids[other],
+                    }
+                )
+
+        likes, saves = [], []
+        for user_id in user_ids:
+            for rows, mean in ((likes, likes_per_user), (saves, likes_per_user / 2)):
+                count = min(rng.poisson(mean), n_posts)
+                for post in rng.choice(n_posts, size=count, replace=False):
+                    rows.append({"UserId": user_id, "PostId": posts[post]["PostId"]})
+
+        return cls(
+            posts=posts, user_ids=user_ids, follows=follows, likes=likes, saves=saves
+        )
+
+    def new_posts(
+        self, count: int, words_per_post: int = 40, seed: int = 0
+    ) -> list[dict]:
+        """Fresh posts by existing users, e.g. for an insert tick."""
+        rng = np.random.default_rng(seed)
+        posts = []
+        for _ in range(count):
+            destination = DESTINATIONS[rng.integers(len(DESTINATIONS))]
+            theme = list(THEMES)[rng.integers(len(THEMES))]
+            posts.append(
+                {
+                    "PostId": _uuid(rng),
+                    "UserId": self.user_ids[rng.integers(len(self.user_ids))],
+                    **_post_content(rng, destination, theme, words_per_post),
+                }
+            )
+        return posts
+
+    def edited_posts(
+        self, count: int, words_per_post: int = 40, seed: int = 0
+    ) -> list[dict]:
+        """Existing posts with rewritten content, e.g. for an update tick."""
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(
+            len(self.posts), size=min(count, len(self.posts)), replace=False
+        )
+        edited = []
+        for row in rows:
+            post = self.posts[row]
+            theme = list(THEMES)[rng.integers(len(THEMES))]
+            edited.append(
+                {
+                    **post,
+                    **_post_content(rng, post["Location"], theme, words_per_post),
+                }
+            )
+        return edited
+
+
+def _uuid(rng) -> str:
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4)).upper()
+
+
+def _post_content(rng, destination: str, theme: str, words_per_post: int) -> dict:
+    city = destination.split(",")[0]
+    keywords = THEMES[theme]
+    n_words = max(5, int(rng.normal(words_per_post, words_per_post / 4)))
+
+    words = []
+    while len(words) < n_words:
+        words.extend(FILLER[rng.integers(len(FILLER))].split())
+        words.append(ADJECTIVES[rng.integers(len(ADJECTIVES))])
+        words.extend(keywords[rng.integers(len(keywords))].split())
+        if rng.random() < 0.3:
+            words.append(city)
+
+    caption = (
+        f"{ADJECTIVES[rng.integers(len(ADJECTIVES))].capitalize()} "
+        f"{keywords[rng.integers(len(keywords))]} in {city}"
+    )
+    tags = rng.choice(
+        keywords, size=min(len(keywords), 1 + rng.integers(3)), replace=False
+    )
+    return {
+        "Caption": caption,
+        "Body": " ".join(words[:n_words]),
+        "Location": destination,
+        "Tags": ",".join(tag.replace(" ", "") for tag in [theme, *tags]),
+    }
+
+
+SCHEMA = [
+    """CREATE TABLE Posts (
+        PostId TEXT PRIMARY KEY, UserId TEXT, Caption TEXT, Body TEXT,
+        Location TEXT, Tags TEXT, CreatedAt TEXT DEFAULT CURRENT_TIMESTAMP,
+        LikeCount INTEGER DEFAULT 0
+    )""",
+    """CREATE TABLE PostChanges (
+        Id INTEGER PRIMARY KEY AUTOINCREMENT, PostId TEXT, Caption TEXT, Body TEXT,
+        ChangeType TEXT, Processed INTEGER DEFAULT 0
+    )""",
+    """CREATE TABLE DeletedPosts (
+        Id INTEGER PRIMARY KEY AUTOINCREMENT, PostId TEXT, Processed INTEGER DEFAULT 0
+    )""",
+    """CREATE TABLE Follows (
+        UserIdFollowing TEXT, UserIdFollowed TEXT,
+        FollowedAt TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE TABLE Likes (UserId TEXT, PostId TEXT, PRIMARY KEY (UserId, PostId))",
+    "CREATE TABLE Saves (UserId TEXT, PostId TEXT, PRIMARY KEY (UserId, PostId))",
+]
+
+
+class SqliteStandIn:
+    """
+    SQLite database with the tables `database_operations` and `utils` query. Assign
+    `engine` to their module-level `engine` to run the jobs against it.
+    """
+
+    def __init__(self, path: str):
+        self.engine = create_engine(f"sqlite:///{path}")
+        with self.engine.begin() as conn:
+            for statement in SCHEMA:
+                conn.execute(text(statement))
+
+    def load(self, corpus: SyntheticCorpus):
+        """Loads the corpus as existing data, created a day before later changes."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO Posts (PostId, UserId, Caption, Body, Location, Tags) "
+                    "VALUES (:PostId, :UserId, :Caption, :Body, :Location, :Tags)"
+                ),
+                corpus.posts,
+            )
+            if corpus.follows:
+                conn.execute(
+                    text(
+                        "INSERT INTO Follows (UserIdFollowing, UserIdFollowed) "
+                        "VALUES (:UserIdFollowing, :UserIdFollowed)"
+                    ),
+                    corpus.follows,
+                )
+            # Distinct past timestamps, 10 ms apart in insertion order
+            for table, column in (("Posts", "CreatedAt"), ("Follows", "FollowedAt")):
+                conn.execute(
+                    text(
+                        f"UPDATE {table} SET {column} = strftime('%Y-%m-%d %H:%M:%f', "
+                        "'now', '-1 day', '+' || (rowid * 0.01) || ' seconds')"
+                    )
+                )
+            for table, rows in (("Likes", corpus.likes), ("Saves", corpus.saves)):
+                if rows:
+                    conn.execute(
+                        text(
+                            f"INSERT INTO {table} (UserId, PostId) "
+                            "VALUES (:UserId, :PostId)"
+                        ),
+                        rows,
+                    )
+            conn.execute(
+                text(
+                    "UPDATE Posts SET LikeCount = "
+                    "(SELECT COUNT(*) FROM Likes WHERE Likes.PostId = Posts.PostId)"
+                )
+            )
+
+    def insert_posts(self, posts: list[dict]):
+        """Inserts posts and logs them in PostChanges, like the INSERT trigger."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO Posts (PostId, UserId, Caption, Body, Location, Tags) "
+                    "VALUES (:PostId, :UserId, :Caption, :Body, :Location, :Tags)"
+                ),
+                posts,
+            )
+            self._log_changes(conn, posts, "INSERT")
+
+    def update_posts(self, posts: list[dict]):
+        """Rewrites posts and logs them in PostChanges, like the UPDATE trigger."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "UPDATE Posts SET Caption = :Caption, Body = :Body, "
+                    "Location = :Location, Tags = :Tags WHERE PostId = :PostId"
+                ),
+                posts,
+            )
+            self._log_changes(conn, posts, "UPDATE")
+
+    def delete_posts(self, post_ids: list[str]):
+        """Deletes posts and logs them in DeletedPosts, like the DELETE trigger."""
+        rows = [{"PostId": post_id} for post_id in post_ids]
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM Posts WHERE PostId = :PostId"), rows)
+            conn.execute(
+                text("INSERT INTO DeletedPosts (PostId) VALUES (:PostId)"), rows
+            )
+
+    def follow(self, follows: list[dict]):
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO Follows (UserIdFollowing, UserIdFollowed) "
+                    "VALUES (:UserIdFollowing, :UserIdFollowed)"
+                ),
+                follows,
+            )
+
+    def unfollow(self, follows: list[dict]):
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "DELETE FROM Follows WHERE UserIdFollowing = :UserIdFollowing "
+                    "AND UserIdFollowed = :UserIdFollowed"
+                ),
+                follows,
+            )
+
+    @staticmethod
+    def _log_changes(conn, posts: list[dict], change_type: str):
+        conn.execute(
+            text(
+                "INSERT INTO PostChanges (PostId, Caption, Body, ChangeType) "
+                f"VALUES (:PostId, :Caption, :Body, '{change_type}')"
+            ),
+            posts,
+        )
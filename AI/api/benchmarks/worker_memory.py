@@ -0,0 +1,186 @@
+"""
+Per-worker memory of the search index with 1 and N API worker processes.
+
+Each worker is a fresh interpreter that attaches the search index the way an API worker
+does, runs semantic and hybrid queries over it (touching every page), and reports its
+memory while all workers are alive. Two layouts are compared:
+
+    private   each worker loads the .npz files into its own heap (the former layout)
+    shared    each worker memory-maps the published generation (index_generations)
+
+RSS counts shared pages in full in every process; PSS splits them between the processes
+mapping them, so the sum of PSS is what the workers really cost together. "index" is
+the RSS added by attaching the index and querying it. Run from the `api` directory:
+
+    python -m benchmarks.worker_memory --posts 50000 --workers 1 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+
+QUERIES = [
+    "street food market in Bangkok",
+    "quiet hiking trail to the summit",
+    "rooftop bar with live music",
+    "museum and old town walking tour",
+]
+
+
+def memory_kib() -> dict:
+    """Rss/Pss/Private of this process from /proc/self/smaps_rollup, in KiB."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                values[key] = int(rest.split()[0])
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "private": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+
+def attach(layout: str, directory: str):
+    from embedding_quantization import QuantizedEmbeddings
+    from lexical_index import LexicalIndex
+    from semantic_search import SemanticSearchIndex
+
+    if layout == "shared":
+        index = SemanticSearchIndex(os.path.join(directory, "search_index"))
+        index.refresh_if_stale()
+        return index
+
+    embeddings = QuantizedEmbeddings.load(os.path.join(directory, "sbert_matrix.npz"))
+    post_ids = np.load(os.path.join(directory, "post_ids.npy"))
+    lexical_index = LexicalIndex.load(os.path.join(directory, "lexical_index.npz"))
+    return SemanticSearchIndex.from_arrays(post_ids, embeddings, lexical_index)
+
+
+def worker(layout, directory, dim, n_queries, ready, measure, results):
+    before = memory_kib()
+    index = attach(layout, directory)
+
+    rng = np.random.default_rng(os.getpid())
+    for i in range(n_queries):
+        query_embedding = rng.standard_normal(dim).astype(np.float32)
+        index.search(query_embedding.reshape(1, -1), 10)
+        index.search_hybrid(QUERIES[i % len(QUERIES)], query_embedding, 10)
+
+    ready.release()
+    measure.wait()
+    after = memory_kib()
+    results.put({**after, "index": after["rss"] - before["rss"]})
+
+
+def run(layout: str, directory: str, n_workers: int, dim: int, n_queries: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    ready, measure, results = context.Semaphore(0), context.Event(), context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(layout, directory, dim, n_queries, ready, measure, results),
+        )
+        for _ in range(n_workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()  # Measure only once every worker has attached
+    measure.set()
+    per_worker = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    def mean_mib(key):
+        return float(np.mean([w[key] for w in per_worker]) / 1024)
+
+    return {
+        "layout": layout,
+        "workers": n_workers,
+        "rss_mib": mean_mib("rss"),
+        "pss_mib": mean_mib("pss"),
+        "index_rss_mib": mean_mib("index"),
+        "total_pss_mib": float(sum(w["pss"] for w in per_worker) / 1024),
+    }
+
+
+def build_files(directory: str, n_posts: int, dim: int, seed: int):
+    """Writes the private-layout files and publishes the same data as a generation."""
+    import pandas as pd
+    from benchmarks.synthetic_corpus import SyntheticCorpus
+    from embedding_quantization import QuantizedEmbeddings
+    from index_generations import GenerationStore
+    from lexical_index import LexicalIndex
+    from online_tfidf import OnlineTfidfVectorizer
+
+    corpus = SyntheticCorpus.generate(n_posts, follows_per_user=0, seed=seed)
+    df = pd.DataFrame(corpus.posts)
+    vectorizer = OnlineTfidfVectorizer()
+    vectorizer.fit(df["Caption"] + " " + df["Body"])
+    lexical_index = LexicalIndex.build(df, vectorizer)
+    lexical_index.save(os.path.join(directory, "lexical_index.npz"))
+
+    rng = np.random.default_rng(seed)
+    embeddings = QuantizedEmbeddings.from_float(
+        rng.standard_normal((n_posts, dim)).astype(np.float32), "float32"
+    )
+    embeddings.save(os.path.join(directory, "sbert_matrix.npz"))
+    post_ids = df["PostId"].to_numpy(dtype=str)
+    np.save(os.path.join(directory, "post_ids.npy"), post_ids)
+
+    GenerationStore(os.path.join(directory, "search_index")).publish(
+        {"post_ids": post_ids, "embeddings": embeddings.data, **lexical_index.arrays()},
+        {"precision": embeddings.precision},
+    )
+    return embeddings.nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="worker-memory-") as directory:
+        embeddings_bytes = build_files(directory, args.posts, args.dim, args.seed)
+        for layout in ("private", "shared"):
+            for n_workers in args.workers:
+                results.append(
+                    run(layout, directory, n_workers, args.dim, args.queries)
+                )
+
+    print(
+        f"📊 {args.posts} posts, {args.dim} dims, "
+        f"embeddings {embeddings_bytes / 1024**2:.0f} MiB"
+    )
+    print(
+        f"{'layout':>8} {'workers':>8} {'RSS MiB':>9} {'PSS MiB':>9} "
+        f"{'index MiB':>10} {'total PSS MiB':>14}"
+    )
+    for r in results:
+        print(
+            f"{r['layout']:>8} {r['workers']:>8} {r['rss_mib']:>9.1f} "
+            f"{r['pss_mib']:>9.1f} {r['index_rss_mib']:>10.1f} "
+            f"{r['total_pss_mib']:>14.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from constants import PATH_POSTS_CSV, BUCKET_LOCATION_BOOST, BUCKET_TAG_BOOST
+
+
+def location_key(location) -> str:
+    """Destination bucket of a post: the first comma-separated part of its Location."""
+    if not isinstance(location, str):
+        return None
+    key = " ".join(location.split(",")[0].lower().split())
+    return key or None
+
+
+def tag_keys(tags) -> list[str]:
+    """Tag buckets of a post; Tags are stored comma-separated, like the frontend expects."""
+    if not isinstance(tags, str):
+        return []
+    return [t for t in tags.replace(" ", "").lower().split(",") if t]
+
+
+class CandidateBuckets:
+    """
+    Per-location and per-tag inverted index over posts (bucket key -> positions).
+
+    Positions refer to the `post_ids` order given at construction, i.e. the columns of
+    the similarity matrices, so candidate lists can index matrix rows directly.
+    """
+
+    def __init__(self, post_ids, locations, tags):
+        self.position_of = {str(p): i for i, p in enumerate(post_ids)}
+        self.location_codes = np.full(len(self.position_of), -1, dtype=np.int32)
+        self.tags_of = {}
+
+        location_index = defaultdict(list)
+        tag_index = defaultdict(list)
+        location_ids = {}
+
+        for post_id, location, post_tags in zip(post_ids, locations, tags):
+            position = self.position_of[str(post_id)]
+
+            key = location_key(location)
+            if key is not None:
+                location_index[key].append(position)
+                self.location_codes[position] = location_ids.setdefault(
+                    key, len(location_ids)
+                )
+
+            keys = tag_keys(post_tags)
+            self.tags_of[position] = keys
+            for tag in keys:
+                tag_index[tag].append(position)
+
+        self.location_index = {
+            k: np.array(v, dtype=np.int64) for k, v in location_index.items()
+        }
+        self.tag_index = {k: np.array(v, dtype=np.int64) for k, v in tag_index.items()}
+        self.location_of_code = {code: key for key, code in location_ids.items()}
+
+    @classmethod
+    def from_posts_csv(cls, post_ids, path: str = PATH_POSTS_CSV) -> "CandidateBuckets":
+        """Builds buckets for the given matrix post order from the posts CSV metadata."""
+        df = pd.read_csv(
+            path, usecols=lambda c: c in {"PostId", "Location", "Tags"}, dtype=str
+        )
+        metadata = df.set_index("PostId")
+        metadata = metadata[~metadata.index.duplicated(keep="last")]
+        metadata = metadata.reindex([str(p) for p in post_ids])
+
+        locations = (
+            metadata["Location"] if "Location" in metadata else [None] * len(metadata)
+        )
+        tags = metadata["Tags"] if "Tags" in metadata else [None] * len(metadata)
+        return cls(post_ids, list(locations), list(tags))
+
+    def _tag_positions(self, position: int) -> np.ndarray:
+        buckets = [self.tag_index[t] for t in self.tags_of.get(position, [])]
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(buckets))
+
+    def candidates(self, post_id: str) -> np.ndarray:
+        """Positions of posts sharing the destination or at least one tag with the post."""
+        position = self.position_of.get(str(post_id))
+        if position is None:
+            return np.empty(0, dtype=np.int64)
+
+        parts = [self._tag_positions(position)]
+        code = self.location_codes[position]
+        if code >= 0:
+            parts.append(self.location_index[self.location_of_code[code]])
+        return np.unique(np.concatenate(parts))
+
+    def boost(self, post_id: str, positions: np.ndarray) -> np.ndarray:
+        """Score bonus for each candidate position sharing the destination / a tag."""
+        bonus = np.zeros(len(positions), dtype=np.float64)
+        position = self.position_of.get(str(post_id))
+        if position is None:
+            return bonus
+
+        code = self.location_codes[position]
+        if code >= 0:
+            bonus += BUCKET_LOCATION_BOOST * (self.location_codes[positions] == code)
+
+        tag_positions = self._tag_positions(position)
+        if len(tag_positions):
+            bonus += BUCKET_TAG_BOOST * np.isin(positions, tag_positions)
+
+        return bonus
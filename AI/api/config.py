@@ -0,0 +1,108 @@
+import os
+from dotenv import load_dotenv
+
+# Deployment-specific settings, overridable through environment variables / .env
+load_dotenv()
+
+# Log output: "json" (one structured object per line) or "text", and the minimum level
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Storage precision of the SBERT embedding matrix: "float32", "float16" or "int8"
+SBERT_EMBEDDING_PRECISION = os.getenv("SBERT_EMBEDDING_PRECISION", "float32")
+
+# SBERT encoder backend: "pytorch" (SentenceTransformer) or "onnx" (ONNX Runtime)
+SBERT_ENCODER_BACKEND = os.getenv("SBERT_ENCODER_BACKEND", "pytorch")
+# Use the dynamically int8-quantized ONNX model (onnx backend only)
+SBERT_ONNX_QUANTIZED = os.getenv("SBERT_ONNX_QUANTIZED", "false").lower() == "true"
+# Intra-op threads for the encoder; 0 keeps the runtime default
+SBERT_ENCODER_THREADS = int(os.getenv("SBERT_ENCODER_THREADS", "0"))
+SBERT_ENCODE_BATCH_SIZE = int(os.getenv("SBERT_ENCODE_BATCH_SIZE", "32"))
+# Drift of the observed SBERT score range, as a fraction of the calibrated range,
+# that triggers a full renormalisation
+SBERT_RECALIBRATION_THRESHOLD = float(
+    os.getenv("SBERT_RECALIBRATION_THRESHOLD", "0.05")
+)
+# Share of the corpus inserted/updated/deleted after which all TF-IDF similarities are
+# recomputed under the current IDF (changed posts always use it)
+TFIDF_REWEIGHT_THRESHOLD = float(os.getenv("TFIDF_REWEIGHT_THRESHOLD", "0.1"))
+
+# Similar-post candidates: "all" posts, "boost" same destination/tag posts,
+# or "restrict" to same destination/tag posts (falls back to all if too few)
+SIMILAR_POSTS_CANDIDATE_MODE = os.getenv("SIMILAR_POSTS_CANDIDATE_MODE", "all")
+# Relevance/diversity trade-off of the stored similar posts: 1.0 ranks by combined
+# score only, lower values re-rank the best MMR_CANDIDATE_POOL posts with maximal
+# marginal relevance (e.g. 0.7), so fewer near-identical posts make the list
+SIMILAR_POSTS_MMR_LAMBDA = float(os.getenv("SIMILAR_POSTS_MMR_LAMBDA", "1.0"))
+# How often the per-user sets of own/liked/saved posts filtered out of
+# /similar-posts?viewer_id=... are rebuilt from the database
+VIEWER_EXCLUSIONS_REFRESH_MINUTES = int(
+    os.getenv("VIEWER_EXCLUSIONS_REFRESH_MINUTES", "2")
+)
+# How often the popular-post fallback lists served on a /similar-posts miss are rebuilt
+FALLBACK_LISTS_REFRESH_MINUTES = int(os.getenv("FALLBACK_LISTS_REFRESH_MINUTES", "3"))
+# Share of the similar-users score given to "people you may know" (accounts followed
+# by the accounts a user follows); 0 ranks by post similarity only. Users without
+# posts are recommended from the follow graph alone
+USER_SIMILARITY_GRAPH_WEIGHT = float(os.getenv("USER_SIMILARITY_GRAPH_WEIGHT", "0.3"))
+# Redis holding the task queue and block results of `partitioned_similarity` rebuilds
+SIMILARITY_QUEUE_REDIS_URL = os.getenv(
+    "SIMILARITY_QUEUE_REDIS_URL", "redis://localhost:6379/0"
+)
+
+# Ollama server and model used by the itinerary generator
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+LLM_MODEL = os.getenv("LLM_MODEL", "mistral")
+# How long Ollama keeps the model loaded after a request: a duration ("30m") or seconds,
+# -1 keeps it loaded indefinitely. Sent with every request and with the startup preload.
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "-1")
+# Minutes between keep-alive pings that reload the model if Ollama dropped it; 0 disables
+LLM_KEEP_ALIVE_PING_MINUTES = int(os.getenv("LLM_KEEP_ALIVE_PING_MINUTES", "10"))
+# Context window and CPU threads of the model; 0 keeps the Ollama/model default.
+# Changing these makes Ollama reload the model.
+LLM_NUM_CTX = int(os.getenv("LLM_NUM_CTX", "0"))
+LLM_NUM_THREAD = int(os.getenv("LLM_NUM_THREAD", "0"))
+# Output token caps per kind of generation; 0 means no cap
+LLM_NUM_PREDICT_ITINERARY = int(os.getenv("LLM_NUM_PREDICT_ITINERARY", "3072"))
+LLM_NUM_PREDICT_OUTLINE = int(os.getenv("LLM_NUM_PREDICT_OUTLINE", "512"))
+LLM_NUM_PREDICT_DAY = int(os.getenv("LLM_NUM_PREDICT_DAY", "768"))
+# Generations run at once (match the local model's capacity, e.g. OLLAMA_NUM_PARALLEL)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "1"))
+# Requests allowed to wait for a slot before new ones get a 503
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "8"))
+# Seconds a queued request waits for a slot before giving up with a 503
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+
+# Cache of generated itineraries / day activities, keyed by the normalised request
+ITINERARY_CACHE_ENABLED = os.getenv("ITINERARY_CACHE_ENABLED", "true").lower() == "true"
+ITINERARY_CACHE_TTL_SECONDS = int(os.getenv("ITINERARY_CACHE_TTL_SECONDS", "86400"))
+# Different results kept per request; a request is served from cache once it has this many
+ITINERARY_CACHE_VARIANTS = int(os.getenv("ITINERARY_CACHE_VARIANTS", "1"))
+# Entries kept in the in-process LRU in front of Redis
+ITINERARY_CACHE_LOCAL_SIZE = int(os.getenv("ITINERARY_CACHE_LOCAL_SIZE", "256"))
+
+# Itinerary generation: "single" (one JSON document) or "parallel" (a day-theme outline,
+# then the days generated concurrently, up to LLM_MAX_CONCURRENCY at a time)
+ITINERARY_GENERATION_MODE = os.getenv("ITINERARY_GENERATION_MODE", "single")
+# Extra attempts for a failed outline or single day in parallel mode
+ITINERARY_DAY_RETRIES = int(os.getenv("ITINERARY_DAY_RETRIES", "1"))
+
+# Constrain LLM output to the response JSON schema (Ollama structured outputs)
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+# Repair slightly broken JSON output (code fences, trailing commas, truncation)
+LLM_JSON_REPAIR = os.getenv("LLM_JSON_REPAIR", "true").lower() == "true"
+# Regenerations of an output that is unusable even after repair
+LLM_JSON_RETRIES = int(os.getenv("LLM_JSON_RETRIES", "1"))
+
+# Profiling: number of upcoming scheduled job runs / API requests to profile (0 = off)
+PROFILE_NEXT_JOBS = int(os.getenv("PROFILE_NEXT_JOBS", "0"))
+PROFILE_NEXT_REQUESTS = int(os.getenv("PROFILE_NEXT_REQUESTS", "0"))
+# "sampling" (stack samples, flamegraph collapsed format) or "deterministic" (cProfile)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampling")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# Also trace allocations and report the top allocation sites of each profiled run
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "true").lower() == "true"
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "25"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "../api/data/profiles")
+# Token for POST /admin/profiling (X-Admin-Token header); the endpoint is off when empty
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
@@ -1,8 +1,19 @@
-TOP_N_SIMILAR_POSTS = 10  # Number of most similar posts to store
+TOP_N_SIMILAR_POSTS = 10  # Number of most similar posts returned
+# Similar posts stored per post, best first: room to filter out a viewer's own, liked
+# and saved posts and still return TOP_N_SIMILAR_POSTS
+SIMILAR_POSTS_STORED = 50
+MMR_CANDIDATE_POOL = (
+    100  # Best posts re-ranked for diversity (SIMILAR_POSTS_MMR_LAMBDA)
+)
+MMR_BLOCK_SIZE = 256  # Posts re-ranked together in one vectorized block
 TOP_N_SIMILAR_USERS = 10
 WEIGHT_TFIDF = 0.5
 WEIGHT_SBERT = 0.5
 
+# Location/tag buckets for similar-post candidates (see SIMILAR_POSTS_CANDIDATE_MODE)
+BUCKET_LOCATION_BOOST = 0.1  # Added to the combined score for the same destination
+BUCKET_TAG_BOOST = 0.05  # Added when at least one tag is shared
+
 PATH_POSTS_CSV = "../api/data/posts.csv"
 
 # TF-IDF paths
@@ -14,6 +25,63 @@ PATH_TFIDF_MATRIX = "../api/data/tfidf_matrix.npz"
 PATH_SIMILARITY_MATRIX_SBERT = "../api/data/posts_similarity_matrix_SBERT.csv"
 PATH_SBERT_MODEL = "../api/data/sbert_model"
 PATH_SBERT_MATRIX = "../api/data/sbert_matrix.npz"
+PATH_SBERT_CALIBRATION = "../api/data/sbert_score_calibration.json"
+PATH_SBERT_ONNX_MODEL = "../api/data/sbert_model_onnx/model.onnx"
+PATH_SBERT_ONNX_MODEL_QUANTIZED = "../api/data/sbert_model_onnx/model.quant.onnx"
+
+# Lexical (BM25) index over Caption/Body + Location/Tags
+PATH_LEXICAL_INDEX = "../api/data/lexical_index.npz"
+BM25_K1 = 1.2
+BM25_B = 0.75
+LEXICAL_METADATA_BOOST = 2.0  # Location/Tags term counts weigh this much more
+
+# Semantic search
+SEARCH_MAX_BATCH_SIZE = 32  # Max queries encoded together in one encoder call
+SEARCH_MAX_WAIT_MS = 5  # How long a query waits for others to join its batch
+SEARCH_QUERY_CACHE_SIZE = 1024  # Query embeddings kept in the LRU cache
+HYBRID_CANDIDATES = 200  # Posts taken from the postings before dense re-scoring
+HYBRID_WEIGHT_LEXICAL = 0.4
+HYBRID_WEIGHT_SEMANTIC = 0.6
+
+# Read-side search index shared by the API workers (see index_generations)
+PATH_SEARCH_INDEX = "../api/data/search_index"
+SEARCH_INDEX_KEEP_GENERATIONS = 2  # Older generations kept for workers still switching
+
+# Partitioned full rebuild (see partitioned_similarity): job inputs shared with the
+# workers, posts scored per task, and the wait without progress before re-queueing
+PATH_PARTITION_JOBS = "../api/data/partition_jobs"
+PARTITION_BLOCK_SIZE = 512
+PARTITION_CALIBRATION_SAMPLE = 2048  # Rows sampled to estimate the SBERT score range
+PARTITION_TASK_TIMEOUT_SECONDS = 600
+
+# Follow graph and post authors of the user similarity job (see follow_graph)
+PATH_FOLLOW_GRAPH = "../api/data/follow_graph.npz"
+
+# Friends-of-friends candidates of similar users (see friends_of_friends)
+FOF_CANDIDATES = 50  # Candidates kept per user before blending
+FOF_MAX_INTERMEDIARY_DEGREE = 1000  # Accounts following more are not used as a link
+FOF_BLOCK_SIZE = 2048  # Users scored per sparse product
+
+# Lists served when a post or user has no stored similar list (see fallback_lists)
+FALLBACK_LIST_SIZE = 50  # Posts/users per fallback list
+FALLBACK_TAGS_PER_POST = 3  # Tag lists tried for a post, after its location's
+FALLBACK_GRAVITY = 1.5  # Popularity = likes / (age in hours + 2) ** gravity
+# fallback_posts:{group} holds the most popular posts of a group ("global",
+# "location:{key}", "tag:{key}"), the fallback_post_groups hash the groups tried for
+# each post, best first
+FALLBACK_POSTS_PREFIX = "fallback_posts:"
+FALLBACK_POSTS_GLOBAL = "fallback_posts:global"
+FALLBACK_POST_GROUPS = "fallback_post_groups"
+FALLBACK_USERS = "fallback_users:global"
+
+# Minutes between runs of the similar posts/users jobs
+SIMILAR_POSTS_REFRESH_MINUTES = 6
+SIMILAR_USERS_REFRESH_MINUTES = 7
+# Hash of list name -> version (ms timestamp) of the last rewrite (see list_versions)
+LIST_VERSIONS = "list_versions"
+
+# Only the worker holding this lock runs the scheduled jobs
+PATH_SCHEDULER_LOCK = "../api/data/scheduler.lock"
 
 # ITINERARY GENERATOR JSONs
 ITINERARY_JSON_STRUCTURE = """
@@ -36,6 +104,17 @@ ITINERARY_JSON_STRUCTURE = """
 }
 """
 
+ITINERARY_OUTLINE_JSON_STRUCTURE = """
+  [
+    {
+      "day": integer (day number),
+      "theme": "string (short theme of the day, e.g. area or kind of activities)",
+      "highlights": ["string (name of a main point of interest of the day)", ...]
+    },
+    ...
+  ]
+"""
+
 ITINERARY_DAY_ACTIVITIES_JSON_STRUCTURE = """
   [
     {
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, text
+import logging
+from sqlalchemy import bindparam, create_engine, text
 import urllib
 from collections import defaultdict
 
@@ -13,20 +14,32 @@ DATABASE_URL = f"mssql+pyodbc:///?odbc_connect={params}"
 
 engine = create_engine(DATABASE_URL)
 
+logger = logging.getLogger(__name__)
+
 
 def fetch_unprocessed_inserted_posts():
     """Fetch unprocessed inserted posts from PostChanges."""
     try:
         with engine.connect() as conn:
+            # Location and Tags are not logged in PostChanges, read them from Posts
             query = text(
-                "SELECT PostId, Caption, Body FROM PostChanges WHERE ChangeType = 'INSERT' AND Processed = 0"
+                "SELECT pc.PostId, pc.Caption, pc.Body, p.Location, p.Tags "
+                "FROM PostChanges pc LEFT JOIN Posts p ON p.PostId = pc.PostId "
+                "WHERE pc.ChangeType = 'INSERT' AND pc.Processed = 0"
             )
             result = conn.execute(query).fetchall()
             return [
-                {"PostId": row[0], "Caption": row[1], "Body": row[2]} for row in result
+                {
+                    "PostId": row[0],
+                    "Caption": row[1],
+                    "Body": row[2],
+                    "Location": row[3],
+                    "Tags": row[4],
+                }
+                for row in result
             ]
-    except Exception as e:
-        print(f"❌ Failed to fetch inserted posts: {e}")
+    except Exception:
+        logger.exception("Failed to fetch inserted posts")
         return []
 
 
@@ -34,15 +47,25 @@ def fetch_unprocessed_updated_posts():
     """Fetch unprocessed updated posts from PostChanges."""
     try:
         with engine.connect() as conn:
+            # Location and Tags are not logged in PostChanges, read them from Posts
             query = text(
-                "SELECT PostId, Caption, Body FROM PostChanges WHERE ChangeType = 'UPDATE' AND Processed = 0"
+                "SELECT pc.PostId, pc.Caption, pc.Body, p.Location, p.Tags "
+                "FROM PostChanges pc LEFT JOIN Posts p ON p.PostId = pc.PostId "
+                "WHERE pc.ChangeType = 'UPDATE' AND pc.Processed = 0"
             )
             result = conn.execute(query).fetchall()
             return [
-                {"PostId": row[0], "Caption": row[1], "Body": row[2]} for row in result
+                {
+                    "PostId": row[0],
+                    "Caption": row[1],
+                    "Body": row[2],
+                    "Location": row[3],
+                    "Tags": row[4],
+                }
+                for row in result
             ]
-    except Exception as e:
-        print(f"❌ Failed to fetch updated posts: {e}")
+    except Exception:
+        logger.exception("Failed to fetch updated posts")
         return []
 
 
@@ -53,15 +76,15 @@ def fetch_unprocessed_deleted_posts():
             query = text("SELECT PostId FROM DeletedPosts WHERE Processed = 0")
             result = conn.execute(query).fetchall()
             return [row[0] for row in result]
-    except Exception as e:
-        print(f"❌ Failed to fetch deleted posts: {e}")
+    except Exception:
+        logger.exception("Failed to fetch deleted posts")
         return []
 
 
 def mark_as_processed(post_ids):
     """Mark posts in PostChanges as processed (Processed = 1)."""
     if not post_ids:
-        print("⚠️ No inserted or updated posts to mark as processed.")
+        logger.warning("No inserted or updated posts to mark as processed")
         return
 
     try:
@@ -77,15 +100,18 @@ def mark_as_processed(post_ids):
             conn.execute(query, params)
             conn.commit()
 
-            print(f"✅ Marked {len(post_ids)} posts as processed in PostChanges.")
-    except Exception as e:
-        print(f"❌ Failed to mark posts as processed: {e}")
+            logger.info(
+                "Marked posts as processed in PostChanges",
+                extra={"posts": len(post_ids)},
+            )
+    except Exception:
+        logger.exception("Failed to mark posts as processed")
 
 
 def mark_deletions_as_processed(post_ids):
     """Mark posts in DeletedPosts as processed (Processed = 1)."""
     if not post_ids:
-        print("⚠️ No deleted posts to mark as processed.")
+        logger.warning("No deleted posts to mark as processed")
         return
 
     try:
@@ -100,11 +126,12 @@ def mark_deletions_as_processed(post_ids):
             conn.execute(query, params)
             conn.commit()
 
-            print(
-                f"✅ Marked {len(post_ids)} deleted posts as processed in DeletedPosts."
+            logger.info(
+                "Marked deleted posts as processed in DeletedPosts",
+                extra={"posts": len(post_ids)},
             )
-    except Exception as e:
-        print(f"❌ Failed to mark deleted posts as processed: {e}")
+    except Exception:
+        logger.exception("Failed to mark deleted posts as processed")
 
 
 def delete_processed_data():
@@ -119,9 +146,9 @@ def delete_processed_data():
             conn.execute(delete_deleted_posts)
             conn.commit()
 
-            print("✅ Successfully deleted all processed entries.")
-    except Exception as e:
-        print(f"❌ Failed to delete processed entries: {e}")
+            logger.info("Deleted all processed entries")
+    except Exception:
+        logger.exception("Failed to delete processed entries")
         conn.rollback()
 
 
@@ -133,8 +160,8 @@ def get_post_ids_by_user(user_id: str) -> list[str]:
             query = text("SELECT PostId FROM Posts WHERE UserId = :user_id")
             result = conn.execute(query, {"user_id": user_id}).fetchall()
             return [str(row[0]) for row in result]
-    except Exception as e:
-        print(f"❌ Failed to fetch posts for user {user_id}: {e}")
+    except Exception:
+        logger.exception("Failed to fetch posts for user", extra={"user_id": user_id})
         return []
 
 
@@ -145,11 +172,36 @@ def get_post_user_mapping():
             query = text("SELECT PostId, UserId FROM Posts")
             result = conn.execute(query).fetchall()
             return {str(row[0]): str(row[1]) for row in result}
-    except Exception as e:
-        print(f"❌ Failed to fetch post-user mapping: {e}")
+    except Exception:
+        logger.exception("Failed to fetch post-user mapping")
         return {}
 
 
+def get_user_excluded_posts() -> dict[str, set[str]]:
+    """
+    Maps each user to the posts they wrote, liked or saved, i.e. the posts never worth
+    recommending to them. Returns None if the query fails.
+    """
+    try:
+        with engine.connect() as conn:
+            query = text(
+                "SELECT UserId, PostId FROM Posts "
+                "UNION SELECT UserId, PostId FROM Likes "
+                "UNION SELECT UserId, PostId FROM Saves"
+            )
+            result = conn.execute(query).fetchall()
+
+            excluded = defaultdict(set)
+            for row in result:
+                excluded[str(row[0])].add(str(row[1]))
+
+            return excluded
+
+    except Exception:
+        logger.exception("Failed to fetch own, liked and saved posts")
+        return None
+
+
 def get_user_followings_map() -> dict[str, set[str]]:
     """Fetches a mapping of user_id -> set of user_ids they follow."""
     try:
@@ -165,6 +217,124 @@ def get_user_followings_map() -> dict[str, set[str]]:
 
             return followings
 
-    except Exception as e:
-        print(f"❌ Failed to fetch user followings: {e}")
+    except Exception:
+        logger.exception("Failed to fetch user followings")
         return {}
+
+
+def get_follows_since(followed_at=None):
+    """
+    Fetches the follows made at or after `followed_at` (all of them if None), plus the
+    current number of follows, in one connection.
+
+    Returns:
+        tuple: (follow_count, [(follower_id, followed_id, followed_at), ...]),
+            or None if the query fails.
+    """
+    try:
+        with engine.connect() as conn:
+            count = conn.execute(text("SELECT COUNT(*) FROM Follows")).scalar()
+            query = "SELECT UserIdFollowing, UserIdFollowed, FollowedAt FROM Follows"
+            if followed_at is not None:
+                query += " WHERE FollowedAt >= :followed_at"
+            result = conn.execute(text(query), {"followed_at": followed_at}).fetchall()
+            rows = [(str(row[0]), str(row[1]), row[2]) for row in result]
+            return count, rows
+
+    except Exception:
+        logger.exception("Failed to fetch follows")
+        return None
+
+
+def get_posts_since(created_at=None):
+    """
+    Fetches the authors of posts created at or after `created_at` (all posts if None),
+    plus the current number of posts, in one connection.
+
+    Returns:
+        tuple: (post_count, [(post_id, user_id, created_at), ...]),
+            or None if the query fails.
+    """
+    try:
+        with engine.connect() as conn:
+            count = conn.execute(text("SELECT COUNT(*) FROM Posts")).scalar()
+            query = "SELECT PostId, UserId, CreatedAt FROM Posts"
+            if created_at is not None:
+                query += " WHERE CreatedAt >= :created_at"
+            result = conn.execute(text(query), {"created_at": created_at}).fetchall()
+            rows = [(str(row[0]), str(row[1]), row[2]) for row in result]
+            return count, rows
+
+    except Exception:
+        logger.exception("Failed to fetch post authors")
+        return None
+
+
+# Column holding the user a Follows/Posts row belongs to
+USER_COLUMNS = {"Follows": "UserIdFollowing", "Posts": "UserId"}
+
+
+def get_row_counts_by_user(table: str):
+    """
+    Number of follows per follower (table="Follows") or posts per author ("Posts").
+
+    Returns:
+        list: [(user_id, count), ...], or None if the query fails.
+    """
+    column = USER_COLUMNS[table]
+    try:
+        with engine.connect() as conn:
+            query = text(f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}")
+            return [(str(row[0]), row[1]) for row in conn.execute(query).fetchall()]
+    except Exception:
+        logger.exception("Failed to count rows per user", extra={"table": table})
+        return None
+
+
+def get_rows_of_users(table: str, user_ids) -> list:
+    """
+    All follows made by (table="Follows") or posts written by ("Posts") the given
+    users, as the rows of `get_follows_since`/`get_posts_since`. None if a query fails.
+    """
+    column = USER_COLUMNS[table]
+    columns = {
+        "Follows": "UserIdFollowing, UserIdFollowed, FollowedAt",
+        "Posts": "PostId, UserId, CreatedAt",
+    }[table]
+    query = text(
+        f"SELECT {columns} FROM {table} WHERE {column} IN :user_ids"
+    ).bindparams(bindparam("user_ids", expanding=True))
+    user_ids = list(user_ids)
+    rows = []
+    try:
+        with engine.connect() as conn:
+            # Chunked: SQL Server takes at most 2100 parameters per statement
+            for start in range(0, len(user_ids), 1000):
+                chunk = user_ids[start : start + 1000]
+                result = conn.execute(query, {"user_ids": chunk}).fetchall()
+                rows.extend((str(row[0]), str(row[1]), row[2]) for row in result)
+        return rows
+    except Exception:
+        logger.exception("Failed to fetch rows of users", extra={"table": table})
+        return None
+
+
+def get_post_popularity():
+    """
+    Fetches the location, tags, like count and creation time of every post, which the
+    fallback lists are ranked and grouped by.
+
+    Returns:
+        list: [(post_id, location, tags, like_count, created_at), ...],
+            or None if the query fails.
+    """
+    try:
+        with engine.connect() as conn:
+            query = text(
+                "SELECT PostId, Location, Tags, LikeCount, CreatedAt FROM Posts"
+            )
+            result = conn.execute(query).fetchall()
+            return [(str(row[0]), row[1], row[2], row[3], row[4]) for row in result]
+    except Exception:
+        logger.exception("Failed to fetch post popularity")
+        return None
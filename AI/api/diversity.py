@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def mmr_select(
+    relevance: np.ndarray, embeddings: np.ndarray, top_n: int, relevance_weight: float
+) -> np.ndarray:
+    """
+    Maximal marginal relevance over a block of candidate pools, one pool per row.
+
+    Greedily picks, for every row at once, the candidate maximizing
+        relevance_weight * relevance - (1 - relevance_weight) * max cosine to picked ones
+    so each step costs one (rows x pool) update instead of a Python loop per post.
+
+    Args:
+        relevance: (rows, pool) scores; -inf marks padding, picked only once a pool
+            has no real candidate left.
+        embeddings: (rows, pool, dim) L2-normalized candidate embeddings.
+        top_n: Candidates picked per row.
+        relevance_weight: 1.0 ranks by relevance only, lower values favour diversity.
+
+    Returns:
+        np.ndarray: (rows, top_n) pool positions, in pick order.
+    """
+    rows, pool = relevance.shape
+    top_n = min(top_n, pool)
+    pairwise = np.matmul(embeddings, embeddings.transpose(0, 2, 1))
+
+    row_index = np.arange(rows)
+    max_similarity = np.full((rows, pool), -np.inf, dtype=np.float32)
+    available = np.ones((rows, pool), dtype=bool)
+    picked = np.empty((rows, top_n), dtype=np.int64)
+
+    for step in range(top_n):
+        penalty = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        score = relevance_weight * relevance - (1 - relevance_weight) * penalty
+        # Padding only once nothing else is left, already picked never
+        score = np.where(np.isfinite(relevance), score, -np.finfo(np.float32).max)
+        score[~available] = -np.inf
+        choice = np.argmax(score, axis=1)
+
+        picked[:, step] = choice
+        available[row_index, choice] = False
+        max_similarity = np.maximum(max_similarity, pairwise[row_index, choice])
+
+    return picked
@@ -0,0 +1,162 @@
+import numpy as np
+
+SUPPORTED_PRECISIONS = ("float32", "float16", "int8")
+INT8_MAX = 127
+SIMILARITY_BLOCK_SIZE = 4096  # Stored rows dequantized at once by cosine_similarity
+
+
+def l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Returns a float32 copy of the embeddings scaled to unit length."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 1:
+        embeddings = embeddings.reshape(1, -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # Leave all-zero rows untouched
+    return embeddings / norms
+
+
+def quantize(embeddings: np.ndarray, precision: str):
+    """
+    Normalizes and quantizes float embeddings to the given storage precision.
+
+    Returns:
+        tuple: (data, scales) where scales is a per-row float32 array for int8, None otherwise.
+    """
+    if precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(
+            f"Unsupported embedding precision '{precision}', expected one of {SUPPORTED_PRECISIONS}."
+        )
+
+    normalized = l2_normalize(embeddings)
+
+    if precision == "float32":
+        return normalized, None
+    if precision == "float16":
+        return normalized.astype(np.float16), None
+
+    # int8: symmetric quantization with one scale per vector
+    scales = np.abs(normalized).max(axis=1) / INT8_MAX
+    scales[scales == 0] = 1.0
+    data = np.clip(np.rint(normalized / scales[:, None]), -INT8_MAX, INT8_MAX)
+    return data.astype(np.int8), scales.astype(np.float32)
+
+
+class QuantizedEmbeddings:
+    """
+    SBERT embedding matrix kept in its storage precision (float32, float16 or int8).
+
+    Rows are L2-normalized before quantization, so cosine similarity is a plain dot product
+    computed directly against the stored rows.
+    """
+
+    def __init__(
+        self, data: np.ndarray, scales: np.ndarray = None, precision="float32"
+    ):
+        self.data = data
+        self.scales = scales
+        self.precision = precision
+
+    @classmethod
+    def from_float(
+        cls, embeddings: np.ndarray, precision: str
+    ) -> "QuantizedEmbeddings":
+        data, scales = quantize(embeddings, precision)
+        return cls(data, scales, precision)
+
+    @classmethod
+    def load(cls, path: str, precision: str = None) -> "QuantizedEmbeddings":
+        """
+        Loads embeddings saved by `save` (or a legacy float32 `arr_0` matrix).
+        If `precision` differs from the stored one, the matrix is converted.
+        """
+        with np.load(path) as stored:
+            data = stored["arr_0"]
+            scales = stored["scales"] if "scales" in stored.files else None
+            stored_precision = (
+                str(stored["precision"]) if "precision" in stored.files else "float32"
+            )
+
+        if stored_precision == "float32":
+            # Legacy matrices were saved without normalization
+            data = l2_normalize(data)
+
+        embeddings = cls(data, scales, stored_precision)
+
+        if precision and precision != stored_precision:
+            embeddings = cls.from_float(embeddings.to_float32(), precision)
+
+        return embeddings
+
+    def save(self, path: str):
+        arrays = {"arr_0": self.data, "precision": np.array(self.precision)}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        np.savez_compressed(path, **arrays)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        scales_nbytes = self.scales.nbytes if self.scales is not None else 0
+        return self.data.nbytes + scales_nbytes
+
+    def _dequantize_rows(self, start: int, stop: int) -> np.ndarray:
+        block = self.data[start:stop].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:stop, None]
+        return block
+
+    def to_float32(self) -> np.ndarray:
+        return self._dequantize_rows(0, len(self))
+
+    def append(self, embeddings: np.ndarray) -> "QuantizedEmbeddings":
+        """Returns a new matrix with the given float embeddings added as the last rows."""
+        data, scales = quantize(embeddings, self.precision)
+        return QuantizedEmbeddings(
+            np.vstack([self.data, data]),
+            np.concatenate([self.scales, scales]) if scales is not None else None,
+            self.precision,
+        )
+
+    def replace_rows(self, indices, embeddings: np.ndarray):
+        """Overwrites the given rows in place with newly quantized float embeddings."""
+        data, scales = quantize(embeddings, self.precision)
+        self.data[indices] = data
+        if scales is not None:
+            self.scales[indices] = scales
+
+    def take_rows(self, indices) -> "QuantizedEmbeddings":
+        """Returns a new matrix holding only the given rows, in order."""
+        return QuantizedEmbeddings(
+            self.data[indices],
+            self.scales[indices] if self.scales is not None else None,
+            self.precision,
+        )
+
+    def cosine_similarity(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Computes cosine similarity between float query vectors and every stored row.
+
+        Stored rows are dequantized one block at a time, so peak extra memory is bounded
+        by SIMILARITY_BLOCK_SIZE rows regardless of corpus size.
+
+        Returns:
+            np.ndarray: float32 matrix of shape (len(queries), len(self)).
+        """
+        queries = l2_normalize(queries)
+        similarities = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+
+        for start in range(0, len(self), SIMILARITY_BLOCK_SIZE):
+            stop = min(start + SIMILARITY_BLOCK_SIZE, len(self))
+            if self.precision == "float32":
+                block = self.data[start:stop]
+                similarities[:, start:stop] = queries @ block.T
+            else:
+                block = self.data[start:stop].astype(np.float32)
+                block_similarities = queries @ block.T
+                if self.scales is not None:
+                    block_similarities *= self.scales[start:stop]
+                similarities[:, start:stop] = block_similarities
+
+        return similarities
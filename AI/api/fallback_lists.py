@@ -0,0 +1,163 @@
+import logging
+import numpy as np
+import pandas as pd
+import redis
+from candidate_buckets import location_key, tag_keys
+from constants import (
+    FALLBACK_GRAVITY,
+    FALLBACK_LIST_SIZE,
+    FALLBACK_POST_GROUPS,
+    FALLBACK_POSTS_PREFIX,
+    FALLBACK_TAGS_PER_POST,
+    FALLBACK_USERS,
+)
+from database_operations import get_post_popularity
+from follow_graph import FollowGraph
+from list_versions import list_fingerprint, lists_changed, mark_lists_updated
+from observability import stage, execute_redis_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Connect to Redis
+redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
+
+WRITE_BATCH_SIZE = 1000  # Keys written per pipeline round-trip
+
+
+def post_popularity(like_counts: pd.Series, created_at: pd.Series) -> np.ndarray:
+    """
+    Likes / (age in hours + 2) ** FALLBACK_GRAVITY, so a recent post needs few likes to
+    outrank an old popular one. Ages are counted from the newest post rather than the
+    clock, which keeps the ranking independent of the database's time zone.
+    """
+    created = pd.to_datetime(created_at, errors="coerce")
+    age_hours = (created.max() - created).dt.total_seconds() / 3600
+    age_hours = age_hours.fillna(age_hours.max()).fillna(0).to_numpy()
+    likes = pd.to_numeric(like_counts, errors="coerce").fillna(0).to_numpy()
+    return likes / (age_hours + 2) ** FALLBACK_GRAVITY
+
+
+def rank_fallback_posts(rows) -> tuple[dict[str, list[str]], dict[str, str]]:
+    """
+    Groups posts by location and tag, most popular first.
+
+    Returns:
+        tuple: ({group: top post_ids}, {post_id: comma-separated groups}). A list keeps
+            one post more than FALLBACK_LIST_SIZE, as the post asked about is left out
+            when it is served. Posts only map to groups with another post in them.
+    """
+    posts = pd.DataFrame(
+        rows, columns=["PostId", "Location", "Tags", "LikeCount", "CreatedAt"]
+    )
+    order = np.argsort(
+        -post_popularity(posts["LikeCount"], posts["CreatedAt"]), kind="stable"
+    )
+    posts = posts.iloc[order]
+
+    lists = {"global": []}
+    sizes = {}
+    groups_of = {}
+    for post_id, location, tags in zip(
+        posts["PostId"], posts["Location"], posts["Tags"]
+    ):
+        location = location_key(location)
+        groups = [f"location:{location}"] if location else []
+        groups += [f"tag:{tag}" for tag in tag_keys(tags)[:FALLBACK_TAGS_PER_POST]]
+        groups_of[post_id] = groups
+        for group in ["global", *groups]:
+            sizes[group] = sizes.get(group, 0) + 1
+            if sizes[group] <= FALLBACK_LIST_SIZE + 1:
+                lists.setdefault(group, []).append(post_id)
+
+    post_groups = {
+        post_id: ",".join(group for group in groups if sizes[group] > 1)
+        for post_id, groups in groups_of.items()
+    }
+    lists = {
+        group: post_ids
+        for group, post_ids in lists.items()
+        if group == "global" or sizes[group] > 1
+    }
+    return lists, {post_id: g for post_id, g in post_groups.items() if g}
+
+
+def refresh_fallback_posts():
+    """
+    Rebuilds the popular-post lists GET /similar-posts/{post_id} serves when the post
+    has no stored similar posts yet: the post's location list, then its tag lists, then
+    the global one, all in the endpoint's single Lua call.
+
+    The group map is written under a staging key and renamed into place, lists of
+    groups that no longer have posts are removed.
+    """
+    with stage("fallbacks", "fetch") as s:
+        rows = get_post_popularity()
+        if rows is None:
+            return  # Keep the current lists rather than wiping them
+        s.rows = len(rows)
+
+    with stage("fallbacks", "rank") as s:
+        lists, post_groups = rank_fallback_posts(rows)
+        s.rows = len(lists)
+
+    with stage("fallbacks", "redis_update") as s:
+        stale_keys = set(
+            redis_client.scan_iter(match=f"{FALLBACK_POSTS_PREFIX}*", count=1000)
+        )
+
+        pipeline = redis_client.pipeline(transaction=False)
+        for i, (group, post_ids) in enumerate(lists.items(), start=1):
+            key = f"{FALLBACK_POSTS_PREFIX}{group}"
+            pipeline.set(key, ",".join(post_ids))
+            stale_keys.discard(key)
+            if i % WRITE_BATCH_SIZE == 0:
+                execute_redis_pipeline(pipeline, "fallbacks")
+                pipeline = redis_client.pipeline(transaction=False)
+        for key in stale_keys:
+            pipeline.delete(key)
+
+        staging = f"{FALLBACK_POST_GROUPS}:staging"
+        pipeline.delete(staging)
+        items = list(post_groups.items())
+        for start in range(0, len(items), WRITE_BATCH_SIZE):
+            pipeline.hset(
+                staging, mapping=dict(items[start : start + WRITE_BATCH_SIZE])
+            )
+        if items:
+            pipeline.rename(staging, FALLBACK_POST_GROUPS)
+        else:
+            pipeline.delete(FALLBACK_POST_GROUPS)
+        fingerprint = list_fingerprint(
+            [f"{group}={','.join(ids)}" for group, ids in sorted(lists.items())]
+            + [f"{post_id}={groups}" for post_id, groups in sorted(items)]
+        )
+        if lists_changed(redis_client, "fallback_posts", fingerprint):
+            mark_lists_updated(pipeline, "fallback_posts", fingerprint=fingerprint)
+        execute_redis_pipeline(pipeline, "fallbacks")
+        s.rows = len(lists)
+
+    logger.info(
+        "Fallback post lists refreshed",
+        extra={"lists": len(lists), "posts": len(rows), "removed": len(stale_keys)},
+    )
+
+
+def write_fallback_users(graph: FollowGraph):
+    """
+    Stores the most followed users, which GET /similar-users/{user_id} serves when the
+    user has no stored similar users (e.g. no posts and no follows yet).
+    """
+    followers = np.bincount(graph.indices, minlength=len(graph.user_ids))
+    order = np.argsort(-followers, kind="stable")[: FALLBACK_LIST_SIZE + 1]
+    popular = graph.user_ids[order[followers[order] > 0]].tolist()
+    fingerprint = list_fingerprint(popular)
+    if not lists_changed(redis_client, "fallback_users", fingerprint):
+        return
+
+    pipeline = redis_client.pipeline()
+    if popular:
+        pipeline.set(FALLBACK_USERS, ",".join(popular))
+    else:
+        pipeline.delete(FALLBACK_USERS)
+    mark_lists_updated(pipeline, "fallback_users", fingerprint=fingerprint)
+    execute_redis_pipeline(pipeline, "users")
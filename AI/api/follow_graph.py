@@ -0,0 +1,310 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from constants import PATH_FOLLOW_GRAPH
+from database_operations import (
+    get_follows_since,
+    get_posts_since,
+    get_row_counts_by_user,
+    get_rows_of_users,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FollowGraph:
+    """
+    Follow graph and post authors of the user similarity job, in compact arrays.
+
+    Users are integers: their position in the sorted `user_ids`. Follows are CSR
+    adjacency (`indptr`, `indices`: the users row u follows, sorted), and post authors an
+    array of user positions aligned with the sorted `post_ids`. That is a few bytes per
+    follow instead of a Python set entry and string per follow, and lookups are binary
+    searches, as in `lexical_index`.
+
+    The graph is kept between runs and on disk, and brought up to date from the rows
+    added since the newest `FollowedAt`/`CreatedAt` seen (the watermarks). Unfollows and
+    post deletions leave no timestamp behind: they show up as a row count that differs
+    from the graph's, and only the users whose own count differs are fetched again.
+    """
+
+    def __init__(
+        self,
+        user_ids=None,
+        indptr=None,
+        indices=None,
+        post_ids=None,
+        post_authors=None,
+        follows_watermark: str = None,
+        posts_watermark: str = None,
+    ):
+        self.user_ids = np.array([] if user_ids is None else user_ids, dtype=str)
+        self.indptr = (
+            np.zeros(len(self.user_ids) + 1, dtype=np.int64)
+            if indptr is None
+            else indptr
+        )
+        self.indices = np.empty(0, dtype=np.int32) if indices is None else indices
+        self.post_ids = np.array([] if post_ids is None else post_ids, dtype=str)
+        self.post_authors = (
+            np.empty(0, dtype=np.int32) if post_authors is None else post_authors
+        )
+        self.follows_watermark = follows_watermark
+        self.posts_watermark = posts_watermark
+
+    @property
+    def n_follows(self) -> int:
+        return len(self.indices)
+
+    @property
+    def n_posts(self) -> int:
+        return len(self.post_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (
+                self.user_ids,
+                self.indptr,
+                self.indices,
+                self.post_ids,
+                self.post_authors,
+            )
+        )
+
+    def user_index(self, user_ids) -> np.ndarray:
+        """Positions of the given users, -1 for unknown ones."""
+        return _positions(self.user_ids, np.asarray(user_ids, dtype=str))
+
+    def followed(self, user_id: str) -> np.ndarray:
+        """IDs of the users `user_id` follows."""
+        user = self.user_index([user_id])[0]
+        if user < 0:
+            return self.user_ids[:0]
+        return self.user_ids[self.indices[self.indptr[user] : self.indptr[user + 1]]]
+
+    def posts_by_user(self) -> dict[str, list[str]]:
+        """Maps each user with posts to the IDs of their posts."""
+        order = np.argsort(self.post_authors, kind="stable")
+        authors, starts = np.unique(self.post_authors[order], return_index=True)
+        groups = np.split(self.post_ids[order], starts[1:])
+        return {
+            str(self.user_ids[author]): group.tolist()
+            for author, group in zip(authors, groups)
+        }
+
+    def follows_per_user(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def posts_per_user(self) -> np.ndarray:
+        return np.bincount(self.post_authors, minlength=len(self.user_ids))
+
+    def _index_batch(self, user_ids) -> np.ndarray:
+        """
+        Positions of a batch of user IDs, adding the unknown ones. IDs are hashed once
+        (a batch repeats few users many times), only the distinct ones are searched.
+        """
+        codes, distinct = pd.factorize(np.asarray(user_ids, dtype=object))
+        distinct = distinct.astype(str)
+        new_users = np.sort(distinct[self.user_index(distinct) < 0])
+        if len(new_users):
+            # Positions of later users shift: remap the stored follows and authors
+            merged, _ = _insert_sorted(self.user_ids, new_users)
+            remap = np.searchsorted(merged, self.user_ids).astype(np.int32)
+            degrees = np.zeros(len(merged), dtype=np.int64)
+            degrees[remap] = self.follows_per_user()
+            self.indptr = np.concatenate([[0], np.cumsum(degrees)])
+            self.indices = remap[self.indices]  # Still sorted: remap is monotonic
+            self.post_authors = remap[self.post_authors]
+            self.user_ids = merged
+        return self.user_index(distinct)[codes]
+
+    def _edge_keys(self) -> np.ndarray:
+        """Follows as sorted follower * n_users + followed keys."""
+        n_users = len(self.user_ids)
+        followers = np.repeat(np.arange(n_users, dtype=np.int64), np.diff(self.indptr))
+        return followers * n_users + self.indices
+
+    def _set_edges(self, keys: np.ndarray):
+        n_users = len(self.user_ids)
+        self.indptr = np.searchsorted(
+            keys, np.arange(n_users + 1, dtype=np.int64) * n_users
+        ).astype(np.int64)
+        self.indices = (keys % n_users).astype(np.int32)
+
+    def add_follows(self, rows):
+        """Merges (follower_id, followed_id, ...) rows; known follows are skipped."""
+        if not rows:
+            return
+        positions = self._index_batch(
+            [row[0] for row in rows] + [row[1] for row in rows]
+        )
+        followers, followed = positions[: len(rows)], positions[len(rows) :]
+
+        keys = self._edge_keys()
+        added = np.unique(followers.astype(np.int64) * len(self.user_ids) + followed)
+        added = added[_positions(keys, added) < 0]
+        if len(added):
+            self._set_edges(_insert_sorted(keys, added)[0])
+
+    def add_posts(self, rows):
+        """Merges (post_id, user_id, ...) rows; known posts are skipped."""
+        if not rows:
+            return
+        post_ids, first = np.unique(
+            np.array([row[0] for row in rows], dtype=str), return_index=True
+        )
+        new = _positions(self.post_ids, post_ids) < 0
+        if not new.any():
+            return
+        authors = self._index_batch([rows[i][1] for i in first[new]])
+        self.post_ids, positions = _insert_sorted(self.post_ids, post_ids[new])
+        self.post_authors = np.insert(
+            self.post_authors, positions, authors.astype(np.int32)
+        )
+
+    def remove_follows_of(self, user_ids):
+        """Drops every follow made by the given users."""
+        followers = np.repeat(np.arange(len(self.user_ids)), self.follows_per_user())
+        keep = ~np.isin(followers, self.user_index(user_ids))
+        self._set_edges(self._edge_keys()[keep])
+
+    def remove_posts_of(self, user_ids):
+        """Drops every post written by the given users."""
+        keep = ~np.isin(self.post_authors, self.user_index(user_ids))
+        self.post_ids = self.post_ids[keep]
+        self.post_authors = self.post_authors[keep]
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            user_ids=self.user_ids,
+            indptr=self.indptr,
+            indices=self.indices,
+            post_ids=self.post_ids,
+            post_authors=self.post_authors,
+            watermarks=np.array(
+                [self.follows_watermark or "", self.posts_watermark or ""], dtype=str
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "FollowGraph":
+        with np.load(path) as stored:
+            follows_watermark, posts_watermark = stored["watermarks"].tolist()
+            return cls(
+                stored["user_ids"],
+                stored["indptr"],
+                stored["indices"],
+                stored["post_ids"],
+                stored["post_authors"],
+                follows_watermark or None,
+                posts_watermark or None,
+            )
+
+
+def _positions(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Positions of `values` in the sorted array, -1 for missing ones."""
+    if len(sorted_values) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    positions = np.searchsorted(sorted_values, values)
+    positions[positions == len(sorted_values)] = 0
+    return np.where(sorted_values[positions] == values, positions, -1)
+
+
+def _insert_sorted(sorted_values: np.ndarray, values: np.ndarray) -> tuple:
+    """
+    Inserts sorted `values` into a sorted array in one pass, widening string dtypes
+    as needed. Returns (merged, insert positions in the original array).
+    """
+    positions = np.searchsorted(sorted_values, values)
+    widened = sorted_values.astype(np.result_type(sorted_values, values), copy=False)
+    return np.insert(widened, positions, values), positions
+
+
+def _watermark(rows, current: str) -> str:
+    """Newest timestamp of the fetched rows, as passed back in the next query."""
+    timestamps = [row[2] for row in rows if row[2] is not None]
+    if not timestamps:
+        return current
+    return str(max(timestamps))
+
+
+def _changed_users(graph: FollowGraph, counts, per_user: np.ndarray) -> list[str]:
+    """Users whose row count in the database differs from the graph's."""
+    user_ids = [user_id for user_id, _ in counts]
+    users = graph.user_index(user_ids)
+    known = users >= 0
+    expected = np.zeros(len(graph.user_ids), dtype=np.int64)
+    expected[users[known]] = np.array([c for _, c in counts], dtype=np.int64)[known]
+    changed = graph.user_ids[expected != per_user].tolist()
+    return changed + [user_id for user_id, k in zip(user_ids, known) if not k]
+
+
+def _sync(graph: FollowGraph, table: str) -> bool:
+    """
+    Brings one table's part of the graph up to date: rows at or after the watermark
+    are merged, and if the row count still differs, the rows of the users whose count
+    differs are fetched again. Returns whether the graph changed.
+    """
+    if table == "Follows":
+        fetched = get_follows_since(graph.follows_watermark)
+        merge, remove = graph.add_follows, graph.remove_follows_of
+    else:
+        fetched = get_posts_since(graph.posts_watermark)
+        merge, remove = graph.add_posts, graph.remove_posts_of
+    if fetched is None:
+        return False  # Keep what we have
+
+    count, rows = fetched
+    before = graph.n_follows, graph.n_posts
+    merge(rows)
+    if table == "Follows":
+        graph.follows_watermark = _watermark(rows, graph.follows_watermark)
+        size, per_user = graph.n_follows, graph.follows_per_user
+    else:
+        graph.posts_watermark = _watermark(rows, graph.posts_watermark)
+        size, per_user = graph.n_posts, graph.posts_per_user
+    if size == count:
+        return (graph.n_follows, graph.n_posts) != before
+
+    counts = get_row_counts_by_user(table)
+    changed = None if counts is None else _changed_users(graph, counts, per_user())
+    refetched = None if changed is None else get_rows_of_users(table, changed)
+    if refetched is None:
+        return True  # Merged what was added, deletions are picked up next time
+    remove(changed)
+    merge(refetched)
+    logger.info(
+        "Rows removed since the last run, users reloaded",
+        extra={"table": table, "users": len(changed)},
+    )
+    return True
+
+
+_graph = None  # Kept between scheduled runs
+
+
+def load_follow_graph(path: str = PATH_FOLLOW_GRAPH) -> FollowGraph:
+    """
+    Returns the follow graph brought up to date with the database, loading it from
+    `path` on the first run and saving it back whenever it changed. If the database
+    cannot be read, the last known graph is returned.
+    """
+    global _graph
+    if _graph is None and os.path.exists(path):
+        try:
+            _graph = FollowGraph.load(path)
+        except Exception:
+            logger.exception("Unreadable follow graph, rebuilding it")
+    graph = _graph or FollowGraph()
+
+    follows_changed = _sync(graph, "Follows")
+    posts_changed = _sync(graph, "Posts")
+
+    _graph = graph
+    if follows_changed or posts_changed:
+        graph.save(path)
+    return graph
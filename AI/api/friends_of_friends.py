@@ -0,0 +1,82 @@
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from constants import FOF_CANDIDATES, FOF_MAX_INTERMEDIARY_DEGREE, FOF_BLOCK_SIZE
+from follow_graph import FollowGraph
+
+
+def friends_of_friends(
+    graph: FollowGraph,
+    top_k: int = FOF_CANDIDATES,
+    max_degree: int = FOF_MAX_INTERMEDIARY_DEGREE,
+    block_size: int = FOF_BLOCK_SIZE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    "People you may know": for every user, the accounts followed by the accounts they
+    follow, computed as sparse products A[block] @ W of the follow adjacency A.
+
+    A path u -> w -> v weighs 1 / log(2 + accounts w follows) (Adamic-Adar), so someone
+    following everybody says little about any one of their followers. Accounts following
+    more than `max_degree` users are not used as intermediaries at all, which bounds the
+    work per follow at `max_degree`. Users are scored `block_size` rows at a time.
+
+    Returns:
+        tuple: (candidates, scores), both (n_users, top_k) and aligned with
+            `graph.user_ids`: candidate user positions best first, -1 padded, and
+            their scores divided by the row's best (0-1), 0 padded. Users already
+            followed and the user themselves are never candidates.
+    """
+    n_users = len(graph.user_ids)
+    adjacency = csr_matrix(
+        (np.ones(graph.n_follows, dtype=np.float32), graph.indices, graph.indptr),
+        shape=(n_users, n_users),
+    )
+    degrees = graph.follows_per_user()
+    weights = np.where(degrees <= max_degree, 1 / np.log(2 + degrees), 0.0).astype(
+        np.float32
+    )
+    weighted = (diags(weights) @ adjacency).tocsr()
+    weighted.eliminate_zeros()
+
+    candidates = np.full((n_users, top_k), -1, dtype=np.int32)
+    scores = np.zeros((n_users, top_k), dtype=np.float32)
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        n_rows = stop - start
+        block = adjacency[start:stop]
+        paths = (block @ weighted).tocsr()
+        paths.eliminate_zeros()
+        rows = np.repeat(np.arange(n_rows), np.diff(paths.indptr))
+        columns, data = paths.indices, paths.data
+
+        # Entries sorted by row, then score descending
+        order = np.argsort(rows * (2.0 * data.max(initial=0) + 1) - data)
+        rows, columns, data = rows[order], columns[order], data[order]
+
+        # A row's best top_k + (follows + 1) entries hold its top_k once the users
+        # already followed and the user themselves are dropped; only those are checked
+        rank = np.arange(len(rows)) - np.searchsorted(rows, np.arange(n_rows))[rows]
+        head = rank < top_k + np.diff(block.indptr)[rows] + 1
+        rows, columns, data = rows[head], columns[head], data[head]
+
+        known = np.sort(
+            np.concatenate(
+                [
+                    np.repeat(np.arange(n_rows), np.diff(block.indptr)) * n_users
+                    + block.indices,
+                    np.arange(n_rows) * n_users + np.arange(start, stop),
+                ]
+            )
+        )
+        keys = rows.astype(np.int64) * n_users + columns
+        position = np.minimum(np.searchsorted(known, keys), len(known) - 1)
+        keep = known[position] != keys
+        rows, columns, data = rows[keep], columns[keep], data[keep]
+
+        rank = np.arange(len(rows)) - np.searchsorted(rows, np.arange(n_rows))[rows]
+        kept = rank < top_k
+        candidates[start + rows[kept], rank[kept]] = columns[kept]
+        scores[start + rows[kept], rank[kept]] = data[kept]
+
+    best = scores[:, :1].copy()
+    np.divide(scores, best, out=scores, where=best > 0)
+    return candidates, scores
@@ -0,0 +1,91 @@
+import threading
+from observability import LLM_OUTPUTS, LLM_GENERATION_SECONDS, LLM_FIRST_TOKEN
+
+
+class GenerationStats:
+    """
+    Counters of how LLM JSON outputs turned out, to track the parse-failure rate and the
+    generation time spent on outputs that had to be thrown away.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generations = 0
+        self.parsed = 0  # Valid as returned
+        self.repaired = 0  # Usable after repair_json
+        self.failed = 0  # Unusable, generation wasted
+        self.retries = 0
+        self.repairs = {}  # Repair name -> count
+        self.generation_seconds = 0.0
+        self.wasted_seconds = 0.0
+
+    def record(self, seconds: float, outcome: str, repairs: list[str] = ()):
+        """Records one generation with outcome "parsed", "repaired" or "failed"."""
+        with self._lock:
+            self.generations += 1
+            self.generation_seconds += seconds
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if outcome == "failed":
+                self.wasted_seconds += seconds
+            for repair in repairs:
+                self.repairs[repair] = self.repairs.get(repair, 0) + 1
+        LLM_OUTPUTS.labels(outcome).inc()
+        LLM_GENERATION_SECONDS.labels(outcome).inc(seconds)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            generations = max(self.generations, 1)
+            return {
+                "generations": self.generations,
+                "parsed": self.parsed,
+                "repaired": self.repaired,
+                "failed": self.failed,
+                "retries": self.retries,
+                "parse_failure_rate": (self.repaired + self.failed) / generations,
+                "unusable_rate": self.failed / generations,
+                "repairs": dict(self.repairs),
+                "generation_seconds": round(self.generation_seconds, 3),
+                "wasted_seconds": round(self.wasted_seconds, 3),
+            }
+
+
+class FirstTokenStats:
+    """
+    Time to first token of LLM generations, split by whether Ollama had to load the
+    model first (cold) or it was already resident (warm).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = {"cold": 0, "warm": 0}
+        self.total_seconds = {"cold": 0.0, "warm": 0.0}
+        self.max_seconds = {"cold": 0.0, "warm": 0.0}
+
+    def record(self, seconds: float, cold: bool):
+        state = "cold" if cold else "warm"
+        with self._lock:
+            self.count[state] += 1
+            self.total_seconds[state] += seconds
+            self.max_seconds[state] = max(self.max_seconds[state], seconds)
+        LLM_FIRST_TOKEN.labels(state).observe(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                state: {
+                    "count": self.count[state],
+                    "mean_seconds": round(
+                        self.total_seconds[state] / max(self.count[state], 1), 3
+                    ),
+                    "max_seconds": round(self.max_seconds[state], 3),
+                }
+                for state in ("cold", "warm")
+            }
+
+
+generation_stats = GenerationStats()
+first_token_stats = FirstTokenStats()
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+from constants import PATH_SEARCH_INDEX, SEARCH_INDEX_KEEP_GENERATIONS
+
+logger = logging.getLogger(__name__)
+
+CURRENT = "CURRENT"  # File naming the generation readers should use
+META = "meta.json"
+
+
+class GenerationStore:
+    """
+    Read-only array snapshots ("generations") shared by all API worker processes.
+
+    The job process writes each generation as a directory of uncompressed .npy files
+    plus `meta.json`, then points `CURRENT` at it with an atomic rename. Readers open
+    the arrays with `mmap_mode="r"`: the pages live in the OS page cache once, however
+    many workers attach, and nothing is copied into the worker heaps. A reader keeps
+    using its generation until it sees `CURRENT` change, so a switch never exposes a
+    half-written one. Old generations are removed after `keep` newer ones exist;
+    workers that still map them keep valid mappings until they switch.
+    """
+
+    def __init__(
+        self,
+        directory: str = PATH_SEARCH_INDEX,
+        keep: int = SEARCH_INDEX_KEEP_GENERATIONS,
+    ):
+        self.directory = directory
+        self.keep = keep
+
+    def publish(self, arrays: dict, meta: dict) -> str:
+        """Writes a new generation and makes it current. Returns its name."""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"gen-{time.time_ns()}"
+        staging = os.path.join(self.directory, f".{name}.tmp")
+        os.makedirs(staging)
+        for key, array in arrays.items():
+            np.save(os.path.join(staging, f"{key}.npy"), array, allow_pickle=False)
+        with open(os.path.join(staging, META), "w") as f:
+            json.dump({**meta, "arrays": sorted(arrays)}, f)
+        os.rename(staging, os.path.join(self.directory, name))
+
+        pointer = os.path.join(self.directory, f".{CURRENT}.tmp")
+        with open(pointer, "w") as f:
+            f.write(name)
+        os.replace(pointer, os.path.join(self.directory, CURRENT))
+
+        self._prune(name)
+        return name
+
+    def version(self):
+        """Cheap change check: identity of the `CURRENT` file, None if none published."""
+        try:
+            stat = os.stat(os.path.join(self.directory, CURRENT))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def current(self) -> str:
+        try:
+            with open(os.path.join(self.directory, CURRENT)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def open(self, name: str) -> tuple[dict, dict]:
+        """Memory-maps the arrays of a generation. Returns (meta, arrays)."""
+        path = os.path.join(self.directory, name)
+        with open(os.path.join(path, META)) as f:
+            meta = json.load(f)
+        arrays = {
+            key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r")
+            for key in meta.pop("arrays")
+        }
+        return meta, arrays
+
+    def _prune(self, current: str):
+        generations = sorted(
+            entry
+            for entry in os.listdir(self.directory)
+            if entry.startswith("gen-") and entry != current
+        )
+        for old in generations[: max(len(generations) - self.keep, 0)]:
+            shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+            logger.info("Removed old index generation", extra={"generation": old})
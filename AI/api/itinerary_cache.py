@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+import redis.asyncio as aioredis
+from llm_client import LLMBusyError
+from observability import CACHE_LOOKUPS
+from config import (
+    ITINERARY_CACHE_ENABLED,
+    ITINERARY_CACHE_TTL_SECONDS,
+    ITINERARY_CACHE_VARIANTS,
+    ITINERARY_CACHE_LOCAL_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a free-text request field."""
+    return " ".join(str(text).casefold().split())
+
+
+def itinerary_cache_key(
+    kind: str,
+    destination: str,
+    model: str,
+    days: int = None,
+    preferences: list[str] = (),
+    excluded_activities: list[str] = (),
+) -> str:
+    """
+    Redis key of a generation request. Requests that only differ in case, spacing or
+    the order of preferences / excluded activities share a key.
+    """
+    parts = {
+        "destination": normalize_text(destination),
+        "days": days,
+        "preferences": sorted({normalize_text(p) for p in preferences} - {""}),
+        "excluded": sorted({normalize_text(a) for a in excluded_activities} - {""}),
+        "model": model,
+    }
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+    return f"itinerary:{kind}:{digest}"
+
+
+class ItineraryCache:
+    """
+    Generation results cached in Redis (with a TTL) behind an in-process LRU.
+
+    Up to `variants` different results are kept per key, so popular requests still get
+    some variety: a key is only served from cache once it holds that many variants.
+    Concurrent identical requests are coalesced onto a single generation.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        ttl_seconds: int = ITINERARY_CACHE_TTL_SECONDS,
+        variants: int = ITINERARY_CACHE_VARIANTS,
+        local_size: int = ITINERARY_CACHE_LOCAL_SIZE,
+        enabled: bool = ITINERARY_CACHE_ENABLED,
+    ):
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.variants = max(1, variants)
+        self.local_size = local_size
+        self.enabled = enabled
+        self._local = OrderedDict()  # key -> (expires_at, [json strings])
+        self._inflight = {}  # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _local_get(self, key: str) -> list[str]:
+        entry = self._local.get(key)
+        if entry is None:
+            return []
+        expires_at, variants = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return []
+        self._local.move_to_end(key)
+        return variants
+
+    def _local_put(self, key: str, variants: list[str]):
+        self._local[key] = (time.monotonic() + self.ttl_seconds, variants)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def _cached_variants(self, key: str) -> list[str]:
+        variants = self._local_get(key)
+        if len(variants) >= self.variants:
+            return variants
+
+        try:
+            stored = await self.redis_client.lrange(key, 0, self.variants - 1)
+        except Exception:
+            logger.exception("Itinerary cache read failed")
+            return variants
+
+        if len(stored) > len(variants):
+            self._local_put(key, stored)
+            return stored
+        return variants
+
+    async def lookup(self, key: str, any_variant: bool = False):
+        """
+        Returns a cached result for `key`, or None if the key holds fewer variants
+        than configured (or none at all, with `any_variant`).
+        """
+        if not self.enabled:
+            return None
+
+        variants = await self._cached_variants(key)
+        if not variants or (len(variants) < self.variants and not any_variant):
+            return None
+        return json.loads(random.choice(variants))
+
+    async def store(self, key: str, result):
+        """Adds a fresh result as the newest variant of `key`."""
+        if not self.enabled:
+            return
+
+        value = json.dumps(result)
+        # Newest first, like the Redis list
+        variants = [value] + [v for v in self._local_get(key) if v != value]
+        self._local_put(key, variants[: self.variants])
+
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lpush(key, value)
+                pipe.ltrim(key, 0, self.variants - 1)
+                pipe.expire(key, self.ttl_seconds)
+                await pipe.execute()
+        except Exception:
+            logger.exception("Itinerary cache write failed")
+
+    async def get_or_generate(self, key: str, generate):
+        """
+        Serves `key` from cache, or runs `generate()` (an async callable) once for all
+        concurrent callers and caches its result.
+
+        If generation is rejected because the LLM is busy, any cached variant is
+        returned instead of the error.
+        """
+        if not self.enabled:
+            return await generate()
+
+        cached = await self.lookup(key)
+        if cached is not None:
+            self.hits += 1
+            CACHE_LOOKUPS.labels("itinerary", "hit").inc()
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            CACHE_LOOKUPS.labels("itinerary", "miss").inc()
+            task = asyncio.create_task(self._generate_and_store(key, generate))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            CACHE_LOOKUPS.labels("itinerary", "coalesced").inc()
+
+        try:
+            result = await asyncio.shield(task)
+        except LLMBusyError:
+            fallback = await self.lookup(key, any_variant=True)
+            if fallback is None:
+                raise
+            return fallback
+
+        # Each caller gets its own copy, like a cache hit would
+        return json.loads(json.dumps(result))
+
+    async def _generate_and_store(self, key: str, generate):
+        result = await generate()
+        await self.store(key, result)
+        return result
+
+
+itinerary_cache = ItineraryCache(
+    aioredis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
+)
@@ -1,7 +1,97 @@
-from models import GeneratedItinerary, ItineraryActivity
-from constants import ITINERARY_JSON_STRUCTURE, ITINERARY_DAY_ACTIVITIES_JSON_STRUCTURE
-import ollama
+from typing import List
+from pydantic import TypeAdapter
+from models import (
+    GeneratedItinerary,
+    ItineraryActivity,
+    ItineraryDay,
+    ItineraryDayOutline,
+)
+from constants import (
+    ITINERARY_JSON_STRUCTURE,
+    ITINERARY_DAY_ACTIVITIES_JSON_STRUCTURE,
+    ITINERARY_OUTLINE_JSON_STRUCTURE,
+)
+from config import (
+    ITINERARY_GENERATION_MODE,
+    ITINERARY_DAY_RETRIES,
+    LLM_MAX_CONCURRENCY,
+    LLM_STRUCTURED_OUTPUT,
+    LLM_JSON_REPAIR,
+    LLM_JSON_RETRIES,
+    LLM_NUM_PREDICT_ITINERARY,
+    LLM_NUM_PREDICT_OUTLINE,
+    LLM_NUM_PREDICT_DAY,
+)
+from llm_client import DEFAULT_MODEL, timed_chat_completion, open_chat_stream
+from itinerary_cache import itinerary_cache, itinerary_cache_key
+from json_parsing import IncrementalDaysParser, parse_json_tolerant
+from generation_stats import generation_stats
+from observability import stage
+import asyncio
 import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# JSON schemas passed to Ollama as `format`, so decoding is constrained to valid output
+ITINERARY_SCHEMA = GeneratedItinerary.model_json_schema()
+ACTIVITIES_SCHEMA = TypeAdapter(List[ItineraryActivity]).json_schema()
+OUTLINE_SCHEMA = TypeAdapter(List[ItineraryDayOutline]).json_schema()
+
+
+def parse_ai_json(raw_output: str) -> tuple[object, list[str]]:
+    """
+    Parses model output, repairing it if LLM_JSON_REPAIR is on.
+
+    Returns:
+        tuple: (parsed value, names of the repairs applied).
+
+    Raises:
+        ValueError: If the output is not valid JSON.
+    """
+    try:
+        if LLM_JSON_REPAIR:
+            return parse_json_tolerant(raw_output)
+        return json.loads(raw_output), []
+    except (json.JSONDecodeError, ValueError):
+        logger.warning("AI response was not valid JSON")
+        raise ValueError("AI response was not valid JSON.")
+
+
+async def _generate_validated(
+    prompt: str, schema: dict, validate, num_predict: int = 0
+):
+    """
+    Generates JSON for `prompt` and returns `validate(data, repairs)`.
+
+    Output is constrained to `schema` (if LLM_STRUCTURED_OUTPUT is on) and repaired if
+    slightly broken. Output that is still unusable (ValueError from parsing or
+    `validate`) is regenerated, at most LLM_JSON_RETRIES times.
+    """
+    for attempt in range(LLM_JSON_RETRIES + 1):
+        with stage("itinerary", "generate"):
+            raw_output, seconds = await timed_chat_completion(
+                prompt,
+                format=schema if LLM_STRUCTURED_OUTPUT else None,
+                num_predict=num_predict,
+            )
+
+        repairs = []
+        try:
+            with stage("itinerary", "validate"):
+                data, repairs = parse_ai_json(raw_output)
+                result = validate(data, repairs)
+        except ValueError:
+            generation_stats.record(seconds, "failed", repairs)
+            if attempt == LLM_JSON_RETRIES:
+                raise
+            generation_stats.record_retry()
+            logger.warning("Unusable AI response, generating it again")
+            continue
+
+        generation_stats.record(seconds, "repaired" if repairs else "parsed", repairs)
+        return result
 
 
 def build_prompt_for_itinerary_generation(
@@ -21,37 +111,242 @@ def build_prompt_for_itinerary_generation(
         )
 
 
-def generate_itinerary(destination: str, days: int, preferences: list[str]) -> dict:
+async def generate_itinerary(
+    destination: str, days: int, preferences: list[str]
+) -> dict:
+    """
+    Generates (or serves from cache) a validated itinerary, in one document or day by
+    day depending on ITINERARY_GENERATION_MODE.
+    """
+    generate = (
+        _generate_itinerary_parallel
+        if ITINERARY_GENERATION_MODE == "parallel"
+        else _generate_itinerary
+    )
+    key = itinerary_cache_key(
+        "full", destination, DEFAULT_MODEL, days=days, preferences=preferences
+    )
+    return await itinerary_cache.get_or_generate(
+        key, lambda: generate(destination, days, preferences)
+    )
+
+
+async def _generate_itinerary(
+    destination: str, days: int, preferences: list[str]
+) -> dict:
     prompt = build_prompt_for_itinerary_generation(destination, days, preferences)
 
-    try:
-        response = ollama.chat(
-            model="mistral", messages=[{"role": "user", "content": prompt}]
+    def validate(itinerary_data, repairs: list[str]) -> dict:
+        try:
+            validated_itinerary = GeneratedItinerary(**itinerary_data)
+        except Exception as e:
+            logger.warning(
+                "AI response JSON did not match expected schema",
+                extra={"error": str(e)},
+            )
+            raise ValueError(
+                f"AI response JSON did not match expected schema: {str(e)}"
+            )
+
+        if "truncated" in repairs and len(validated_itinerary.days) < days:
+            logger.warning("AI response was cut off before the last day")
+            raise ValueError("AI response was cut off before the last day.")
+
+        return validated_itinerary.model_dump()
+
+    return await _generate_validated(
+        prompt, ITINERARY_SCHEMA, validate, LLM_NUM_PREDICT_ITINERARY
+    )
+
+
+def build_prompt_for_itinerary_outline(
+    destination: str, days: int, preferences: list[str]
+) -> str:
+    pref_string = f"User preferences: {', '.join(preferences)}. " if preferences else ""
+    return (
+        f"Plan the outline of a {days}-day trip to {destination}: for each day give a short "
+        f"theme and its 2 or 3 main points of interest, no other details. {pref_string}"
+        f"Return the result strictly as a JSON array following this structure:\n{ITINERARY_OUTLINE_JSON_STRUCTURE}"
+    )
+
+
+async def generate_itinerary_outline(
+    destination: str, days: int, preferences: list[str]
+) -> list[ItineraryDayOutline]:
+    """Generates a short per-day theme outline, one entry per day in order."""
+    prompt = build_prompt_for_itinerary_outline(destination, days, preferences)
+
+    def validate(outline_data, repairs: list[str]) -> list[ItineraryDayOutline]:
+        if not isinstance(outline_data, list):
+            logger.warning("Expected a JSON array of days")
+            raise ValueError("Expected a JSON array of days.")
+
+        try:
+            outline = [ItineraryDayOutline(**day) for day in outline_data]
+        except Exception as e:
+            logger.warning(
+                "AI response JSON did not match outline schema", extra={"error": str(e)}
+            )
+            raise ValueError(f"AI response JSON did not match outline schema: {str(e)}")
+
+        if len(outline) != days:
+            logger.warning(
+                "Outline has the wrong number of days",
+                extra={"expected": days, "got": len(outline)},
+            )
+            raise ValueError(f"Expected an outline of {days} days, got {len(outline)}.")
+
+        # Day numbers are assigned by position, the model sometimes repeats or skips them
+        return [
+            day.model_copy(update={"day": number})
+            for number, day in enumerate(outline, 1)
+        ]
+
+    return await _generate_validated(
+        prompt, OUTLINE_SCHEMA, validate, LLM_NUM_PREDICT_OUTLINE
+    )
+
+
+async def _with_retries(label: str, generate):
+    """Awaits `generate()`, retrying it up to ITINERARY_DAY_RETRIES times on failure."""
+    for attempt in range(ITINERARY_DAY_RETRIES + 1):
+        try:
+            return await generate()
+        except (RuntimeError, ValueError) as e:
+            if attempt == ITINERARY_DAY_RETRIES:
+                raise
+            logger.warning(
+                "Generation failed, retrying", extra={"label": label, "error": str(e)}
+            )
+
+
+async def _generate_itinerary_parallel(
+    destination: str, days: int, preferences: list[str]
+) -> dict:
+    """
+    Generates the outline, then every day's activities concurrently. Each day excludes
+    the other days' highlights so activities are not repeated across days, and a day
+    that fails is retried on its own instead of failing the whole itinerary.
+    """
+    outline = await _with_retries(
+        "Outline",
+        lambda: generate_itinerary_outline(destination, days, preferences),
+    )
+
+    # Keeps one itinerary from filling the whole generation queue by itself
+    fan_out = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+    async def generate_day(day_outline: ItineraryDayOutline) -> ItineraryDay:
+        excluded = [
+            highlight
+            for other in outline
+            if other.day != day_outline.day
+            for highlight in other.highlights
+        ]
+        async with fan_out:
+            activities = await regenerate_day_activities(
+                destination, excluded, theme=day_outline.theme
+            )
+        return ItineraryDay(day=day_outline.day, activities=activities)
+
+    tasks = [
+        asyncio.create_task(
+            _with_retries(f"Day {day.day}", lambda day=day: generate_day(day))
         )
+        for day in outline
+    ]
+    try:
+        itinerary_days = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
 
-        raw_output = response["message"]["content"]
-    except Exception as e:
-        print(f"AI generation failed: {str(e)}")
-        raise RuntimeError(f"AI generation failed: {str(e)}")
+    return GeneratedItinerary(destination=destination, days=itinerary_days).model_dump()
+
+
+async def open_itinerary_stream(destination: str, days: int, preferences: list[str]):
+    """
+    Starts a streaming itinerary generation.
+
+    Returns an async iterator of (event, data) pairs: one ("day", day) per validated
+    ItineraryDay as soon as it is complete, then ("done", itinerary), or ("error", detail)
+    if the output turns out invalid. Busy/connection errors are raised before streaming.
+
+    Cached itineraries are replayed day by day; completed streams are added to the cache.
+    """
+    key = itinerary_cache_key(
+        "full", destination, DEFAULT_MODEL, days=days, preferences=preferences
+    )
+    cached = await itinerary_cache.lookup(key)
+    if cached is not None:
+        return _cached_itinerary_events(cached)
+
+    prompt = build_prompt_for_itinerary_generation(destination, days, preferences)
+    chunks = await open_chat_stream(
+        prompt,
+        format=ITINERARY_SCHEMA if LLM_STRUCTURED_OUTPUT else None,
+        num_predict=LLM_NUM_PREDICT_ITINERARY,
+    )
+    return _itinerary_stream_events(chunks, key)
+
+
+async def _cached_itinerary_events(itinerary: dict):
+    for day in itinerary["days"]:
+        yield "day", day
+    yield "done", itinerary
+
+
+async def _itinerary_stream_events(chunks, cache_key: str):
+    parser = IncrementalDaysParser()
+    start = time.perf_counter()
 
     try:
-        itinerary_data = json.loads(raw_output)
-    except json.JSONDecodeError:
-        print("AI response was not valid JSON.")
-        raise ValueError("AI response was not valid JSON.")
+        async for chunk in chunks:
+            for day_data in parser.feed(chunk):
+                try:
+                    day = ItineraryDay(**day_data)
+                except Exception as e:
+                    logger.warning(
+                        "AI response day did not match expected schema",
+                        extra={"error": str(e)},
+                    )
+                    generation_stats.record(time.perf_counter() - start, "failed")
+                    yield "error", f"AI response day did not match expected schema: {str(e)}"
+                    return
+                yield "day", day.model_dump()
+    finally:
+        await chunks.aclose()  # Frees the generation slot even if the client went away
 
+    seconds = time.perf_counter() - start
+    repairs = []
     try:
+        itinerary_data, repairs = parse_ai_json(parser.document)
         validated_itinerary = GeneratedItinerary(**itinerary_data)
+    except ValueError as e:
+        generation_stats.record(seconds, "failed", repairs)
+        yield "error", str(e)
+        return
     except Exception as e:
-        print(f"AI response JSON did not match expected schema: {str(e)}")
-        raise ValueError(f"AI response JSON did not match expected schema: {str(e)}")
+        logger.warning(
+            "AI response JSON did not match expected schema", extra={"error": str(e)}
+        )
+        generation_stats.record(seconds, "failed", repairs)
+        yield "error", f"AI response JSON did not match expected schema: {str(e)}"
+        return
 
-    return validated_itinerary.model_dump()
+    generation_stats.record(seconds, "repaired" if repairs else "parsed", repairs)
+    itinerary = validated_itinerary.model_dump()
+    await itinerary_cache.store(cache_key, itinerary)
+    yield "done", itinerary
 
 
 def build_prompt_for_day_activities_regeneration(
-    destination: str, excluded_activities: list[str]
+    destination: str, excluded_activities: list[str], theme: str = None
 ) -> str:
+    if theme:
+        destination = f"{destination} with the theme: {theme}"
+
     if excluded_activities:
         excluded_activities_string = ", ".join(excluded_activities)
         return (
@@ -66,39 +361,53 @@ def build_prompt_for_day_activities_regeneration(
         )
 
 
-def regenerate_day_activities(
-    destination: str, excluded_activities: list[str]
+async def regenerate_day_activities(
+    destination: str, excluded_activities: list[str], theme: str = None
 ) -> list[dict]:
-    prompt = build_prompt_for_day_activities_regeneration(
-        destination, excluded_activities
+    """Generates (or serves from cache) validated activities for one day."""
+    key = itinerary_cache_key(
+        "day",
+        destination,
+        DEFAULT_MODEL,
+        preferences=[theme] if theme else [],
+        excluded_activities=excluded_activities,
+    )
+    return await itinerary_cache.get_or_generate(
+        key, lambda: _regenerate_day_activities(destination, excluded_activities, theme)
     )
 
-    try:
-        response = ollama.chat(
-            model="mistral", messages=[{"role": "user", "content": prompt}]
-        )
 
-        raw_output = response["message"]["content"]
-    except Exception as e:
-        print(f"AI generation failed: {str(e)}")
-        raise RuntimeError(f"AI generation failed: {str(e)}")
+async def _regenerate_day_activities(
+    destination: str, excluded_activities: list[str], theme: str = None
+) -> list[dict]:
+    prompt = build_prompt_for_day_activities_regeneration(
+        destination, excluded_activities, theme
+    )
 
-    try:
-        activities_data = json.loads(raw_output)
-    except json.JSONDecodeError:
-        print("AI response was not valid JSON.")
-        raise ValueError("AI response was not valid JSON.")
+    def validate(activities_data, repairs: list[str]) -> list[dict]:
+        if not isinstance(activities_data, list):
+            logger.warning("Expected a JSON array of activities")
+            raise ValueError("Expected a JSON array of activities.")
 
-    if not isinstance(activities_data, list):
-        print("Expected a JSON array of activities.")
-        raise ValueError("Expected a JSON array of activities.")
+        try:
+            validated_activities = [
+                ItineraryActivity(**activity) for activity in activities_data
+            ]
+        except Exception as e:
+            logger.warning(
+                "AI response JSON did not match activity schema",
+                extra={"error": str(e)},
+            )
+            raise ValueError(
+                f"AI response JSON did not match activity schema: {str(e)}"
+            )
 
-    try:
-        validated_activities = [
-            ItineraryActivity(**activity) for activity in activities_data
-        ]
-    except Exception as e:
-        print(f"AI response JSON did not match activity schema: {str(e)}")
-        raise ValueError(f"AI response JSON did not match activity schema: {str(e)}")
+        if "truncated" in repairs and not validated_activities:
+            logger.warning("AI response was cut off before the first activity")
+            raise ValueError("AI response was cut off before the first activity.")
 
-    return [activity.model_dump() for activity in validated_activities]
+        return [activity.model_dump() for activity in validated_activities]
+
+    return await _generate_validated(
+        prompt, ACTIVITIES_SCHEMA, validate, LLM_NUM_PREDICT_DAY
+    )
@@ -0,0 +1,184 @@
+import json
+import re
+
+
+class IncrementalDaysParser:
+    """
+    Incrementally scans a streamed itinerary JSON document and returns each element of
+    its top-level "days" array as soon as the element's closing brace arrives.
+
+    Text before the first "{" (e.g. a ```json fence) is ignored. Only structure is
+    tracked (strings, escapes, nesting), so each chunk is scanned once.
+    """
+
+    def __init__(self):
+        self.document = ""  # Everything from the first "{" on
+        self._position = 0
+        self._stack = []  # Open containers: "{" or "["
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_key = None  # Last string seen directly inside the top-level object
+        self._days_depth = None  # Stack depth of the "days" array once opened
+        self._day_start = None
+
+    def feed(self, chunk: str) -> list[dict]:
+        if not self.document:
+            start = chunk.find("{")
+            if start < 0:
+                return []
+            chunk = chunk[start:]
+        self.document += chunk
+
+        completed = []
+        text = self.document
+        for i in range(self._position, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = text[self._string_start + 1 : i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._stack.append(char)
+                depth = len(self._stack)
+                if char == "[" and depth == 2 and self._last_key == "days":
+                    self._days_depth = depth
+                elif char == "{" and self._days_depth and depth == self._days_depth + 1:
+                    self._day_start = i
+            elif char in "}]":
+                depth = len(self._stack)
+                if self._stack:
+                    self._stack.pop()
+                if (
+                    char == "}"
+                    and self._day_start is not None
+                    and depth == self._days_depth + 1
+                ):
+                    try:
+                        completed.append(json.loads(text[self._day_start : i + 1]))
+                    except json.JSONDecodeError:
+                        pass  # Left for the full-document parse to report
+                    self._day_start = None
+                elif char == "]" and depth == self._days_depth:
+                    self._days_depth = None
+
+        self._position = len(text)
+        return completed
+
+
+CODE_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+
+def _strip_trailing_comma(out: list[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str) -> tuple[str, list[str]]:
+    """
+    Best-effort fix of the usual ways LLM JSON output is broken: a surrounding code
+    fence or prose, trailing commas, and output cut off mid-document. A truncated
+    document is cut back to its last complete element and its open arrays/objects closed.
+
+    Returns:
+        tuple: (repaired text, names of the repairs applied).
+    """
+    repairs = []
+
+    fenced = CODE_FENCE_PATTERN.search(text)
+    if fenced:
+        text = fenced.group(1)
+        repairs.append("code_fence")
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text, repairs
+    if min(starts) > 0 and text[: min(starts)].strip():
+        repairs.append("leading_text")
+    text = text[min(starts) :]
+
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    safe_point = (0, [])  # (output length, open containers) where the output can be cut
+
+    for i, char in enumerate(text):
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in "{[":
+            stack.append(char)
+            out.append(char)
+        elif char in "}]":
+            length = len(out)
+            _strip_trailing_comma(out)
+            if len(out) != length and "trailing_comma" not in repairs:
+                repairs.append("trailing_comma")
+            if stack:
+                stack.pop()
+            out.append(char)
+            safe_point = (len(out), list(stack))
+            if not stack:
+                if text[i + 1 :].strip():
+                    repairs.append("trailing_text")
+                break  # Ignores anything after the document
+        elif char == ",":
+            safe_point = (len(out), list(stack))
+            out.append(char)
+        else:
+            out.append(char)
+
+    if stack or in_string:
+        length, still_open = safe_point
+        out = out[:length]
+        _strip_trailing_comma(out)
+        out.extend("}" if c == "{" else "]" for c in reversed(still_open))
+        repairs.append("truncated")
+
+    return "".join(out), repairs
+
+
+def parse_json_tolerant(text: str) -> tuple[object, list[str]]:
+    """
+    Parses LLM output as JSON, falling back to `repair_json` if it is not valid as is.
+
+    Returns:
+        tuple: (parsed value, names of the repairs applied; empty if it parsed as is).
+
+    Raises:
+        ValueError: If the output is not valid JSON even after repair.
+    """
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError:
+        pass
+
+    repaired, repairs = repair_json(text)
+    try:
+        return json.loads(repaired), repairs or ["unknown"]
+    except json.JSONDecodeError:
+        raise ValueError("AI response was not valid JSON.")
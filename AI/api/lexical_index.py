@@ -0,0 +1,190 @@
+import re
+import numpy as np
+from constants import BM25_K1, BM25_B, LEXICAL_METADATA_BOOST
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")  # TfidfVectorizer's default token_pattern
+
+
+def post_texts(df):
+    """Returns the indexed text of each post: Caption/Body, and Location/Tags metadata."""
+    texts = (df["Caption"].fillna("") + " " + df["Body"].fillna("")).tolist()
+    metadata = [""] * len(df)
+    for column in ("Location", "Tags"):
+        if column in df:
+            metadata = [f"{m} {v}" for m, v in zip(metadata, df[column].fillna(""))]
+    return texts, metadata
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over posts, stored as CSC-style postings (term -> posts).
+
+    Terms come from the fitted TF-IDF vocabulary plus any Location/Tags terms, tokenized
+    the same way as the vectorizer. BM25 weights are precomputed per posting, so a query
+    only touches the postings of its own terms. Rows follow the posts CSV order.
+
+    Terms are kept sorted and looked up by binary search rather than through a dict, so
+    every array can be a read-only memory map shared between processes (`arrays`).
+    """
+
+    def __init__(self, terms, indptr, doc_indices, weights, stop_words, n_docs):
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_indices = doc_indices
+        self.weights = weights
+        self.stop_words = frozenset(stop_words)
+        self.n_docs = int(n_docs)
+
+    @classmethod
+    def build(cls, df, vectorizer) -> "LexicalIndex":
+        """Builds the index from a posts DataFrame and the fitted TF-IDF vectorizer."""
+        from scipy.sparse import csr_matrix
+
+        analyzer = vectorizer.build_analyzer()
+        vocabulary = dict(vectorizer.vocabulary_)
+        texts, metadata = post_texts(df)
+
+        rows, cols, counts = [], [], []
+        for doc, (text, meta) in enumerate(zip(texts, metadata)):
+            # Location/Tags terms count LEXICAL_METADATA_BOOST times as much as body terms
+            for tokens, weight in (
+                (analyzer(text), 1.0),
+                (analyzer(meta), LEXICAL_METADATA_BOOST),
+            ):
+                for token in tokens:
+                    term_id = vocabulary.setdefault(token, len(vocabulary))
+                    rows.append(doc)
+                    cols.append(term_id)
+                    counts.append(weight)
+
+        n_docs = len(texts)
+        tf = csr_matrix(
+            (counts, (rows, cols)), shape=(n_docs, len(vocabulary)), dtype=np.float32
+        )
+        tf.sum_duplicates()
+
+        # BM25 weight of each (post, term) posting
+        doc_lengths = np.asarray(tf.sum(axis=1)).ravel()
+        avg_length = max(doc_lengths.mean(), 1.0) if n_docs else 1.0
+        doc_freq = np.bincount(tf.indices, minlength=len(vocabulary))
+        idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+        row_of = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[row_of] / avg_length)
+        tf.data = (idf[tf.indices] * tf.data * (BM25_K1 + 1) / (tf.data + norm)).astype(
+            np.float32
+        )
+
+        terms = np.empty(len(vocabulary), dtype=object)
+        for term, term_id in vocabulary.items():
+            terms[term_id] = term
+
+        return cls(
+            *sorted_postings(terms.astype(str), tf.tocsc()),
+            sorted(vectorizer.get_stop_words() or []),
+            n_docs,
+        )
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            terms=self.terms,
+            indptr=self.indptr,
+            doc_indices=self.doc_indices,
+            weights=self.weights,
+            stop_words=np.array(sorted(self.stop_words), dtype=str),
+            n_docs=np.array(self.n_docs),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as stored:
+            terms, indptr = stored["terms"], stored["indptr"]
+            doc_indices, weights = stored["doc_indices"], stored["weights"]
+            stop_words, n_docs = stored["stop_words"].tolist(), stored["n_docs"]
+
+        if len(terms) > 1 and not np.all(terms[:-1] <= terms[1:]):
+            # Saved before terms were sorted
+            from scipy.sparse import csc_matrix
+
+            postings = csc_matrix(
+                (weights, doc_indices, indptr), shape=(int(n_docs), len(terms))
+            )
+            terms, indptr, doc_indices, weights = sorted_postings(terms, postings)
+
+        return cls(terms, indptr, doc_indices, weights, stop_words, n_docs)
+
+    def arrays(self) -> dict:
+        """The index as plain arrays, for `index_generations.GenerationStore.publish`."""
+        return {
+            "lexical_terms": self.terms,
+            "lexical_indptr": self.indptr,
+            "lexical_doc_indices": self.doc_indices,
+            "lexical_weights": self.weights,
+            "lexical_stop_words": np.array(sorted(self.stop_words), dtype=str),
+            "lexical_n_docs": np.array(self.n_docs),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "LexicalIndex":
+        """Wraps arrays from `arrays` (e.g. memory-mapped) without copying them."""
+        return cls(
+            arrays["lexical_terms"],
+            arrays["lexical_indptr"],
+            arrays["lexical_doc_indices"],
+            arrays["lexical_weights"],
+            arrays["lexical_stop_words"].tolist(),
+            arrays["lexical_n_docs"],
+        )
+
+    def term_id(self, term: str):
+        """Column of `term` in the postings, or None if it is not indexed."""
+        i = int(np.searchsorted(self.terms, term))
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def tokenize(self, text: str) -> list[str]:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        return [t for t in tokens if t not in self.stop_words]
+
+    def search(self, query: str, top_k: int):
+        """
+        Scores only the posts appearing in the postings of the query terms.
+
+        Returns:
+            tuple: (doc_indices, scores) of at most top_k posts, best first.
+        """
+        term_ids = {self.term_id(t) for t in self.tokenize(query)} - {None}
+        if not term_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        docs = np.concatenate(
+            [self.doc_indices[self.indptr[t] : self.indptr[t + 1]] for t in term_ids]
+        )
+        weights = np.concatenate(
+            [self.weights[self.indptr[t] : self.indptr[t + 1]] for t in term_ids]
+        )
+
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+
+        if len(candidates) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores = candidates[top], scores[top]
+
+        order = np.argsort(-scores)
+        return candidates[order], scores[order]
+
+
+def sorted_postings(terms: np.ndarray, postings) -> tuple:
+    """(terms, indptr, doc_indices, weights) of CSC postings, columns sorted by term."""
+    order = np.argsort(terms, kind="stable")
+    postings = postings[:, order].tocsc()
+    postings.sort_indices()
+    return (
+        terms[order],
+        postings.indptr.astype(np.int64),
+        postings.indices.astype(np.int32),
+        postings.data.astype(np.float32),
+    )
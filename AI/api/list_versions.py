@@ -0,0 +1,35 @@
+import hashlib
+import time
+from constants import LIST_VERSIONS
+
+
+def mark_lists_updated(client, *lists: str, fingerprint: str = None):
+    """
+    Records that the given Redis lists ("similar_posts", "similar_users",
+    "fallback_posts", "fallback_users", "viewer_exclusions") were just rewritten: their
+    version in the LIST_VERSIONS hash becomes the current time in milliseconds. The
+    read endpoints derive their ETag and Last-Modified from these versions.
+
+    `client` may be a pipeline, so the version changes with the lists it wrote. Jobs
+    that rewrite everything on every run also store the `fingerprint` of what they
+    wrote, and skip this call when `lists_changed` says it is the same.
+    """
+    version = int(time.time() * 1000)
+    mapping = {name: version for name in lists}
+    if fingerprint is not None:
+        mapping.update({f"{name}:fingerprint": fingerprint for name in lists})
+    client.hset(LIST_VERSIONS, mapping=mapping)
+
+
+def lists_changed(client, name: str, fingerprint: str) -> bool:
+    """Whether `fingerprint` differs from the one stored with the list's version."""
+    return client.hget(LIST_VERSIONS, f"{name}:fingerprint") != fingerprint
+
+
+def list_fingerprint(entries) -> str:
+    """Digest of a list's content, given as strings in a deterministic order."""
+    digest = hashlib.blake2b(digest_size=16)
+    for entry in entries:
+        digest.update(entry.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
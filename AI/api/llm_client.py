@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from ollama import AsyncClient, Client
+from config import (
+    OLLAMA_HOST,
+    LLM_MODEL,
+    LLM_KEEP_ALIVE,
+    LLM_NUM_CTX,
+    LLM_NUM_THREAD,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+)
+from generation_stats import first_token_stats
+from observability import LLM_TOKENS, LLM_TOKENS_PER_SECOND
+
+logger = logging.getLogger(__name__)
+
+# A model load reported above this many seconds marks a generation as cold
+COLD_LOAD_SECONDS = 1.0
+
+
+class LLMBusyError(Exception):
+    """Raised when the generation queue is full or a request waited too long for a slot."""
+
+
+class LLMConcurrencyLimiter:
+    """
+    Bounds concurrent generations to what the local model can serve.
+
+    Up to `max_concurrency` requests run at once; up to `max_queue` more wait for a slot
+    for at most `queue_timeout` seconds. Anything beyond that is rejected immediately.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.running = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        # Counted synchronously: the semaphore only changes once acquire() gets scheduled
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            raise LLMBusyError(
+                "Itinerary generator is busy, too many requests are queued. Try again later."
+            )
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusyError(
+                f"Itinerary generator is busy, no slot freed up within {self.queue_timeout:.0f}s."
+            )
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+
+def parse_keep_alive(value: str):
+    """Ollama takes a keep-alive duration string ("30m") or a number of seconds."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+DEFAULT_MODEL = LLM_MODEL
+KEEP_ALIVE = parse_keep_alive(LLM_KEEP_ALIVE)
+
+client = AsyncClient(host=OLLAMA_HOST)
+limiter = LLMConcurrencyLimiter(
+    LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_SECONDS
+)
+
+
+def model_options(num_predict: int = 0) -> dict:
+    """
+    Ollama options for a request. num_ctx/num_thread must be the same for every request
+    (and the preload), otherwise Ollama reloads the model.
+    """
+    options = {
+        "num_ctx": LLM_NUM_CTX,
+        "num_thread": LLM_NUM_THREAD,
+        "num_predict": num_predict,
+    }
+    return {name: value for name, value in options.items() if value}
+
+
+def record_first_token(response, seconds: float = None):
+    """Records time to first token from Ollama's timings (or a measured `seconds`)."""
+    load_seconds = (response.get("load_duration") or 0) / 1e9
+    if seconds is None:
+        prompt_seconds = (response.get("prompt_eval_duration") or 0) / 1e9
+        seconds = load_seconds + prompt_seconds
+    first_token_stats.record(seconds, cold=load_seconds > COLD_LOAD_SECONDS)
+
+
+def record_tokens(response, model: str):
+    """Counts prompt/output tokens and the output throughput Ollama reports when done."""
+    prompt_tokens = response.get("prompt_eval_count") or 0
+    output_tokens = response.get("eval_count") or 0
+    LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(model, "output").inc(output_tokens)
+
+    eval_seconds = (response.get("eval_duration") or 0) / 1e9
+    if output_tokens and eval_seconds:
+        LLM_TOKENS_PER_SECOND.labels(model).observe(output_tokens / eval_seconds)
+
+
+async def chat_completion(
+    prompt: str, model: str = DEFAULT_MODEL, format=None, num_predict: int = 0
+) -> str:
+    """
+    Sends a single-turn chat to Ollama without blocking the event loop.
+
+    Args:
+        format: Optional Ollama output format: "json" or a JSON schema the output must follow.
+        num_predict: Cap on generated tokens, 0 for none.
+
+    Raises:
+        LLMBusyError: If no generation slot is available.
+        RuntimeError: If the Ollama call fails.
+    """
+    content, _ = await timed_chat_completion(prompt, model, format, num_predict)
+    return content
+
+
+async def timed_chat_completion(
+    prompt: str, model: str = DEFAULT_MODEL, format=None, num_predict: int = 0
+) -> tuple[str, float]:
+    """Like `chat_completion`, also returning the generation time (excluding queueing)."""
+    async with limiter.slot():
+        start = time.perf_counter()
+        try:
+            response = await client.chat(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                format=format,
+                options=model_options(num_predict),
+                keep_alive=KEEP_ALIVE,
+            )
+        except Exception as e:
+            logger.exception("AI generation failed", extra={"model": model})
+            raise RuntimeError(f"AI generation failed: {str(e)}")
+
+    record_first_token(response)
+    record_tokens(response, model)
+    return response["message"]["content"], time.perf_counter() - start
+
+
+async def open_chat_stream(
+    prompt: str, model: str = DEFAULT_MODEL, format=None, num_predict: int = 0
+):
+    """
+    Reserves a generation slot and starts a streaming chat with Ollama.
+
+    Errors (busy, unreachable Ollama) are raised here, before anything is streamed.
+    The slot is held until the returned async iterator of content chunks is exhausted
+    or closed.
+
+    Raises:
+        LLMBusyError: If no generation slot is available.
+        RuntimeError: If the Ollama call fails.
+    """
+    stack = AsyncExitStack()
+    await stack.enter_async_context(limiter.slot())
+
+    start = time.perf_counter()
+    try:
+        stream = await client.chat(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            format=format,
+            options=model_options(num_predict),
+            keep_alive=KEEP_ALIVE,
+        )
+    except Exception as e:
+        await stack.aclose()
+        logger.exception("AI generation failed", extra={"model": model})
+        raise RuntimeError(f"AI generation failed: {str(e)}")
+
+    async def chunks():
+        first_token_seconds = None
+        async with stack:
+            async for part in stream:
+                if first_token_seconds is None and part["message"]["content"]:
+                    first_token_seconds = time.perf_counter() - start
+                if part.get("done"):
+                    if first_token_seconds is not None:
+                        record_first_token(part, first_token_seconds)
+                    record_tokens(part, model)
+                yield part["message"]["content"]
+
+    return chunks()
+
+
+async def warm_up_model(model: str = DEFAULT_MODEL) -> float:
+    """
+    Loads the model into Ollama's memory ahead of the first request, with the configured
+    keep-alive so it stays resident.
+
+    Returns:
+        float: Seconds the preload took.
+
+    Raises:
+        RuntimeError: If Ollama cannot be reached.
+    """
+    try:
+        available = {m.model for m in (await client.list()).models}
+    except Exception as e:
+        raise RuntimeError(f"Ollama connection failed: {str(e)}")
+
+    if model not in available and f"{model}:latest" not in available:
+        logger.warning(
+            "Model is not pulled yet, run `ollama pull`", extra={"model": model}
+        )
+
+    start = time.perf_counter()
+    try:
+        # An empty prompt only loads the model
+        await client.generate(
+            model=model, prompt="", options=model_options(), keep_alive=KEEP_ALIVE
+        )
+    except Exception as e:
+        raise RuntimeError(f"Model preload failed: {str(e)}")
+    return time.perf_counter() - start
+
+
+def keep_model_loaded(model: str = DEFAULT_MODEL):
+    """
+    Scheduler job: re-sends the keep-alive, which reloads the model if Ollama dropped it
+    (restart, memory pressure). Cheap when the model is resident.
+    """
+    try:
+        Client(host=OLLAMA_HOST).generate(
+            model=model, prompt="", options=model_options(), keep_alive=KEEP_ALIVE
+        )
+    except Exception:
+        logger.exception("Model keep-alive failed", extra={"model": model})
@@ -1,9 +1,41 @@
+import asyncio
 from contextlib import asynccontextmanager
-from typing import List
-from fastapi import FastAPI, HTTPException
+import json
+import logging
+import os
+import threading
+from email.utils import formatdate
+from typing import List, Literal
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from apscheduler.schedulers.background import BackgroundScheduler
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import redis
-from itinerary_generator import generate_itinerary, regenerate_day_activities
+from observability import CACHE_LOOKUPS, configure_logging, stage
+from itinerary_generator import (
+    generate_itinerary,
+    open_itinerary_stream,
+    regenerate_day_activities,
+)
+from llm_client import LLMBusyError, keep_model_loaded, warm_up_model
+from config import (
+    FALLBACK_LISTS_REFRESH_MINUTES,
+    LLM_MODEL,
+    LLM_KEEP_ALIVE_PING_MINUTES,
+    PROFILING_ADMIN_TOKEN,
+    VIEWER_EXCLUSIONS_REFRESH_MINUTES,
+)
+from constants import (
+    FALLBACK_POST_GROUPS,
+    FALLBACK_POSTS_GLOBAL,
+    FALLBACK_USERS,
+    LIST_VERSIONS,
+    PATH_SCHEDULER_LOCK,
+    SIMILAR_POSTS_REFRESH_MINUTES,
+    SIMILAR_USERS_REFRESH_MINUTES,
+    TOP_N_SIMILAR_POSTS,
+    TOP_N_SIMILAR_USERS,
+)
 from models import (
     ItineraryActivity,
     GenerateItineraryRequest,
@@ -11,59 +43,195 @@ from models import (
     SimilarPostsResponse,
     GeneratedItinerary,
     SimilarUsersResponse,
+    SearchResponse,
+    SearchResult,
+    ProfilingRequest,
 )
-from post_similarity_handlers import update_similarity_for_posts
-from user_similarity_handlers import update_similarity_for_users
-from database_operations import delete_processed_data
-import ollama
+from semantic_search import SemanticSearchService
+from generation_stats import generation_stats, first_token_stats
+from profiling import ProfilingMiddleware, profiler
 from fastapi.middleware.cors import CORSMiddleware
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Initialize the scheduler
 scheduler = BackgroundScheduler()
 
+# Warm in-memory index for free-text post search
+search_service = SemanticSearchService()
+
 
+# The similarity jobs read each other's output files, never run them concurrently
+similarity_update_lock = threading.Lock()
+
+
+# The handlers (pandas, sklearn, SBERT) are imported inside the jobs: importing the app
+# and serving the Redis-backed endpoints does not wait for the ML stack to load
+@profiler.job
 def periodic_user_similarity_update_task():
-    print(" \n🔄 Updating similarity for users...")
-    update_similarity_for_users()
-    print("✅ Similarity for users successfully updated.")
+    from user_similarity_handlers import update_similarity_for_users
 
+    with similarity_update_lock:
+        logger.info("Updating similarity for users")
+        with stage("users", "job"):
+            update_similarity_for_users()
+        logger.info("Similarity for users successfully updated")
 
+
+@profiler.job
 def periodic_post_similarity_update_task():
-    print(" \n🔄 Updating similarity for posts...")
-    update_similarity_for_posts()
-    print("✅ Similarity for posts successfully updated.")
+    from post_similarity_handlers import update_similarity_for_posts
+    from database_operations import delete_processed_data
+
+    with similarity_update_lock:
+        logger.info("Updating similarity for posts")
+        with stage("posts", "job"):
+            update_similarity_for_posts()
+        logger.info("Similarity for posts successfully updated")
 
-    print(" \n🔄 Deleting processed data...")
-    delete_processed_data()
-    print("✅ Processed data successfully deleted.")
+        with stage("posts", "delete_processed"):
+            delete_processed_data()
+        logger.info("Processed data successfully deleted")
+
+
+@profiler.job
+def periodic_viewer_exclusions_refresh_task():
+    from viewer_exclusions import refresh_viewer_exclusions
+
+    try:
+        with stage("viewer_exclusions", "job"):
+            refresh_viewer_exclusions()
+    except Exception:
+        logger.exception("Refreshing viewer exclusion sets failed")
+
+
+@profiler.job
+def periodic_fallback_lists_refresh_task():
+    from fallback_lists import refresh_fallback_posts
+
+    try:
+        with stage("fallbacks", "job"):
+            refresh_fallback_posts()
+    except Exception:
+        logger.exception("Refreshing fallback post lists failed")
+
+
+def startup_task():
+    """Initial full similarity update and search warm-up, run by the scheduler."""
+    periodic_viewer_exclusions_refresh_task()
+    periodic_fallback_lists_refresh_task()
+    periodic_post_similarity_update_task()
+    periodic_user_similarity_update_task()
+    warm_up_search()
+
+
+def warm_up_search():
+    logger.info("Warming up search index")
+    try:
+        with stage("search", "warm_up"):
+            search_service.warm_up()
+        logger.info("Search index ready")
+    except Exception:
+        logger.exception("Search index warm-up failed")
+
+
+async def warm_up_model_task():
+    logger.info("Loading model", extra={"model": LLM_MODEL})
+    try:
+        load_seconds = await warm_up_model()
+        logger.info(
+            "Model loaded",
+            extra={"model": LLM_MODEL, "seconds": round(load_seconds, 1)},
+        )
+    except RuntimeError:
+        logger.exception("Model preload failed", extra={"model": LLM_MODEL})
 
 
 # Schedule the periodic similarity update
-scheduler.add_job(periodic_post_similarity_update_task, "interval", minutes=6)
-scheduler.add_job(periodic_user_similarity_update_task, "interval", minutes=7)
+scheduler.add_job(
+    periodic_post_similarity_update_task,
+    "interval",
+    minutes=SIMILAR_POSTS_REFRESH_MINUTES,
+)
+scheduler.add_job(
+    periodic_user_similarity_update_task,
+    "interval",
+    minutes=SIMILAR_USERS_REFRESH_MINUTES,
+)
+scheduler.add_job(
+    periodic_viewer_exclusions_refresh_task,
+    "interval",
+    minutes=VIEWER_EXCLUSIONS_REFRESH_MINUTES,
+)
+scheduler.add_job(
+    periodic_fallback_lists_refresh_task,
+    "interval",
+    minutes=FALLBACK_LISTS_REFRESH_MINUTES,
+)
+if LLM_KEEP_ALIVE_PING_MINUTES > 0:
+    scheduler.add_job(
+        keep_model_loaded, "interval", minutes=LLM_KEEP_ALIVE_PING_MINUTES
+    )
+# No trigger: runs once, as soon as the scheduler starts
+scheduler.add_job(startup_task)
+
+
+# Kept open for the lifetime of the process, closing it releases the lock
+_scheduler_lock_file = None
+
+
+def acquire_scheduler_lock() -> bool:
+    """
+    With several worker processes (uvicorn/gunicorn --workers N) only the one holding
+    an exclusive lock on PATH_SCHEDULER_LOCK runs the scheduled jobs, which also publish
+    the shared search index; the others only serve requests. The OS releases the lock
+    when its holder exits. Without fcntl (Windows) every process runs the jobs.
+    """
+    global _scheduler_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        return True
+
+    os.makedirs(os.path.dirname(PATH_SCHEDULER_LOCK), exist_ok=True)
+    lock_file = open(PATH_SCHEDULER_LOCK, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _scheduler_lock_file = lock_file
+    return True
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Lifespan function to manage the scheduler lifecycle."""
+    """
+    Lifespan function to manage the scheduler lifecycle.
 
-    print("⏳ Starting Scheduler...")
-    scheduler.start()  # Start scheduler when FastAPI starts
-    print("✅ Scheduler started")
-    periodic_post_similarity_update_task()
-    periodic_user_similarity_update_task()
-    yield  # Keep FastAPI running
-    print("⏳ Shutting Down Scheduler...")
-    scheduler.shutdown()  # Shutdown scheduler when FastAPI stops
-    print("✅ Scheduler shut down")
+    Nothing slow runs before the app accepts requests: the initial similarity update
+    and the model preload happen in the background, while the Redis-backed endpoints
+    already serve the previous results.
+    """
 
+    model_warm_up = asyncio.create_task(warm_up_model_task())
+
+    runs_jobs = acquire_scheduler_lock()
+    if runs_jobs:
+        scheduler.start()  # Start scheduler when FastAPI starts
+        logger.info("Scheduler started", extra={"pid": os.getpid()})
+    else:
+        # Another worker runs the jobs, attach to the search index they publish
+        logger.info("Scheduler runs in another worker", extra={"pid": os.getpid()})
+        threading.Thread(target=warm_up_search, daemon=True).start()
+
+    yield  # Keep FastAPI running
+    model_warm_up.cancel()
+    if runs_jobs:
+        scheduler.shutdown()  # Shutdown scheduler when FastAPI stops
+        logger.info("Scheduler shut down")
 
-try:
-    ollama.list()
-    print("Ollama connection established")
-except Exception as e:
-    print(f"Ollama connection failed: {e}")
-    raise
 
 # http://127.0.0.1:8000/docs
 app = FastAPI(lifespan=lifespan)
@@ -80,58 +248,320 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Profiles requests once armed (PROFILE_NEXT_REQUESTS or POST /admin/profiling)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
 
 # Connect to Redis
 redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
 
+# Shared by both scripts: the ETag of the given lists, and whether If-None-Match
+# (ARGV[1]) holds it, checked before any list is read.
+LIST_ETAG_LUA = """
+local function list_etag(names)
+    local versions = {}
+    for i, name in ipairs(names) do
+        versions[i] = redis.call('HGET', KEYS[1], name) or '0'
+    end
+    local etag = '"' .. table.concat(versions, '-') .. '"'
+    return etag, ARGV[1] ~= '' and string.find(ARGV[1], etag, 1, true) ~= nil
+end
+"""
+
+# Walks the stored similar posts (best first) and keeps the first ARGV[2] that are not
+# in the viewer's set of own/liked/saved posts (ARGV[4] = "1"): one round-trip whatever
+# is filtered out. If the post has no stored list yet, the popular posts of its groups
+# (see fallback_lists), then the global ones, are walked the same way, leaving out the
+# post itself. Returns the source ("hit", "fallback" or "miss"), the ETag, then the IDs,
+# or only the first two if the client's copy is current ("1" as third element).
+# The group lists are named by the group map, so they are not declared in KEYS: fine
+# on a single Redis, not on Redis Cluster.
+SIMILAR_POSTS_SCRIPT = redis_client.register_script(LIST_ETAG_LUA + """
+local filtered = ARGV[4] == '1'
+local source = 'hit'
+local names = {'similar_posts'}
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    source = 'fallback'
+    names[#names + 1] = 'fallback_posts'
+end
+if filtered then
+    names[#names + 1] = 'viewer_exclusions'
+end
+local etag, not_modified = list_etag(names)
+if not_modified then
+    return {source, etag, '1'}
+end
+
+local limit = tonumber(ARGV[2])
+local kept = {}
+local seen = {[ARGV[3]] = true}
+local function take(list)
+    if not list then
+        return
+    end
+    for post_id in string.gmatch(list, '[^,]+') do
+        if #kept == limit then
+            return
+        end
+        if not seen[post_id]
+            and not (filtered and redis.call('SISMEMBER', KEYS[3], post_id) == 1) then
+            seen[post_id] = true
+            kept[#kept + 1] = post_id
+        end
+    end
+end
+
+if source == 'hit' then
+    take(redis.call('GET', KEYS[2]))
+else
+    local groups = redis.call('HGET', KEYS[4], ARGV[3])
+    if groups then
+        for group in string.gmatch(groups, '[^,]+') do
+            take(redis.call('GET', 'fallback_posts:' .. group))
+        end
+    end
+    take(redis.call('GET', KEYS[5]))
+    if #kept == 0 then
+        source = 'miss'
+    end
+end
+table.insert(kept, 1, '0')
+table.insert(kept, 1, etag)
+table.insert(kept, 1, source)
+return kept
+""")
+
+# The stored similar users, or if there are none the most followed users other than
+# the user themselves: {source, etag, not modified, comma-separated IDs}.
+SIMILAR_USERS_SCRIPT = redis_client.register_script(LIST_ETAG_LUA + """
+local stored = redis.call('EXISTS', KEYS[2]) == 1
+local names = {'similar_users'}
+if not stored then
+    names[#names + 1] = 'fallback_users'
+end
+local etag, not_modified = list_etag(names)
+if not_modified then
+    return {stored and 'hit' or 'fallback', etag, '1'}
+end
+if stored then
+    return {'hit', etag, '0', redis.call('GET', KEYS[2])}
+end
+local kept = {}
+local popular = redis.call('GET', KEYS[3])
+if popular then
+    for user_id in string.gmatch(popular, '[^,]+') do
+        if user_id ~= ARGV[2] and #kept < tonumber(ARGV[3]) then
+            kept[#kept + 1] = user_id
+        end
+    end
+end
+if #kept == 0 then
+    return {'miss', etag, '0', ''}
+end
+return {'fallback', etag, '0', table.concat(kept, ',')}
+""")
+
+
+def list_cache_headers(etag: str) -> dict:
+    """
+    ETag, Last-Modified (the newest list version in the ETag) and Cache-Control of a
+    list response. Lists are also rewritten off schedule (startup, the partitioned
+    coordinator) and some jobs only bump a version when the content changed, so no
+    max-age is given: clients revalidate every time, which If-None-Match keeps cheap.
+    """
+    versions = [int(version) for version in etag.strip('"').split("-")]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if max(versions) > 0:
+        headers["Last-Modified"] = formatdate(max(versions) / 1000, usegmt=True)
+    return headers
 
-@app.get("/similar-posts/{post_id}", response_model=SimilarPostsResponse)
-async def get_similar_posts(post_id: str):
-    """Retrieve Top-N similar posts for a given Post ID from Redis."""
-    result = redis_client.get(f"similar:{post_id}")
-
-    if result is None:
-        return SimilarPostsResponse(postId=post_id, similarPostIds=[])
 
-    similar_post_ids = result.split(",")
+@app.get("/similar-posts/{post_id}", response_model=SimilarPostsResponse)
+async def get_similar_posts(
+    post_id: str,
+    response: Response,
+    viewer_id: str = None,
+    if_none_match: str = Header(None),
+):
+    """
+    Retrieve Top-N similar posts for a given Post ID from Redis. With `viewer_id`, the
+    viewer's own, liked and saved posts are left out. Posts without stored similar
+    posts yet get popular posts of the same location/tags instead.
+
+    Answers 304 if If-None-Match holds the current ETag, which changes when the jobs
+    rewrite the lists the response is built from.
+    """
+    source, etag, not_modified, *similar_post_ids = SIMILAR_POSTS_SCRIPT(
+        keys=[
+            LIST_VERSIONS,
+            f"similar:{post_id}",
+            f"excluded_posts:{viewer_id}",
+            FALLBACK_POST_GROUPS,
+            FALLBACK_POSTS_GLOBAL,
+        ],
+        args=[
+            if_none_match or "",
+            TOP_N_SIMILAR_POSTS,
+            post_id,
+            "1" if viewer_id else "0",
+        ],
+        client=redis_client,
+    )
+    headers = list_cache_headers(etag)
+    if not_modified == "1":
+        CACHE_LOOKUPS.labels("similar_posts", "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+
+    CACHE_LOOKUPS.labels("similar_posts", source).inc()
+    response.headers.update(headers)
     return SimilarPostsResponse(postId=post_id, similarPostIds=similar_post_ids)
 
 
 @app.get("/similar-users/{user_id}", response_model=SimilarUsersResponse)
-async def get_similar_users(user_id: str):
-    """Retrieve Top-N similar users for a given User ID from Redis."""
-    result = redis_client.get(f"similar_users:{user_id}")
+async def get_similar_users(
+    user_id: str, response: Response, if_none_match: str = Header(None)
+):
+    """
+    Retrieve Top-N similar users for a given User ID from Redis, or the most followed
+    users if none are stored. Answers 304 if If-None-Match holds the current ETag.
+    """
+    source, etag, not_modified, *result = SIMILAR_USERS_SCRIPT(
+        keys=[LIST_VERSIONS, f"similar_users:{user_id}", FALLBACK_USERS],
+        args=[if_none_match or "", user_id, TOP_N_SIMILAR_USERS],
+        client=redis_client,
+    )
+    headers = list_cache_headers(etag)
+    if not_modified == "1":
+        CACHE_LOOKUPS.labels("similar_users", "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+
+    CACHE_LOOKUPS.labels("similar_users", source).inc()
+    response.headers.update(headers)
+    similar_user_ids = result[0].split(",") if result[0] else []
+    return SimilarUsersResponse(userId=user_id, similarUserIds=similar_user_ids)
 
-    if result is None:
-        return SimilarUsersResponse(userId=user_id, similarUserIds=[])
 
-    similar_user_ids = result.split(",")
-    return SimilarUsersResponse(userId=user_id, similarUserIds=similar_user_ids)
+@app.get("/search", response_model=SearchResponse)
+async def search_posts(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=100),
+    mode: Literal["hybrid", "semantic"] = "hybrid",
+):
+    """Free-text search over posts: BM25 + SBERT (hybrid) or SBERT only (semantic)."""
+    results = await search_service.search(q, limit, mode)
+
+    return SearchResponse(
+        query=q,
+        results=[
+            SearchResult(postId=post_id, score=score) for post_id, score in results
+        ],
+    )
 
 
 @app.post("/generate-itinerary", response_model=GeneratedItinerary)
 async def generate_itinerary_endpoint(request: GenerateItineraryRequest):
     try:
-        itinerary = generate_itinerary(
+        itinerary = await generate_itinerary(
             request.destination, request.days, request.preferences
         )
 
         return itinerary
 
+    except LLMBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/generation-stats")
+async def get_generation_stats():
+    """
+    Parse-failure rate and wasted generation time of the itinerary LLM outputs, and cold
+    vs warm time to first token.
+    """
+    return {**generation_stats.snapshot(), "first_token": first_token_stats.snapshot()}
+
+
+def check_admin_token(token: str):
+    if not PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token != PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+@app.get("/admin/profiling")
+async def get_profiling_status(x_admin_token: str = Header("")):
+    """Remaining profiled job runs/requests and the latest profile files."""
+    check_admin_token(x_admin_token)
+    return profiler.status()
+
+
+@app.post("/admin/profiling")
+async def arm_profiling(request: ProfilingRequest, x_admin_token: str = Header("")):
+    """Profiles the next `jobs` scheduled job runs and `requests` API requests."""
+    check_admin_token(x_admin_token)
+    profiler.arm(jobs=request.jobs, requests=request.requests)
+    return profiler.status()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: pipeline stage timings, batch sizes, cache and LLM counters."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def sse_event(event: str, data) -> str:
+    """Formats one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate-itinerary/stream")
+async def generate_itinerary_stream_endpoint(request: GenerateItineraryRequest):
+    """
+    Streams the itinerary as Server-Sent Events: a `day` event per validated day as soon
+    as it is generated, then `done` with the full itinerary, or `error` with a detail.
+    """
+    try:
+        events = await open_itinerary_stream(
+            request.destination, request.days, request.preferences
+        )
+
+    except LLMBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        try:
+            async for event, data in events:
+                if event == "error":
+                    data = {"detail": data}
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.exception("Itinerary stream failed")
+            yield sse_event("error", {"detail": f"AI generation failed: {str(e)}"})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/regenerate-day-activities", response_model=List[ItineraryActivity])
 async def regenerate_day_activities_endpoint(request: RegenerateDayRequest):
     try:
-        activities = regenerate_day_activities(
+        activities = await regenerate_day_activities(
             request.destination,
             request.excludedActivities,
         )
 
+    except LLMBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except (RuntimeError, ValueError) as e:
         raise HTTPException(status_code=500, detail=str(e))
 
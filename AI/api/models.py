@@ -1,5 +1,5 @@
 from typing import List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class SimilarPostsResponse(BaseModel):
@@ -12,6 +12,16 @@ class SimilarUsersResponse(BaseModel):
     similarUserIds: List[str]
 
 
+class SearchResult(BaseModel):
+    postId: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+
 class GenerateItineraryRequest(BaseModel):
     destination: str
     days: int
@@ -29,6 +39,12 @@ class ItineraryDay(BaseModel):
     activities: List[ItineraryActivity]
 
 
+class ItineraryDayOutline(BaseModel):
+    day: int
+    theme: str
+    highlights: List[str] = []
+
+
 class GeneratedItinerary(BaseModel):
     destination: str
     days: List[ItineraryDay]
@@ -37,3 +53,8 @@ class GeneratedItinerary(BaseModel):
 class RegenerateDayRequest(BaseModel):
     destination: str
     excludedActivities: List[str]
+
+
+class ProfilingRequest(BaseModel):
+    jobs: int = Field(0, ge=0)
+    requests: int = Field(0, ge=0)
@@ -0,0 +1,162 @@
+import json
+import logging
+import sys
+import time
+from prometheus_client import Counter, Histogram
+from config import LOG_FORMAT, LOG_LEVEL
+
+SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+STAGE_DURATION = Histogram(
+    "ai_stage_duration_seconds",
+    "Duration of a pipeline stage.",
+    ["pipeline", "stage"],
+    buckets=(0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+STAGE_ROWS = Histogram(
+    "ai_stage_rows",
+    "Rows (posts, users, matrix rows) processed by a pipeline stage.",
+    ["pipeline", "stage"],
+    buckets=SIZE_BUCKETS,
+)
+BATCH_SIZE = Histogram(
+    "ai_batch_size",
+    "Items per batch (encoder calls, search micro-batches).",
+    ["operation"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096),
+)
+REDIS_KEYS_WRITTEN = Histogram(
+    "ai_redis_keys_written",
+    "Redis keys written or deleted per pipeline flush.",
+    ["pipeline"],
+    buckets=SIZE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "ai_cache_lookups_total",
+    "Cache lookups by cache and result "
+    "(hit, fallback, miss, not_modified, coalesced).",
+    ["cache", "result"],
+)
+LLM_TOKENS = Counter(
+    "ai_llm_tokens_total",
+    "Tokens processed by the LLM.",
+    ["model", "kind"],
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "ai_llm_tokens_per_second",
+    "LLM output token throughput of a generation.",
+    ["model"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200),
+)
+LLM_FIRST_TOKEN = Histogram(
+    "ai_llm_first_token_seconds",
+    "Time to first LLM token, by whether the model had to be loaded.",
+    ["state"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_OUTPUTS = Counter(
+    "ai_llm_outputs_total",
+    "LLM JSON outputs by outcome (parsed, repaired, failed).",
+    ["outcome"],
+)
+LLM_GENERATION_SECONDS = Counter(
+    "ai_llm_generation_seconds_total",
+    "LLM generation time by output outcome; failed is wasted time.",
+    ["outcome"],
+)
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message, level, logger and `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Sets up the root logger once, as JSON lines or plain text (LOG_FORMAT)."""
+    root = logging.getLogger()
+    if getattr(root, "_configured_by_api", False):
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    root._configured_by_api = True
+
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    Context manager timing one stage of a pipeline into STAGE_DURATION. Set `rows` inside
+    the block to also record how much it processed.
+
+        with stage("posts", "insert.sbert_encode") as s:
+            embeddings = encoder.encode(texts)
+            s.rows = len(texts)
+    """
+
+    def __init__(self, pipeline: str, name: str):
+        self.pipeline = pipeline
+        self.name = name
+        self.rows = None
+        self.seconds = None
+
+    def __enter__(self) -> "Stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self._start
+        STAGE_DURATION.labels(self.pipeline, self.name).observe(self.seconds)
+        if self.rows is not None:
+            STAGE_ROWS.labels(self.pipeline, self.name).observe(self.rows)
+        logger.debug(
+            "Stage finished",
+            extra={
+                "pipeline": self.pipeline,
+                "stage": self.name,
+                "seconds": round(self.seconds, 4),
+                "rows": self.rows,
+                "failed": exc_type is not None,
+            },
+        )
+        return False
+
+
+def stage(pipeline: str, name: str) -> Stage:
+    return Stage(pipeline, name)
+
+
+def execute_redis_pipeline(pipeline, name: str) -> list:
+    """Executes a Redis pipeline, recording how many commands (keys) it flushed."""
+    commands = len(pipeline)
+    with stage(name, "redis_pipeline") as s:
+        result = pipeline.execute()
+        s.rows = commands
+    REDIS_KEYS_WRITTEN.labels(name).observe(commands)
+    return result
@@ -0,0 +1,185 @@
+import re
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from config import TFIDF_REWEIGHT_THRESHOLD
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")  # TfidfVectorizer's default token_pattern
+
+
+def _english_stop_words() -> frozenset:
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+    return frozenset(ENGLISH_STOP_WORDS)
+
+
+class OnlineTfidfVectorizer:
+    """
+    TF-IDF featuriser whose vocabulary and document frequencies follow the corpus.
+
+    Unlike a fitted `TfidfVectorizer`, unseen words are appended to the vocabulary instead
+    of dropped, and the document-frequency counts are part of the saved state, so inserts,
+    updates and deletes adjust IDF in O(changed posts). Posts are stored as raw term
+    counts and weighted with the current IDF when they are compared, never refitted.
+
+    Tokenization, smoothed IDF and L2 normalization match `TfidfVectorizer(stop_words=
+    "english")`, and `build_analyzer`/`vocabulary_`/`get_stop_words` mirror its API, so
+    `LexicalIndex.build` takes either.
+    """
+
+    def __init__(self, reweight_threshold: float = TFIDF_REWEIGHT_THRESHOLD):
+        self.stop_words = _english_stop_words()
+        self.reweight_threshold = reweight_threshold
+        self._reset()
+
+    def _reset(self):
+        self.vocabulary_ = {}
+        self.doc_freq = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+        self.changed_docs = (
+            0  # Added/removed documents since the last full re-weighting
+        )
+
+    def get_stop_words(self) -> frozenset:
+        return self.stop_words
+
+    def build_analyzer(self):
+        stop_words = self.stop_words
+
+        def analyze(text: str) -> list[str]:
+            tokens = TOKEN_PATTERN.findall(str(text).lower())
+            return [t for t in tokens if t not in stop_words]
+
+        return analyze
+
+    def count(self, texts) -> csr_matrix:
+        """Term counts of `texts`, one row each, appending unseen terms to the vocabulary."""
+        analyze = self.build_analyzer()
+        vocabulary = self.vocabulary_
+        indptr, indices = [0], []
+        for text in texts:
+            for token in analyze(text):
+                indices.append(vocabulary.setdefault(token, len(vocabulary)))
+            indptr.append(len(indices))
+
+        if len(vocabulary) > len(self.doc_freq):
+            self.doc_freq = np.concatenate(
+                [
+                    self.doc_freq,
+                    np.zeros(len(vocabulary) - len(self.doc_freq), dtype=np.int64),
+                ]
+            )
+
+        counts = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(indptr) - 1, len(vocabulary)),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def add_documents(self, counts: csr_matrix):
+        """Counts `counts` rows into the document frequencies."""
+        self._update_doc_freq(counts, +1)
+
+    def remove_documents(self, counts: csr_matrix):
+        """Removes `counts` rows (as they were stored) from the document frequencies."""
+        self._update_doc_freq(counts, -1)
+
+    def _update_doc_freq(self, counts: csr_matrix, sign: int):
+        present = np.bincount(counts.indices, minlength=counts.shape[1])
+        self.doc_freq[: counts.shape[1]] += sign * present
+        self.n_docs += sign * counts.shape[0]
+        self.changed_docs += counts.shape[0]
+
+    def fit(self, texts) -> csr_matrix:
+        """Starts over from `texts` and returns their term counts."""
+        self._reset()
+        counts = self.count(texts)
+        self.add_documents(counts)
+        self.changed_docs = 0
+        return counts
+
+    @property
+    def idf_(self) -> np.ndarray:
+        return np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1
+
+    def weight(self, counts: csr_matrix) -> csr_matrix:
+        """L2-normalized TF-IDF rows of `counts` under the current IDF."""
+        counts = pad_columns(counts, len(self.vocabulary_))
+        weighted = counts.multiply(self.idf_[None, :]).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        weighted = weighted.multiply(1 / norms[:, None]).tocsr()
+        return weighted.astype(np.float32)
+
+    def transform(self, texts) -> csr_matrix:
+        """TF-IDF rows of `texts` without changing the vocabulary or frequencies."""
+        analyze = self.build_analyzer()
+        indptr, indices = [0], []
+        for text in texts:
+            indices.extend(
+                self.vocabulary_[t] for t in analyze(text) if t in self.vocabulary_
+            )
+            indptr.append(len(indices))
+        counts = csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(indptr) - 1, len(self.vocabulary_)),
+        )
+        counts.sum_duplicates()
+        return self.weight(counts)
+
+    def reweight_due(self) -> bool:
+        """
+        Whether enough of the corpus changed since the last full re-weighting that the
+        stored similarities (computed under older IDF values) should be recomputed.
+        """
+        return self.changed_docs > self.reweight_threshold * max(self.n_docs, 1)
+
+    def mark_reweighted(self):
+        self.changed_docs = 0
+
+
+def pad_columns(counts: csr_matrix, n_columns: int) -> csr_matrix:
+    """Widens a count matrix saved with a smaller vocabulary (new terms are appended)."""
+    if counts.shape[1] == n_columns:
+        return counts
+    return csr_matrix(
+        (counts.data, counts.indices, counts.indptr),
+        shape=(counts.shape[0], n_columns),
+    )
+
+
+def replace_rows(counts: csr_matrix, rows, new_rows: csr_matrix) -> csr_matrix:
+    """Returns `counts` with `rows` replaced by the rows of `new_rows`, in O(nnz)."""
+    n_columns = max(counts.shape[1], new_rows.shape[1])
+    stacked = vstack(
+        [pad_columns(counts, n_columns), pad_columns(new_rows, n_columns)]
+    ).tocsr()
+    order = np.arange(counts.shape[0])
+    order[np.asarray(rows, dtype=np.int64)] = counts.shape[0] + np.arange(
+        new_rows.shape[0]
+    )
+    return stacked[order]
+
+
+def save_term_counts(path: str, counts: csr_matrix):
+    np.savez_compressed(
+        path,
+        data=counts.data,
+        indices=counts.indices,
+        indptr=counts.indptr,
+        shape=np.array(counts.shape),
+    )
+
+
+def load_term_counts(path: str) -> csr_matrix:
+    """
+    Loads counts saved by `save_term_counts`, or None for a legacy dense TF-IDF matrix
+    (`arr_0`), whose counts cannot be recovered.
+    """
+    with np.load(path) as stored:
+        if "indptr" not in stored.files:
+            return None
+        return csr_matrix(
+            (stored["data"], stored["indices"], stored["indptr"]),
+            shape=tuple(stored["shape"]),
+        )
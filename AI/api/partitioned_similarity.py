@@ -0,0 +1,385 @@
+"""
+Partitioned full rebuild of the similar-post lists, spread over worker processes/nodes.
+
+The coordinator fits TF-IDF and encodes SBERT once (O(N)), publishes both as a read-only
+job generation (see `index_generations`), and pushes one task per block of
+PARTITION_BLOCK_SIZE posts onto a Redis list. Any number of workers pop tasks, score
+their block against all posts (the O(N^2) part, O(block x N) memory each) and write the
+block's top-K back to Redis. The coordinator merges the blocks, fixes the SBERT
+calibration and stores the lists like the single-process startpoints do.
+
+Workers on other machines need the job directory (PATH_PARTITION_JOBS) on shared
+storage and SIMILARITY_QUEUE_REDIS_URL pointing at the coordinator's queue. Run from
+the `api` directory:
+
+    python -m partitioned_similarity worker              # on each worker, any number
+    python -m partitioned_similarity coordinator         # once, e.g. nightly
+
+The dense TF-IDF/SBERT similarity CSVs the incremental jobs work on are assembled from
+per-block files the workers leave in the job directory; `--no-matrices` skips them when
+the corpus is too large for dense matrices and only full rebuilds are run.
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import time
+import numpy as np
+import redis
+from scipy.sparse import csr_matrix
+from constants import (
+    WEIGHT_TFIDF,
+    WEIGHT_SBERT,
+    PATH_PARTITION_JOBS,
+    PARTITION_BLOCK_SIZE,
+    PARTITION_CALIBRATION_SAMPLE,
+    PARTITION_TASK_TIMEOUT_SECONDS,
+)
+from config import SIMILARITY_QUEUE_REDIS_URL
+from embedding_quantization import QuantizedEmbeddings
+from index_generations import GenerationStore
+from score_calibration import ScoreCalibration
+from observability import configure_logging, stage
+
+logger = logging.getLogger(__name__)
+
+TASK_QUEUE = "similarity_rebuild:tasks"
+RESULT_TTL_SECONDS = 24 * 3600
+
+
+def job_key(job: str, suffix: str) -> str:
+    return f"similarity_rebuild:{job}:{suffix}"
+
+
+class BlockScorer:
+    """Scores blocks of posts against all posts of a published job generation."""
+
+    def __init__(self, meta: dict, arrays: dict):
+        self.write_matrices = meta["write_matrices"]
+        self.top_k = meta["top_k"]
+        self.calibration = ScoreCalibration(meta["sbert_min"], meta["sbert_max"])
+        self.embeddings = QuantizedEmbeddings(
+            arrays["embeddings"], arrays.get("scales"), meta["precision"]
+        )
+        self.tfidf = csr_matrix(
+            (arrays["tfidf_data"], arrays["tfidf_indices"], arrays["tfidf_indptr"]),
+            shape=tuple(arrays["tfidf_shape"]),
+        )
+        self.tfidf_transposed = self.tfidf.T.tocsr()
+
+    def score(self, start: int, stop: int, matrix_directory: str = None) -> dict:
+        """
+        Top-K combined similarities of posts [start, stop), plus the raw SBERT range.
+        With `matrix_directory`, the block's TF-IDF and raw SBERT rows are saved there.
+        """
+        rows = np.arange(start, stop)
+        tfidf_similarities = (self.tfidf[start:stop] @ self.tfidf_transposed).toarray()
+        sbert_similarities = self.embeddings.cosine_similarity(
+            self.embeddings.take_rows(rows).to_float32()
+        )
+
+        combined = WEIGHT_TFIDF * tfidf_similarities + WEIGHT_SBERT * (
+            self.calibration.rescale(sbert_similarities)
+        )
+        if matrix_directory:
+            np.save(
+                matrix_block_path(matrix_directory, "tfidf", start), tfidf_similarities
+            )
+            np.save(
+                matrix_block_path(matrix_directory, "sbert", start), sbert_similarities
+            )
+        combined[rows - start, rows] = -np.inf  # A post is not similar to itself
+
+        top_k = min(self.top_k, combined.shape[1] - 1)
+        top = np.argpartition(-combined, top_k - 1, axis=1)[:, :top_k]
+        top_scores = np.take_along_axis(combined, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return {
+            "indices": np.take_along_axis(top, order, axis=1).astype(np.int32),
+            "scores": np.take_along_axis(top_scores, order, axis=1).astype(np.float32),
+            "sbert_min": np.float32(sbert_similarities.min()),
+            "sbert_max": np.float32(sbert_similarities.max()),
+        }
+
+
+def matrix_block_path(directory: str, kind: str, start: int) -> str:
+    return os.path.join(directory, f"{kind}-{start}.npy")
+
+
+def _pack(arrays: dict) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _unpack(payload: bytes) -> dict:
+    with np.load(io.BytesIO(payload)) as stored:
+        return {key: stored[key] for key in stored.files}
+
+
+def run_worker(
+    queue_client: redis.Redis = None,
+    directory: str = PATH_PARTITION_JOBS,
+    idle_exit_seconds: float = None,
+):
+    """
+    Pops block tasks until stopped, or until the queue stayed empty for
+    `idle_exit_seconds`. Writing a block twice is harmless, so a task re-queued after
+    a timeout may run on two workers.
+    """
+    queue_client = queue_client or redis.Redis.from_url(SIMILARITY_QUEUE_REDIS_URL)
+    store = GenerationStore(directory)
+    scorers = {}  # Job name -> BlockScorer, the memory maps are opened once per job
+    idle_since = time.monotonic()
+
+    while True:
+        item = queue_client.brpop(TASK_QUEUE, timeout=1)
+        if item is None:
+            if (
+                idle_exit_seconds is not None
+                and time.monotonic() - idle_since > idle_exit_seconds
+            ):
+                return
+            continue
+
+        task = json.loads(item[1])
+        job = task["job"]
+        if job not in scorers:
+            try:
+                scorers = {job: BlockScorer(*store.open(job))}
+            except OSError:
+                logger.warning("Unknown partition job, task dropped", extra=task)
+                continue
+
+        with stage("partitioned", "score_block") as s:
+            scorer = scorers[job]
+            result = scorer.score(
+                task["start"],
+                task["stop"],
+                os.path.join(directory, job) if scorer.write_matrices else None,
+            )
+            s.rows = task["stop"] - task["start"]
+
+        pipeline = queue_client.pipeline()
+        pipeline.set(
+            job_key(job, f"block:{task['block']}"),
+            _pack(result),
+            ex=RESULT_TTL_SECONDS,
+        )
+        pipeline.lpush(job_key(job, "done"), task["block"])
+        pipeline.expire(job_key(job, "done"), RESULT_TTL_SECONDS)
+        pipeline.execute()
+        logger.info("Block scored", extra=task)
+        idle_since = time.monotonic()
+
+
+def run_coordinator(
+    queue_client: redis.Redis = None,
+    directory: str = PATH_PARTITION_JOBS,
+    block_size: int = PARTITION_BLOCK_SIZE,
+    task_timeout_seconds: float = PARTITION_TASK_TIMEOUT_SECONDS,
+    write_matrices: bool = True,
+):
+    """
+    Full rebuild of the TF-IDF/SBERT state, similarity matrices and `similar:*` lists,
+    with the pairwise scoring done by workers. Blocks without a result after `task_timeout_seconds` of no
+    progress are queued again (e.g. their worker died).
+    """
+    from utils import fetch_posts_from_db
+    from sbert_encoders import get_sbert_encoder
+    from lexical_index import LexicalIndex
+    from online_tfidf import OnlineTfidfVectorizer
+    from semantic_search import publish_search_index
+    import post_similarity_handlers as handlers
+    from constants import (
+        PATH_POSTS_CSV,
+        PATH_SBERT_MATRIX,
+        PATH_SBERT_CALIBRATION,
+        PATH_LEXICAL_INDEX,
+        PATH_SIMILARITY_MATRIX_TFIDF,
+        PATH_SIMILARITY_MATRIX_SBERT,
+    )
+    from config import SBERT_EMBEDDING_PRECISION
+
+    queue_client = queue_client or redis.Redis.from_url(SIMILARITY_QUEUE_REDIS_URL)
+
+    with stage("partitioned", "fetch_posts") as s:
+        df = fetch_posts_from_db()
+        s.rows = 0 if df is None else len(df)
+    if df is None or len(df) < 2:
+        logger.warning("Not enough posts, partitioned rebuild skipped")
+        return
+    df.to_csv(PATH_POSTS_CSV, index=False)
+    texts = df["Caption"].fillna("") + " " + df["Body"].fillna("")
+
+    # The O(N) part: features of every post, saved like the startpoints do
+    with stage("partitioned", "tfidf_fit") as s:
+        vectorizer = OnlineTfidfVectorizer()
+        term_counts = vectorizer.fit(texts)
+        tfidf_matrix = vectorizer.weight(term_counts)
+        handlers.save_tfidf_state(vectorizer, term_counts)
+        LexicalIndex.build(df, vectorizer).save(PATH_LEXICAL_INDEX)
+        s.rows = len(df)
+
+    with stage("partitioned", "sbert_encode") as s:
+        embeddings = QuantizedEmbeddings.from_float(
+            get_sbert_encoder().encode(texts.tolist()), SBERT_EMBEDDING_PRECISION
+        )
+        embeddings.save(PATH_SBERT_MATRIX)
+        s.rows = len(df)
+
+    # Ranking only depends on the SBERT score range, estimated from sample rows; the
+    # exact range comes back with the blocks and is saved for the incremental jobs
+    rng = np.random.default_rng(0)
+    sample = rng.choice(
+        len(df), size=min(PARTITION_CALIBRATION_SAMPLE, len(df)), replace=False
+    )
+    sample_scores = embeddings.cosine_similarity(
+        embeddings.take_rows(np.sort(sample)).to_float32()
+    )
+
+    arrays = {
+        "embeddings": embeddings.data,
+        "tfidf_data": tfidf_matrix.data,
+        "tfidf_indices": tfidf_matrix.indices,
+        "tfidf_indptr": tfidf_matrix.indptr,
+        "tfidf_shape": np.array(tfidf_matrix.shape),
+    }
+    if embeddings.scales is not None:
+        arrays["scales"] = embeddings.scales
+    job = GenerationStore(directory, keep=1).publish(
+        arrays,
+        {
+            "precision": embeddings.precision,
+            "top_k": handlers.similar_posts_pool_size(),
+            "sbert_min": float(sample_scores.min()),
+            "sbert_max": float(sample_scores.max()),
+            "write_matrices": write_matrices,
+        },
+    )
+
+    blocks = {
+        block: {"job": job, "block": block, "start": start, "stop": stop}
+        for block, (start, stop) in enumerate(
+            (start, min(start + block_size, len(df)))
+            for start in range(0, len(df), block_size)
+        )
+    }
+    queue_client.lpush(TASK_QUEUE, *[json.dumps(task) for task in blocks.values()])
+    logger.info(
+        "Partitioned rebuild queued",
+        extra={"job": job, "posts": len(df), "blocks": len(blocks)},
+    )
+
+    with stage("partitioned", "wait_for_blocks") as s:
+        done = set()
+        last_progress = time.monotonic()
+        while len(done) < len(blocks):
+            item = queue_client.brpop(job_key(job, "done"), timeout=1)
+            if item is not None:
+                done.add(int(item[1]))
+                last_progress = time.monotonic()
+            elif time.monotonic() - last_progress > task_timeout_seconds:
+                missing = [blocks[b] for b in blocks if b not in done]
+                logger.warning(
+                    "Re-queueing blocks without result",
+                    extra={"job": job, "blocks": len(missing)},
+                )
+                queue_client.lpush(TASK_QUEUE, *[json.dumps(t) for t in missing])
+                last_progress = time.monotonic()
+        s.rows = len(blocks)
+
+    with stage("partitioned", "merge") as s:
+        post_ids = df["PostId"].astype(str).to_numpy()
+        ranked = []
+        sbert_min, sbert_max = np.inf, -np.inf
+        for block, task in blocks.items():
+            result = _unpack(queue_client.get(job_key(job, f"block:{block}")))
+            sbert_min = min(sbert_min, float(result["sbert_min"]))
+            sbert_max = max(sbert_max, float(result["sbert_max"]))
+            for post_id, indices, scores in zip(
+                post_ids[task["start"] : task["stop"]],
+                result["indices"],
+                result["scores"],
+            ):
+                ranked.append((post_id, post_ids[indices], scores))
+        s.rows = len(ranked)
+
+    ScoreCalibration(sbert_min, sbert_max).save(PATH_SBERT_CALIBRATION)
+
+    if write_matrices:
+        with stage("partitioned", "matrices_to_csv") as s:
+            job_directory = os.path.join(directory, job)
+            for kind, path in (
+                ("tfidf", PATH_SIMILARITY_MATRIX_TFIDF),
+                ("sbert", PATH_SIMILARITY_MATRIX_SBERT),
+            ):
+                write_matrix_csv(path, job_directory, kind, blocks.values(), post_ids)
+            s.rows = len(post_ids)
+
+    with stage("posts", "redis_update") as s:
+        handlers.write_similar_posts(ranked)
+        # Lists of posts deleted since the last rebuild
+        removed = handlers.delete_stale_similar_posts(post_ids)
+        s.rows = len(ranked)
+
+    queue_client.delete(
+        job_key(job, "done"), *[job_key(job, f"block:{block}") for block in blocks]
+    )
+    publish_search_index()
+    logger.info(
+        "Partitioned rebuild stored",
+        extra={"job": job, "posts": len(ranked), "removed": removed},
+    )
+
+
+def write_matrix_csv(path: str, job_directory: str, kind: str, tasks, post_ids):
+    """Streams the workers' row blocks into one post x post CSV, a block at a time."""
+    import pandas as pd
+
+    columns = pd.Index(post_ids, name="PostId")
+    with open(path, "w", newline="") as f:
+        for i, task in enumerate(tasks):
+            block = np.load(matrix_block_path(job_directory, kind, task["start"]))
+            pd.DataFrame(
+                block,
+                index=pd.Index(post_ids[task["start"] : task["stop"]], name="PostId"),
+                columns=columns,
+            ).to_csv(f, header=i == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("role", choices=["coordinator", "worker"])
+    parser.add_argument("--redis-url", default=SIMILARITY_QUEUE_REDIS_URL)
+    parser.add_argument("--directory", default=PATH_PARTITION_JOBS)
+    parser.add_argument("--block-size", type=int, default=PARTITION_BLOCK_SIZE)
+    parser.add_argument(
+        "--no-matrices",
+        action="store_true",
+        help="Coordinator: skip the dense similarity CSVs of the incremental jobs",
+    )
+    parser.add_argument(
+        "--idle-exit",
+        type=float,
+        help="Worker: exit after the queue stayed empty this many seconds",
+    )
+    args = parser.parse_args()
+
+    configure_logging()
+    queue_client = redis.Redis.from_url(args.redis_url)
+    if args.role == "worker":
+        run_worker(queue_client, args.directory, args.idle_exit)
+    else:
+        run_coordinator(
+            queue_client,
+            args.directory,
+            args.block_size,
+            write_matrices=not args.no_matrices,
+        )
+
+
+if __name__ == "__main__":
+    main()
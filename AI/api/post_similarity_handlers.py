@@ -1,8 +1,10 @@
 # ruff: noqa: F403, F405
+import logging
+import os
 from constants import *
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy.sparse import vstack
 from sklearn.metrics.pairwise import cosine_similarity
 from database_operations import (
     fetch_unprocessed_inserted_posts,
@@ -13,79 +15,415 @@ from database_operations import (
 )
 import redis
 import joblib
-from utils import fetch_posts_from_db, normalize_similarity_matrix
-from sentence_transformers import SentenceTransformer
+from utils import fetch_posts_from_db
+from embedding_quantization import QuantizedEmbeddings
+from config import (
+    SBERT_EMBEDDING_PRECISION,
+    SIMILAR_POSTS_CANDIDATE_MODE,
+    SIMILAR_POSTS_MMR_LAMBDA,
+)
+from sbert_encoders import get_sbert_encoder
+from lexical_index import LexicalIndex
+from index_generations import GenerationStore
+from semantic_search import publish_search_index
+from candidate_buckets import CandidateBuckets
+from diversity import mmr_select
+from score_calibration import ScoreCalibration
+from online_tfidf import (
+    OnlineTfidfVectorizer,
+    pad_columns,
+    replace_rows,
+    save_term_counts,
+    load_term_counts,
+)
+from list_versions import mark_lists_updated
+from observability import stage, execute_redis_pipeline
 
+logger = logging.getLogger(__name__)
 
 # Connect to Redis
 redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
 
 
 def update_redis_with_similarities(
-    post_ids, tfidf_sim_matrix: pd.DataFrame, sbert_sim_matrix: pd.DataFrame
+    post_ids,
+    tfidf_sim_matrix: pd.DataFrame,
+    sbert_sim_matrix: pd.DataFrame,
+    embeddings: QuantizedEmbeddings = None,
+    embedding_rows: pd.Index = None,
 ):
-    pipeline = redis_client.pipeline()
-    for post_id in post_ids:
-        post_id = str(post_id)  # Ensure post_id is a string (UUID)
+    """
+    Stores the SIMILAR_POSTS_STORED combined-similarity posts of each given post in
+    Redis, best first. Readers return the first TOP_N_SIMILAR_POSTS, after filtering
+    out the viewer's own/liked/saved posts when asked to.
+
+    With SIMILAR_POSTS_CANDIDATE_MODE="restrict" only posts sharing the destination or a
+    tag are scored, so the work per post scales with its bucket size; "boost" scores all
+    posts but favours those in the same buckets.
+
+    With SIMILAR_POSTS_MMR_LAMBDA < 1 the best MMR_CANDIDATE_POOL posts are re-ranked
+    with maximal marginal relevance on the SBERT embeddings, for a more diverse list.
+    Callers that hold the embeddings pass them with `embedding_rows` (their post IDs, in
+    row order), so they are not loaded again.
+    """
+    with stage("posts", "redis_update") as s:
+        s.rows = _store_similarities(
+            post_ids, tfidf_sim_matrix, sbert_sim_matrix, embeddings, embedding_rows
+        )
+
+
+def _store_similarities(
+    post_ids, tfidf_sim_matrix, sbert_sim_matrix, embeddings, embedding_rows
+) -> int:
+    # Work on positions: the two matrices may not share the same row/column order
+    all_post_ids = tfidf_sim_matrix.columns.astype(str).to_numpy()
+    tfidf_values = tfidf_sim_matrix.to_numpy()
+    sbert_values = sbert_sim_matrix.to_numpy()
+
+    post_ids = [
+        str(post_id) for post_id in post_ids
+    ]  # Ensure post_id is a string (UUID)
+    tfidf_rows = tfidf_sim_matrix.index.astype(str).get_indexer(post_ids)
+    sbert_rows = sbert_sim_matrix.index.astype(str).get_indexer(post_ids)
+    sbert_columns = sbert_sim_matrix.columns.astype(str).get_indexer(all_post_ids)
+    all_positions = np.arange(len(all_post_ids))
+
+    # SBERT scores are stored raw and calibrated to 0-1 here, the same way for every row
+    calibration = ScoreCalibration.load(PATH_SBERT_CALIBRATION)
+
+    buckets = None
+    if SIMILAR_POSTS_CANDIDATE_MODE in ("boost", "restrict"):
+        buckets = CandidateBuckets.from_posts_csv(all_post_ids)
+
+    pool_size = similar_posts_pool_size()
+
+    # (post_id, candidate post IDs best first, their combined scores)
+    ranked = []
+    for post_id, tfidf_row, sbert_row in zip(post_ids, tfidf_rows, sbert_rows):
+        if tfidf_row < 0 or sbert_row < 0:
+            continue  # Post missing from one of the matrices
+
+        candidates = all_positions
+        if SIMILAR_POSTS_CANDIDATE_MODE == "restrict":
+            bucket_candidates = buckets.candidates(post_id)
+            # Keep the list full: fall back to all posts if the buckets are too small
+            if len(bucket_candidates) > SIMILAR_POSTS_STORED:
+                candidates = bucket_candidates
 
         # Compute combined similarity for this post
-        combined_sim = (
-            WEIGHT_TFIDF * tfidf_sim_matrix.loc[post_id]
-            + WEIGHT_SBERT * sbert_sim_matrix.loc[post_id]
+        combined_sim_values = WEIGHT_TFIDF * tfidf_values[
+            tfidf_row, candidates
+        ] + WEIGHT_SBERT * calibration.rescale(
+            sbert_values[sbert_row, sbert_columns[candidates]]
         )
-
-        # Convert to NumPy arrays for faster operations
-        combined_sim_values = combined_sim.values
-        post_ids_array = np.array(combined_sim.index)
+        if SIMILAR_POSTS_CANDIDATE_MODE == "boost":
+            combined_sim_values = combined_sim_values + buckets.boost(
+                post_id, candidates
+            )
+        combined_sim_values[sbert_columns[candidates] < 0] = np.nan
+        combined_sim_values = np.nan_to_num(combined_sim_values, nan=-np.inf)
+        candidate_post_ids = all_post_ids[candidates]
 
         # Mask to exclude the current post_id
-        mask = post_ids_array != post_id
+        mask = candidate_post_ids != post_id
         filtered_similarities = combined_sim_values[mask]
-        filtered_post_ids = post_ids_array[mask]
+        filtered_post_ids = candidate_post_ids[mask]
+
+        # Get the most similar posts (or the MMR candidate pool), best first
+        top_n = min(pool_size, len(filtered_post_ids))
+        if top_n == 0:
+            continue
+        top_indices = np.argpartition(-filtered_similarities, top_n - 1)[:top_n]
+        top_indices = top_indices[np.argsort(-filtered_similarities[top_indices])]
+        ranked.append(
+            (
+                post_id,
+                filtered_post_ids[top_indices],
+                filtered_similarities[top_indices],
+            )
+        )
+
+    write_similar_posts(ranked, embeddings, embedding_rows)
+    return len(post_ids)
+
+
+def write_similar_posts(
+    ranked: list,
+    embeddings: QuantizedEmbeddings = None,
+    embedding_rows: pd.Index = None,
+):
+    """
+    Stores each post's best SIMILAR_POSTS_STORED candidates in Redis, diversified first
+    if SIMILAR_POSTS_MMR_LAMBDA < 1.
 
-        # Get Top-N most similar posts
-        top_indices = np.argpartition(-filtered_similarities, TOP_N_SIMILAR_POSTS)[
-            :TOP_N_SIMILAR_POSTS
-        ]
-        similar_posts = filtered_post_ids[top_indices].tolist()
+    Args:
+        ranked: (post_id, candidate post IDs best first, their combined scores) tuples.
+        embeddings, embedding_rows: SBERT embeddings and their post IDs in row order,
+            for the diversification; loaded from disk if not given.
+    """
+    if SIMILAR_POSTS_MMR_LAMBDA < 1 and ranked:
+        ranked = diversify_similar_posts(ranked, embeddings, embedding_rows)
 
-        # Store in Redis
+    pipeline = redis_client.pipeline()
+    for post_id, similar_posts, _ in ranked:
+        similar_posts = similar_posts[:SIMILAR_POSTS_STORED]
         pipeline.set(f"similar:{post_id}", ",".join(map(str, similar_posts)))
-    pipeline.execute()
+    mark_lists_updated(pipeline, "similar_posts")
+    execute_redis_pipeline(pipeline, "posts")
+
+
+def delete_stale_similar_posts(post_ids) -> int:
+    """
+    Deletes the `similar:*` lists of posts not in `post_ids`, i.e. deleted since the
+    lists were last rebuilt. Only those keys: the same Redis holds the viewer
+    exclusion sets, fallback lists, list versions and caches of other jobs.
+    """
+    current = {f"similar:{post_id}" for post_id in post_ids}
+    stale = [
+        key
+        for key in redis_client.scan_iter(match="similar:*", count=1000)
+        if key not in current
+    ]
+    if stale:
+        pipeline = redis_client.pipeline()
+        for start in range(0, len(stale), 1000):
+            pipeline.delete(*stale[start : start + 1000])
+        mark_lists_updated(pipeline, "similar_posts")
+        execute_redis_pipeline(pipeline, "posts")
+    return len(stale)
+
+
+def similar_posts_pool_size() -> int:
+    """Candidates ranked per post: the stored list, or the larger MMR candidate pool."""
+    if SIMILAR_POSTS_MMR_LAMBDA < 1:
+        return max(MMR_CANDIDATE_POOL, SIMILAR_POSTS_STORED)
+    return SIMILAR_POSTS_STORED
+
+
+_stored_embeddings = None  # (file mtimes, embeddings, post IDs in row order)
+
+
+def load_stored_embeddings() -> tuple[QuantizedEmbeddings, pd.Index]:
+    """
+    The saved SBERT embeddings and the post IDs of their rows (the posts CSV order),
+    read again only when either file changed.
+    """
+    global _stored_embeddings
+    mtimes = (os.path.getmtime(PATH_SBERT_MATRIX), os.path.getmtime(PATH_POSTS_CSV))
+    if _stored_embeddings is None or _stored_embeddings[0] != mtimes:
+        embeddings = QuantizedEmbeddings.load(PATH_SBERT_MATRIX)
+        embedding_rows = pd.Index(
+            pd.read_csv(PATH_POSTS_CSV, usecols=["PostId"])["PostId"].astype(str)
+        )
+        _stored_embeddings = (mtimes, embeddings, embedding_rows)
+    return _stored_embeddings[1], _stored_embeddings[2]
+
+
+def diversify_similar_posts(
+    ranked: list,
+    embeddings: QuantizedEmbeddings = None,
+    embedding_rows: pd.Index = None,
+) -> list:
+    """
+    Re-orders each post's candidate pool with maximal marginal relevance, MMR_BLOCK_SIZE
+    posts at a time: relevance is the combined score, redundancy the cosine between the
+    candidates' stored SBERT embeddings (see `write_similar_posts`).
+    """
+    if embeddings is None or embedding_rows is None:
+        embeddings, embedding_rows = load_stored_embeddings()
+    if len(embedding_rows) != len(embeddings):
+        logger.warning(
+            "Similar posts not diversified, posts and embeddings differ",
+            extra={"posts": len(embedding_rows), "embeddings": len(embeddings)},
+        )
+        return ranked
+
+    diversified = []
+    with stage("posts", "mmr_rerank") as s:
+        for start in range(0, len(ranked), MMR_BLOCK_SIZE):
+            block = ranked[start : start + MMR_BLOCK_SIZE]
+            pool = max(len(candidates) for _, candidates, _ in block)
+
+            # Pad the pools to a rectangle; padding and posts without embedding: -inf
+            relevance = np.full((len(block), pool), -np.inf, dtype=np.float32)
+            rows = np.full((len(block), pool), -1, dtype=np.int64)
+            for i, (_, candidates, scores) in enumerate(block):
+                relevance[i, : len(scores)] = scores
+                rows[i, : len(candidates)] = embedding_rows.get_indexer(candidates)
+            relevance[rows < 0] = -np.inf
+            rows[rows < 0] = 0
+
+            vectors = (
+                embeddings.take_rows(rows.ravel())
+                .to_float32()
+                .reshape(len(block), pool, -1)
+            )
+            picked = mmr_select(
+                relevance, vectors, SIMILAR_POSTS_STORED, SIMILAR_POSTS_MMR_LAMBDA
+            )
+
+            for i, (post_id, candidates, scores) in enumerate(block):
+                order = picked[i][np.isfinite(relevance[i, picked[i]])]
+                diversified.append((post_id, candidates[order], scores[order]))
+        s.rows = len(ranked)
+
+    return diversified
+
+
+def update_sbert_calibration(
+    changed_scores: np.ndarray, sbert_sim_matrix: pd.DataFrame, operation: str
+):
+    """
+    Updates the SBERT score statistics from the changed rows only. The whole matrix is
+    rescanned just when they drift beyond SBERT_RECALIBRATION_THRESHOLD.
+    """
+    calibration = ScoreCalibration.load(PATH_SBERT_CALIBRATION)
+    calibration.observe(changed_scores)
+    if calibration.drifted():
+        with stage("posts", f"{operation}.sbert_recalibrate") as s:
+            calibration.refit(sbert_sim_matrix.to_numpy())
+            s.rows = len(sbert_sim_matrix)
+        logger.info(
+            "SBERT scores recalibrated",
+            extra={"min": calibration.min, "max": calibration.max},
+        )
+    calibration.save(PATH_SBERT_CALIBRATION)
+
+
+def migrate_sbert_calibration():
+    """
+    SBERT matrices written before calibration existed were min-max normalized and have
+    no calibration file, while the handlers now append raw cosine rows. Before the first
+    such row is written, the matrix is recomputed raw from the stored embeddings and its
+    calibration saved; if the embeddings do not line up with the posts CSV, all the
+    similarity state is rebuilt instead. Does nothing once the calibration exists.
+    """
+    if os.path.exists(PATH_SBERT_CALIBRATION) or not os.path.exists(
+        PATH_SIMILARITY_MATRIX_SBERT
+    ):
+        return
+
+    embeddings, embedding_rows = load_stored_embeddings()
+    if len(embeddings) != len(embedding_rows):
+        logger.warning(
+            "SBERT embeddings do not match the posts CSV, rebuilding similarities",
+            extra={"embeddings": len(embeddings), "posts": len(embedding_rows)},
+        )
+        initialize_TFIDF_post_similarity_startpoint()
+        initialize_SBERT_post_similarity_startpoint()
+        initialize_combined_similarity_redis_startpoint()
+        return
+
+    with stage("posts", "migrate.sbert_similarity") as s:
+        cosine_sim_matrix = embeddings.cosine_similarity(embeddings.to_float32())
+        s.rows = len(embeddings)
+
+    similarity_df = pd.DataFrame(
+        cosine_sim_matrix, index=embedding_rows, columns=embedding_rows
+    )
+    with stage("posts", "migrate.sbert_to_csv"):
+        similarity_df.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+    ScoreCalibration.from_scores(cosine_sim_matrix).save(PATH_SBERT_CALIBRATION)
+    logger.info(
+        "SBERT similarity matrix migrated to raw scores",
+        extra={"posts": len(embeddings)},
+    )
+
+
+def load_tfidf_state(df_posts: pd.DataFrame):
+    """
+    Loads the online TF-IDF vectorizer and the term counts of the posts, one row each in
+    posts CSV order. State saved by the former fitted `TfidfVectorizer` (dense weighted
+    matrix, no counts) is migrated once by refitting on `df_posts`.
+    """
+    vectorizer = joblib.load(PATH_TFIDF_MODEL)
+    term_counts = load_term_counts(PATH_TFIDF_MATRIX)
+    if (
+        isinstance(vectorizer, OnlineTfidfVectorizer)
+        and term_counts is not None
+        and term_counts.shape[0] == len(df_posts)
+    ):
+        return vectorizer, term_counts
+
+    logger.warning(
+        "TF-IDF state predates the online vectorizer, refitting it",
+        extra={"posts": len(df_posts)},
+    )
+    vectorizer = OnlineTfidfVectorizer()
+    term_counts = vectorizer.fit(
+        df_posts["Caption"].fillna("") + " " + df_posts["Body"].fillna("")
+    )
+    return vectorizer, term_counts
+
+
+def save_tfidf_state(vectorizer: OnlineTfidfVectorizer, term_counts):
+    save_term_counts(PATH_TFIDF_MATRIX, term_counts)
+    joblib.dump(vectorizer, PATH_TFIDF_MODEL)
+
+
+def reweight_tfidf_similarities(
+    vectorizer: OnlineTfidfVectorizer, term_counts, post_ids, operation: str
+) -> pd.DataFrame:
+    """
+    Recomputes all TF-IDF similarities under the current IDF. Incremental updates only
+    re-weight the changed posts, so this runs once TFIDF_REWEIGHT_THRESHOLD of the
+    corpus has changed since the last time.
+    """
+    with stage("posts", f"{operation}.tfidf_reweight") as s:
+        tfidf_matrix = vectorizer.weight(term_counts)
+        similarity_df = pd.DataFrame(
+            cosine_similarity(tfidf_matrix, tfidf_matrix),
+            index=post_ids,
+            columns=post_ids,
+        )
+        vectorizer.mark_reweighted()
+        s.rows = len(post_ids)
+    logger.info("TF-IDF similarities re-weighted", extra={"posts": len(post_ids)})
+    return similarity_df
 
 
 def initialize_TFIDF_post_similarity_startpoint():
     """Initialize the TF-IDF model and matrix, then compute and save the similarity matrix."""
 
     try:
-        print("💡 Starting TF-IDF similarity initialization...")
+        logger.info("Starting TF-IDF similarity initialization")
         # Load existing posts from the database
-        df = fetch_posts_from_db()
+        with stage("posts", "init.fetch_posts") as s:
+            df = fetch_posts_from_db()
+            s.rows = 0 if df is None else len(df)
 
         if df is None or df.empty:
-            print("⚠️ No posts found. Initialization skipped.")
+            logger.warning("No posts found, TF-IDF initialization skipped")
             return
 
         df.to_csv(PATH_POSTS_CSV, index=False)
-        print(f"✅ CSV updated successfully: {PATH_POSTS_CSV}")
+        logger.info("Posts CSV updated", extra={"path": PATH_POSTS_CSV})
 
         # Combine Caption and Body for text analysis
         df["text"] = df["Caption"].fillna("") + " " + df["Body"].fillna("")
 
         # Create and fit the TF-IDF vectorizer
-        vectorizer = TfidfVectorizer(stop_words="english")
-        tfidf_matrix = vectorizer.fit_transform(df["text"])
-
-        # Save the TF-IDF model
-        joblib.dump(vectorizer, PATH_TFIDF_MODEL)
-        print(f"✅ TF-IDF vectorizer saved at {PATH_TFIDF_MODEL}")
+        with stage("posts", "init.tfidf_fit") as s:
+            vectorizer = OnlineTfidfVectorizer()
+            term_counts = vectorizer.fit(df["text"])
+            tfidf_matrix = vectorizer.weight(term_counts)
+            s.rows = len(df)
+
+        # Save the TF-IDF model and the term counts (weighted with the current IDF on use)
+        save_tfidf_state(vectorizer, term_counts)
+        logger.info(
+            "TF-IDF vectorizer and term counts saved",
+            extra={"path": PATH_TFIDF_MODEL, "terms": len(vectorizer.vocabulary_)},
+        )
 
-        # Save the TF-IDF matrix
-        np.savez_compressed(PATH_TFIDF_MATRIX, tfidf_matrix.toarray())
-        print(f"✅ TF-IDF matrix saved at {PATH_TFIDF_MATRIX}")
+        # Build the lexical (BM25) index used by hybrid search
+        LexicalIndex.build(df, vectorizer).save(PATH_LEXICAL_INDEX)
+        logger.info("Lexical index saved", extra={"path": PATH_LEXICAL_INDEX})
 
         # Compute Cosine Similarity
-        cosine_sim_matrix = cosine_similarity(tfidf_matrix, tfidf_matrix)
+        with stage("posts", "init.tfidf_similarity") as s:
+            cosine_sim_matrix = cosine_similarity(tfidf_matrix, tfidf_matrix)
+            s.rows = len(df)
 
         # Convert to DataFrame
         similarity_df = pd.DataFrame(
@@ -93,76 +431,88 @@ def initialize_TFIDF_post_similarity_startpoint():
         )
 
         # Save similarity matrix
-        similarity_df.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
-        print("✅ Similarity matrix updated successfully!")
+        with stage("posts", "init.tfidf_to_csv"):
+            similarity_df.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
+        logger.info("TF-IDF similarity matrix updated", extra={"posts": len(df)})
 
-    except Exception as e:
-        print(f"❌ Error initializing similarity system: {e}")
+    except Exception:
+        logger.exception("Error initializing similarity system")
 
 
 def initialize_SBERT_post_similarity_startpoint():
     """Initialize the SBERT model and embedding matrix, then compute and save the similarity matrix."""
 
     try:
-        print("💡 Starting SBERT similarity initialization...")
+        logger.info("Starting SBERT similarity initialization")
         # Load existing posts from the database
-        df = fetch_posts_from_db()
+        with stage("posts", "init.fetch_posts") as s:
+            df = fetch_posts_from_db()
+            s.rows = 0 if df is None else len(df)
 
         if df is None or df.empty:
-            print("⚠️ No posts found. Initialization skipped.")
+            logger.warning("No posts found, SBERT initialization skipped")
             return
 
         # Combine Caption and Body for text analysis
         df["text"] = df["Caption"].fillna("") + " " + df["Body"].fillna("")
 
-        # Load SBERT model (you can change to a different model if needed)
-        sbert_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-        # Compute SBERT embeddings
-        sbert_matrix = sbert_model.encode(df["text"].tolist(), show_progress_bar=True)
+        # Compute SBERT embeddings with the configured encoder backend
+        with stage("posts", "init.sbert_encode") as s:
+            sbert_matrix = get_sbert_encoder().encode(df["text"].tolist())
+            s.rows = len(df)
 
         # Save the SBERT model
         # sbert_model.save(path_sbert_model)
         # print(f"✅ SBERT model saved at {path_sbert_model}")
 
-        # Save the SBERT matrix
-        np.savez_compressed(PATH_SBERT_MATRIX, sbert_matrix)
-        print(f"✅ SBERT matrix saved at {PATH_SBERT_MATRIX}")
+        # Save the SBERT matrix in the configured storage precision
+        sbert_embeddings = QuantizedEmbeddings.from_float(
+            sbert_matrix, SBERT_EMBEDDING_PRECISION
+        )
+        sbert_embeddings.save(PATH_SBERT_MATRIX)
+        logger.info(
+            "SBERT matrix saved",
+            extra={"path": PATH_SBERT_MATRIX, "precision": SBERT_EMBEDDING_PRECISION},
+        )
 
-        # Compute Cosine Similarity
-        cosine_sim_matrix = cosine_similarity(sbert_matrix, sbert_matrix)
+        # Compute Cosine Similarity against the stored (possibly quantized) embeddings
+        with stage("posts", "init.sbert_similarity") as s:
+            cosine_sim_matrix = sbert_embeddings.cosine_similarity(sbert_matrix)
+            s.rows = len(df)
 
         # Convert to DataFrame
         similarity_df = pd.DataFrame(
             cosine_sim_matrix, index=df["PostId"], columns=df["PostId"]
         )
 
-        # Save normalized similarity matrix
-        similarity_df = normalize_similarity_matrix(similarity_df)
-        similarity_df.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
-        print("✅ Similarity matrix updated successfully!")
+        # Save the raw scores with their calibration, they are rescaled when combined
+        ScoreCalibration.from_scores(cosine_sim_matrix).save(PATH_SBERT_CALIBRATION)
+        with stage("posts", "init.sbert_to_csv"):
+            similarity_df.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+        logger.info("SBERT similarity matrix updated", extra={"posts": len(df)})
 
-    except Exception as e:
-        print(f"❌ Error initializing SBERT similarity system: {e}")
+    except Exception:
+        logger.exception("Error initializing SBERT similarity system")
 
 
 def initialize_combined_similarity_redis_startpoint():
     """Compute and store Top-N similar posts using weighted TF-IDF + SBERT similarity in Redis."""
 
     try:
-        print("💡 Starting combined similarity redis initialization...")
-        redis_client.flushall()
+        logger.info("Starting combined similarity Redis initialization")
 
         # Load posts from the database
         df_posts = fetch_posts_from_db()
 
         if df_posts is None or df_posts.empty:
-            print("⚠️ No posts found. Initialization skipped.")
+            logger.warning("No posts found, Redis initialization skipped")
             return
 
-        # Load and normalize similarity matrices
-        tfidf_sim_matrix = pd.read_csv(PATH_SIMILARITY_MATRIX_TFIDF, index_col=0)
-        sbert_sim_matrix = pd.read_csv(PATH_SIMILARITY_MATRIX_SBERT, index_col=0)
+        # Load similarity matrices
+        with stage("posts", "init.read_matrices") as s:
+            tfidf_sim_matrix = pd.read_csv(PATH_SIMILARITY_MATRIX_TFIDF, index_col=0)
+            sbert_sim_matrix = pd.read_csv(PATH_SIMILARITY_MATRIX_SBERT, index_col=0)
+            s.rows = len(tfidf_sim_matrix)
 
         # Ensure matrices are aligned (same post IDs and order)
         post_ids = df_posts["PostId"].astype(str).tolist()
@@ -170,11 +520,14 @@ def initialize_combined_similarity_redis_startpoint():
         sbert_sim_matrix = sbert_sim_matrix.loc[post_ids, post_ids]
 
         update_redis_with_similarities(post_ids, tfidf_sim_matrix, sbert_sim_matrix)
+        delete_stale_similar_posts(post_ids)
 
-        print("✅ Top combined similarities for each post stored in Redis!")
+        logger.info(
+            "Top combined similarities stored in Redis", extra={"posts": len(post_ids)}
+        )
 
-    except Exception as e:
-        print(f"❌ Error initializing combined similarity system: {e}")
+    except Exception:
+        logger.exception("Error initializing combined similarity system")
 
 
 def handle_unprocessed_inserted_posts(updated_posts_to_add=None):
@@ -182,80 +535,117 @@ def handle_unprocessed_inserted_posts(updated_posts_to_add=None):
     Returns:
         list: A list of post IDs that have been processed.
     """
+    operation = "update" if updated_posts_to_add else "insert"
 
     # Load existing posts and similarity matrix
-    df_existing_posts = pd.read_csv(PATH_POSTS_CSV)
-    df_similarity_matrix_tfidf = pd.read_csv(PATH_SIMILARITY_MATRIX_TFIDF, index_col=0)
-    df_similarity_matrix_sbert = pd.read_csv(PATH_SIMILARITY_MATRIX_SBERT, index_col=0)
+    with stage("posts", f"{operation}.read_csv") as s:
+        df_existing_posts = pd.read_csv(PATH_POSTS_CSV)
+        df_similarity_matrix_tfidf = pd.read_csv(
+            PATH_SIMILARITY_MATRIX_TFIDF, index_col=0
+        )
+        df_similarity_matrix_sbert = pd.read_csv(
+            PATH_SIMILARITY_MATRIX_SBERT, index_col=0
+        )
+        s.rows = len(df_existing_posts)
 
     # Fetch unprocessed inserted posts
     if updated_posts_to_add:
         new_posts = updated_posts_to_add
     else:
-        new_posts = fetch_unprocessed_inserted_posts()
+        with stage("posts", "insert.fetch") as s:
+            new_posts = fetch_unprocessed_inserted_posts()
+            s.rows = len(new_posts)
     if not new_posts:
-        print("💤 INSERT: No new inserted posts to process.")
+        logger.info("INSERT: no new inserted posts to process")
         return []
 
     df_new_posts = pd.DataFrame(new_posts)
 
     # Append new posts to CSV
     df_updated_posts = pd.concat([df_existing_posts, df_new_posts], ignore_index=True)
-    df_updated_posts.to_csv(PATH_POSTS_CSV, index=False)
+    with stage("posts", f"{operation}.posts_to_csv") as s:
+        df_updated_posts.to_csv(PATH_POSTS_CSV, index=False)
+        s.rows = len(df_updated_posts)
 
     ## ====================== TF-IDF UPDATE ====================== ##
 
-    # Load existing TF-IDF model and matrix
-    vectorizer = joblib.load(PATH_TFIDF_MODEL)
-    tfidf_matrix_existing = np.load(PATH_TFIDF_MATRIX)["arr_0"]
-
-    # Compute TF-IDF vectors **only for new posts**
-    new_texts = (
-        df_new_posts["Caption"].fillna("") + " " + df_new_posts["Body"].fillna("")
-    )
-    new_tfidf_matrix = vectorizer.transform(new_texts)
-
-    # Stack new matrix with existing matrix (rows)
-    tfidf_matrix = np.vstack([tfidf_matrix_existing, new_tfidf_matrix.toarray()])
+    with stage("posts", f"{operation}.tfidf_transform") as s:
+        # Load existing TF-IDF model and term counts
+        vectorizer, term_counts_existing = load_tfidf_state(df_existing_posts)
 
-    # Save updated TF-IDF matrix
-    np.savez_compressed(PATH_TFIDF_MATRIX, tfidf_matrix)
+        # Count the new posts (unseen words extend the vocabulary) into the IDF
+        new_texts = (
+            df_new_posts["Caption"].fillna("") + " " + df_new_posts["Body"].fillna("")
+        )
+        new_term_counts = vectorizer.count(new_texts)
+        vectorizer.add_documents(new_term_counts)
+
+        # Stack new counts with existing counts (rows), weighted with the updated IDF
+        term_counts = vstack(
+            [
+                pad_columns(term_counts_existing, new_term_counts.shape[1]),
+                new_term_counts,
+            ]
+        ).tocsr()
+        tfidf_matrix = vectorizer.weight(term_counts)
+        new_tfidf_matrix = tfidf_matrix[-len(new_texts) :]
+        s.rows = len(new_texts)
 
     # Update similarity matrix **only for new posts**
     new_post_ids = df_new_posts["PostId"].tolist()
     all_post_ids = df_updated_posts["PostId"].tolist()
+    redis_post_ids = new_post_ids
 
-    # Ensure df_similarity has all required indices (rows & columns)
-    df_similarity_matrix_tfidf = df_similarity_matrix_tfidf.reindex(
-        index=all_post_ids, columns=all_post_ids, fill_value=np.nan
-    )
-
-    # Compute pairwise similarities efficiently
-    new_similarities = cosine_similarity(new_tfidf_matrix, tfidf_matrix)
-
-    ## Assign similarity values
-    for i, new_id in enumerate(new_post_ids):
-        df_similarity_matrix_tfidf.loc[new_id, all_post_ids] = new_similarities[i, :]
-        df_similarity_matrix_tfidf.loc[all_post_ids, new_id] = new_similarities[i, :]
-
-    # Save updated similarity matrix
-    df_similarity_matrix_tfidf.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
+    if vectorizer.reweight_due():
+        df_similarity_matrix_tfidf = reweight_tfidf_similarities(
+            vectorizer, term_counts, all_post_ids, operation
+        )
+        redis_post_ids = all_post_ids  # Every post's list may have changed
+    else:
+        # Ensure df_similarity has all required indices (rows & columns)
+        df_similarity_matrix_tfidf = df_similarity_matrix_tfidf.reindex(
+            index=all_post_ids, columns=all_post_ids, fill_value=np.nan
+        )
 
-    # Save updated TF-IDF model
-    joblib.dump(vectorizer, PATH_TFIDF_MODEL)
+        # Compute pairwise similarities efficiently
+        with stage("posts", f"{operation}.tfidf_similarity") as s:
+            new_similarities = cosine_similarity(new_tfidf_matrix, tfidf_matrix)
+            s.rows = len(new_post_ids)
+
+        ## Assign similarity values
+        with stage("posts", f"{operation}.tfidf_matrix_update") as s:
+            for i, new_id in enumerate(new_post_ids):
+                df_similarity_matrix_tfidf.loc[new_id, all_post_ids] = new_similarities[
+                    i, :
+                ]
+                df_similarity_matrix_tfidf.loc[all_post_ids, new_id] = new_similarities[
+                    i, :
+                ]
+            s.rows = len(new_post_ids)
+
+    # Save updated TF-IDF model, term counts and similarity matrix
+    with stage("posts", f"{operation}.tfidf_save"):
+        save_tfidf_state(vectorizer, term_counts)
+    with stage("posts", f"{operation}.tfidf_to_csv") as s:
+        df_similarity_matrix_tfidf.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
+        s.rows = len(all_post_ids)
 
     ## ====================== SBERT UPDATE ====================== ##
 
-    # Load SBERT model & embeddings
-    sbert_model = SentenceTransformer(PATH_SBERT_MODEL)
-    sbert_embeddings_existing = np.load(PATH_SBERT_MATRIX)["arr_0"]
+    # Load SBERT embeddings
+    sbert_embeddings_existing = QuantizedEmbeddings.load(
+        PATH_SBERT_MATRIX, SBERT_EMBEDDING_PRECISION
+    )
 
     # Compute SBERT embeddings for new posts
-    new_sbert_embeddings = sbert_model.encode(new_texts, convert_to_numpy=True)
+    with stage("posts", f"{operation}.sbert_encode") as s:
+        new_sbert_embeddings = get_sbert_encoder().encode(new_texts)
+        s.rows = len(new_texts)
 
     # Stack SBERT embeddings
-    sbert_embeddings = np.vstack([sbert_embeddings_existing, new_sbert_embeddings])
-    np.savez_compressed(PATH_SBERT_MATRIX, sbert_embeddings)
+    with stage("posts", f"{operation}.sbert_save"):
+        sbert_embeddings = sbert_embeddings_existing.append(new_sbert_embeddings)
+        sbert_embeddings.save(PATH_SBERT_MATRIX)
 
     # Ensure SBERT matrix is aligned
     df_similarity_matrix_sbert = df_similarity_matrix_sbert.reindex(
@@ -263,35 +653,45 @@ def handle_unprocessed_inserted_posts(updated_posts_to_add=None):
     )
 
     # Calculate pairwise SBERT similarities
-    new_similarities_sbert = cosine_similarity(new_sbert_embeddings, sbert_embeddings)
+    with stage("posts", f"{operation}.sbert_similarity") as s:
+        new_similarities_sbert = sbert_embeddings.cosine_similarity(
+            new_sbert_embeddings
+        )
+        s.rows = len(new_post_ids)
 
     # Update SBERT similarity matrix
-    for i, new_id in enumerate(new_post_ids):
-        df_similarity_matrix_sbert.loc[new_id, all_post_ids] = new_similarities_sbert[
-            i, :
-        ]
-        df_similarity_matrix_sbert.loc[all_post_ids, new_id] = new_similarities_sbert[
-            i, :
-        ]
-
-    # Only normalize new ones
-    df_similarity_matrix_sbert = normalize_similarity_matrix(
-        df_similarity_matrix_sbert, new_post_ids
+    with stage("posts", f"{operation}.sbert_matrix_update") as s:
+        for i, new_id in enumerate(new_post_ids):
+            df_similarity_matrix_sbert.loc[new_id, all_post_ids] = (
+                new_similarities_sbert[i, :]
+            )
+            df_similarity_matrix_sbert.loc[all_post_ids, new_id] = (
+                new_similarities_sbert[i, :]
+            )
+        s.rows = len(new_post_ids)
+
+    update_sbert_calibration(
+        new_similarities_sbert, df_similarity_matrix_sbert, operation
     )
-    df_similarity_matrix_sbert.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+
+    with stage("posts", f"{operation}.sbert_to_csv") as s:
+        df_similarity_matrix_sbert.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+        s.rows = len(all_post_ids)
 
     ## ====================== COMBINED SIMILARITIES REDIS ====================== ##
 
     update_redis_with_similarities(
-        new_post_ids, df_similarity_matrix_tfidf, df_similarity_matrix_sbert
+        redis_post_ids,
+        df_similarity_matrix_tfidf,
+        df_similarity_matrix_sbert,
+        sbert_embeddings,
+        pd.Index(df_updated_posts["PostId"].astype(str)),
     )
 
-    if updated_posts_to_add:
-        print(
-            f"✅ UPDATE: Inserted {len(updated_posts_to_add)} posts and updated similarity!"
-        )
-    else:
-        print(f"✅ INSERT: Inserted {len(new_posts)} posts and updated similarity!")
+    logger.info(
+        f"{operation.upper()}: inserted posts and updated similarity",
+        extra={"posts": len(new_posts)},
+    )
 
     # return processed post IDs
     return new_post_ids
@@ -333,23 +733,42 @@ def handle_unprocessed_updated_posts():
     """Handle updated posts efficiently by recomputing only the necessary similarities."""
 
     # Load existing posts and similarity matrix
-    df_existing_posts = pd.read_csv(PATH_POSTS_CSV)
-    df_similarity_matrix_tfidf = pd.read_csv(PATH_SIMILARITY_MATRIX_TFIDF, index_col=0)
-    df_similarity_matrix_sbert = pd.read_csv(PATH_SIMILARITY_MATRIX_SBERT, index_col=0)
+    with stage("posts", "update.read_csv") as s:
+        df_existing_posts = pd.read_csv(PATH_POSTS_CSV)
+        df_similarity_matrix_tfidf = pd.read_csv(
+            PATH_SIMILARITY_MATRIX_TFIDF, index_col=0
+        )
+        df_similarity_matrix_sbert = pd.read_csv(
+            PATH_SIMILARITY_MATRIX_SBERT, index_col=0
+        )
+        s.rows = len(df_existing_posts)
 
     # Fetch and split unprocessed updated posts
-    updated_posts, updated_posts_to_add = split_updated_posts()
+    with stage("posts", "update.fetch") as s:
+        updated_posts, updated_posts_to_add = split_updated_posts()
+        s.rows = len(updated_posts) + len(updated_posts_to_add)
 
     if not updated_posts and not updated_posts_to_add:
-        print("💤 UPDATE: No updated posts to process or updated posts to add.")
+        logger.info("UPDATE: no updated posts to process or updated posts to add")
         return []
 
     if not updated_posts:
-        print("💤 UPDATE: No updated posts to process.")
+        logger.info("UPDATE: no updated posts to process")
     else:
-        print(f"💤 UPDATE: Found {len(updated_posts)} updated posts to process.")
+        logger.info(
+            "UPDATE: found updated posts to process",
+            extra={"posts": len(updated_posts)},
+        )
 
-        df_updated_posts = pd.DataFrame(updated_posts)
+        # A post edited twice since the last tick is processed with its latest content
+        df_updated_posts = pd.DataFrame(updated_posts).drop_duplicates(
+            subset="PostId", keep="last"
+        )
+        df_updated_posts["PostId"] = df_updated_posts["PostId"].astype(str)
+        df_existing_posts["PostId"] = df_existing_posts["PostId"].astype(str)
+
+        # Load the TF-IDF state before the posts change (a migration refits on them)
+        vectorizer, term_counts = load_tfidf_state(df_existing_posts)
 
         # Ensure updates modify the correct posts in df_existing_posts
         for _, row in df_updated_posts.iterrows():
@@ -365,107 +784,145 @@ def handle_unprocessed_updated_posts():
             if mask.any():  # If post exists, update it properly
                 df_existing_posts.loc[mask, "Caption"] = row["Caption"]
                 df_existing_posts.loc[mask, "Body"] = row["Body"]
+                df_existing_posts.loc[mask, "Location"] = row.get("Location")
+                df_existing_posts.loc[mask, "Tags"] = row.get("Tags")
 
         # Save the updated posts data
-        df_existing_posts.to_csv(PATH_POSTS_CSV, index=False)
+        with stage("posts", "update.posts_to_csv") as s:
+            df_existing_posts.to_csv(PATH_POSTS_CSV, index=False)
+            s.rows = len(df_existing_posts)
 
         # =================== TF-IDF UPDATES =================== #
 
-        # Load existing TF-IDF model and matrix
-        vectorizer = joblib.load(PATH_TFIDF_MODEL)
-        tfidf_matrix_existing = np.load(PATH_TFIDF_MATRIX)["arr_0"]
-
-        # Compute new TF-IDF vectors **only for updated posts**
-        updated_texts = (
-            df_updated_posts["Caption"].fillna("")
-            + " "
-            + df_updated_posts["Body"].fillna("")
-        )
-        updated_tfidf_matrix = vectorizer.transform(updated_texts)
-
-        # Replace old vectors with new ones in the TF-IDF matrix
-        updated_post_ids = df_updated_posts["PostId"].tolist()
-        post_id_to_index = {
-            post_id: i for i, post_id in enumerate(df_existing_posts["PostId"])
-        }
-
-        for i, post_id in enumerate(updated_post_ids):
-            index = post_id_to_index[post_id]
-            tfidf_matrix_existing[index] = updated_tfidf_matrix[i].toarray()
-
-        # Save updated TF-IDF matrix
-        np.savez_compressed(PATH_TFIDF_MATRIX, tfidf_matrix_existing)
+        with stage("posts", "update.tfidf_transform") as s:
+            updated_texts = (
+                df_updated_posts["Caption"].fillna("")
+                + " "
+                + df_updated_posts["Body"].fillna("")
+            )
+            updated_post_ids = df_updated_posts["PostId"].tolist()
+            post_id_to_index = {
+                post_id: i for i, post_id in enumerate(df_existing_posts["PostId"])
+            }
+            updated_indices = [
+                post_id_to_index[post_id] for post_id in updated_post_ids
+            ]
+
+            # Swap the old counts of the updated posts for the new ones in the IDF
+            vectorizer.remove_documents(term_counts[updated_indices])
+            updated_term_counts = vectorizer.count(updated_texts)
+            vectorizer.add_documents(updated_term_counts)
+
+            # Replace old rows with new ones, weighted with the updated IDF
+            term_counts = replace_rows(
+                term_counts, updated_indices, updated_term_counts
+            )
+            tfidf_matrix = vectorizer.weight(term_counts)
+            updated_tfidf_matrix = tfidf_matrix[updated_indices]
+            s.rows = len(updated_post_ids)
 
-        # Compute pairwise similarities **only for updated posts**
         all_post_ids = df_existing_posts["PostId"].tolist()
-        updated_similarities = cosine_similarity(
-            updated_tfidf_matrix, tfidf_matrix_existing
-        )
+        redis_post_ids = updated_post_ids
 
-        # Assign new similarity values
-        for i, updated_id in enumerate(updated_post_ids):
-            df_similarity_matrix_tfidf.loc[updated_id, all_post_ids] = (
-                updated_similarities[i, :]
-            )
-            df_similarity_matrix_tfidf.loc[all_post_ids, updated_id] = (
-                updated_similarities[i, :]
+        if vectorizer.reweight_due():
+            df_similarity_matrix_tfidf = reweight_tfidf_similarities(
+                vectorizer, term_counts, all_post_ids, "update"
             )
-
-        # Save updated similarity matrix
-        df_similarity_matrix_tfidf.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
+            redis_post_ids = all_post_ids  # Every post's list may have changed
+        else:
+            # Compute pairwise similarities **only for updated posts**
+            with stage("posts", "update.tfidf_similarity") as s:
+                updated_similarities = cosine_similarity(
+                    updated_tfidf_matrix, tfidf_matrix
+                )
+                s.rows = len(updated_post_ids)
+
+            # Assign new similarity values
+            with stage("posts", "update.tfidf_matrix_update") as s:
+                for i, updated_id in enumerate(updated_post_ids):
+                    df_similarity_matrix_tfidf.loc[updated_id, all_post_ids] = (
+                        updated_similarities[i, :]
+                    )
+                    df_similarity_matrix_tfidf.loc[all_post_ids, updated_id] = (
+                        updated_similarities[i, :]
+                    )
+                s.rows = len(updated_post_ids)
+
+        # Save updated TF-IDF model, term counts and similarity matrix
+        with stage("posts", "update.tfidf_save"):
+            save_tfidf_state(vectorizer, term_counts)
+        with stage("posts", "update.tfidf_to_csv") as s:
+            df_similarity_matrix_tfidf.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
+            s.rows = len(all_post_ids)
 
         # =================== SBERT UPDATES =================== #
 
-        sbert_model = SentenceTransformer(PATH_SBERT_MODEL)
-        sbert_embeddings_existing = np.load(PATH_SBERT_MATRIX)["arr_0"]
+        sbert_embeddings_existing = QuantizedEmbeddings.load(
+            PATH_SBERT_MATRIX, SBERT_EMBEDDING_PRECISION
+        )
 
         # Compute SBERT embeddings for updated posts
-        updated_sbert_embeddings = sbert_model.encode(
-            updated_texts, convert_to_numpy=True
-        )
+        with stage("posts", "update.sbert_encode") as s:
+            updated_sbert_embeddings = get_sbert_encoder().encode(updated_texts)
+            s.rows = len(updated_texts)
 
         # Replace old embeddings
-        for i, post_id in enumerate(df_updated_posts["PostId"]):
-            index = post_id_to_index[post_id]
-            sbert_embeddings_existing[index] = updated_sbert_embeddings[i]
+        sbert_embeddings_existing.replace_rows(
+            updated_indices, updated_sbert_embeddings
+        )
 
         # Save updated SBERT embeddings
-        np.savez_compressed(PATH_SBERT_MATRIX, sbert_embeddings_existing)
+        with stage("posts", "update.sbert_save"):
+            sbert_embeddings_existing.save(PATH_SBERT_MATRIX)
 
         # Compute SBERT similarities for updated posts
-        updated_similarities_sbert = cosine_similarity(
-            updated_sbert_embeddings, sbert_embeddings_existing
-        )
-
-        # Update SBERT similarity matrix
-        for i, post_id in enumerate(df_updated_posts["PostId"]):
-            df_similarity_matrix_sbert.loc[post_id, all_post_ids] = (
-                updated_similarities_sbert[i, :]
-            )
-            df_similarity_matrix_sbert.loc[all_post_ids, post_id] = (
-                updated_similarities_sbert[i, :]
+        with stage("posts", "update.sbert_similarity") as s:
+            updated_similarities_sbert = sbert_embeddings_existing.cosine_similarity(
+                updated_sbert_embeddings
             )
+            s.rows = len(updated_post_ids)
 
-        # Only normalize for updated posts
-        df_similarity_matrix_sbert = normalize_similarity_matrix(
-            df_similarity_matrix_sbert, updated_post_ids
+        # Update SBERT similarity matrix
+        with stage("posts", "update.sbert_matrix_update") as s:
+            for i, post_id in enumerate(df_updated_posts["PostId"]):
+                df_similarity_matrix_sbert.loc[post_id, all_post_ids] = (
+                    updated_similarities_sbert[i, :]
+                )
+                df_similarity_matrix_sbert.loc[all_post_ids, post_id] = (
+                    updated_similarities_sbert[i, :]
+                )
+            s.rows = len(updated_post_ids)
+
+        update_sbert_calibration(
+            updated_similarities_sbert, df_similarity_matrix_sbert, "update"
         )
-        df_similarity_matrix_sbert.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+
+        with stage("posts", "update.sbert_to_csv") as s:
+            df_similarity_matrix_sbert.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+            s.rows = len(all_post_ids)
 
         # =================== COMBINED SIMILARITIES REDIS =================== #
 
         update_redis_with_similarities(
-            updated_post_ids, df_similarity_matrix_tfidf, df_similarity_matrix_sbert
+            redis_post_ids,
+            df_similarity_matrix_tfidf,
+            df_similarity_matrix_sbert,
+            sbert_embeddings_existing,
+            pd.Index(df_existing_posts["PostId"].astype(str)),
         )
 
-        print(
-            f"✅ UPDATE: Updated {len(updated_posts)} posts and recomputed similarity matrix!"
+        logger.info(
+            "UPDATE: updated posts and recomputed similarity matrix",
+            extra={"posts": len(updated_posts)},
         )
 
     if not updated_posts_to_add:
-        print("💤 UPDATE: No updated posts to add.")
+        logger.info("UPDATE: no updated posts to add")
     else:
-        print(f"✅ UPDATE: Found {len(updated_posts_to_add)} updated posts to add.")
+        logger.info(
+            "UPDATE: found updated posts to add",
+            extra={"posts": len(updated_posts_to_add)},
+        )
         handle_unprocessed_inserted_posts(updated_posts_to_add)
 
     # return processed post IDs
@@ -479,95 +936,171 @@ def handle_unprocessed_deleted_posts():
     """Handle deleted posts by removing them from all relevant data."""
 
     # Load existing posts and similarity matrix
-    df_existing_posts = pd.read_csv(PATH_POSTS_CSV)
-    df_similarity_matrix_tfidf = pd.read_csv(PATH_SIMILARITY_MATRIX_TFIDF, index_col=0)
-    df_similarity_matrix_sbert = pd.read_csv(PATH_SIMILARITY_MATRIX_SBERT, index_col=0)
+    with stage("posts", "delete.read_csv") as s:
+        df_existing_posts = pd.read_csv(PATH_POSTS_CSV)
+        df_similarity_matrix_tfidf = pd.read_csv(
+            PATH_SIMILARITY_MATRIX_TFIDF, index_col=0
+        )
+        df_similarity_matrix_sbert = pd.read_csv(
+            PATH_SIMILARITY_MATRIX_SBERT, index_col=0
+        )
+        s.rows = len(df_existing_posts)
 
     # Fetch unprocessed deleted posts
-    deleted_post_ids = fetch_unprocessed_deleted_posts()
+    with stage("posts", "delete.fetch") as s:
+        deleted_post_ids = fetch_unprocessed_deleted_posts()
+        s.rows = len(deleted_post_ids)
     if not deleted_post_ids:
-        print("💤 DELETE: No deleted posts to process.")
+        logger.info("DELETE: no deleted posts to process")
         return []
 
     # Convert PostId to string for consistency
     df_existing_posts["PostId"] = df_existing_posts["PostId"].astype(str)
     deleted_post_ids = [str(pid) for pid in deleted_post_ids]
 
+    # Matrix rows follow the posts CSV order, so find the rows to keep before filtering
+    keep_mask = ~df_existing_posts["PostId"].isin(deleted_post_ids)
+    indices_to_keep = np.flatnonzero(keep_mask.to_numpy())
+
     # Remove deleted posts from everywhere
 
     # =================== REMOVE FROM POSTS CSV =================== #
-    df_existing_posts = df_existing_posts[
-        ~df_existing_posts["PostId"].isin(deleted_post_ids)
-    ]
-    df_existing_posts.to_csv(PATH_POSTS_CSV, index=False)
+    df_all_posts = df_existing_posts
+    df_existing_posts = df_existing_posts[keep_mask]
+    with stage("posts", "delete.posts_to_csv") as s:
+        df_existing_posts.to_csv(PATH_POSTS_CSV, index=False)
+        s.rows = len(df_existing_posts)
 
     # =================== REMOVE FROM TF-IDF =================== #
 
-    ## Remove from similarity matrix
-    df_similarity_matrix_tfidf = df_similarity_matrix_tfidf.drop(
-        index=deleted_post_ids, columns=deleted_post_ids, errors="ignore"
-    )
-    df_similarity_matrix_tfidf.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
-
-    ## Remove from TF-IDF matrix
-    tfidf_matrix_existing = np.load(PATH_TFIDF_MATRIX)["arr_0"]
+    ## Remove from the term counts and the IDF
     all_post_ids = df_existing_posts["PostId"].tolist()
-    indices_to_keep = [
-        i for i, post_id in enumerate(all_post_ids) if post_id not in deleted_post_ids
-    ]
-    tfidf_matrix_existing = tfidf_matrix_existing[indices_to_keep]
-    np.savez_compressed(PATH_TFIDF_MATRIX, tfidf_matrix_existing)
+    with stage("posts", "delete.tfidf_counts"):
+        vectorizer, term_counts = load_tfidf_state(df_all_posts)
+        vectorizer.remove_documents(term_counts[np.flatnonzero(~keep_mask.to_numpy())])
+        term_counts = term_counts[indices_to_keep]
+
+    ## Remove from similarity matrix
+    if vectorizer.reweight_due():
+        df_similarity_matrix_tfidf = reweight_tfidf_similarities(
+            vectorizer, term_counts, all_post_ids, "delete"
+        )
+    else:
+        df_similarity_matrix_tfidf = df_similarity_matrix_tfidf.drop(
+            index=deleted_post_ids, columns=deleted_post_ids, errors="ignore"
+        )
+    with stage("posts", "delete.tfidf_save"):
+        save_tfidf_state(vectorizer, term_counts)
+    with stage("posts", "delete.tfidf_to_csv") as s:
+        df_similarity_matrix_tfidf.to_csv(PATH_SIMILARITY_MATRIX_TFIDF)
+        s.rows = len(df_similarity_matrix_tfidf)
 
     # =================== REMOVE FROM SBERT =================== #
 
-    # Load SBERT embeddings
-    sbert_embeddings_existing = np.load(PATH_SBERT_MATRIX)["arr_0"]
+    with stage("posts", "delete.sbert_save"):
+        # Load SBERT embeddings
+        sbert_embeddings_existing = QuantizedEmbeddings.load(
+            PATH_SBERT_MATRIX, SBERT_EMBEDDING_PRECISION
+        )
 
-    # Filter out deleted posts' embeddings
-    sbert_embeddings_existing = sbert_embeddings_existing[indices_to_keep]
+        # Filter out deleted posts' embeddings
+        sbert_embeddings_existing = sbert_embeddings_existing.take_rows(indices_to_keep)
 
-    # Save updated SBERT embeddings
-    np.savez_compressed(PATH_SBERT_MATRIX, sbert_embeddings_existing)
+        # Save updated SBERT embeddings
+        sbert_embeddings_existing.save(PATH_SBERT_MATRIX)
 
     # Remove deleted posts from SBERT similarity matrix
     df_similarity_matrix_sbert = df_similarity_matrix_sbert.drop(
         index=deleted_post_ids, columns=deleted_post_ids, errors="ignore"
     )
-    df_similarity_matrix_sbert.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+    with stage("posts", "delete.sbert_to_csv") as s:
+        df_similarity_matrix_sbert.to_csv(PATH_SIMILARITY_MATRIX_SBERT)
+        s.rows = len(df_similarity_matrix_sbert)
 
     # =================== REMOVE FROM REDIS =================== #
 
     pipeline = redis_client.pipeline()
     for post_id in deleted_post_ids:
         pipeline.delete(f"similar:{post_id}")
+    mark_lists_updated(pipeline, "similar_posts")
+    execute_redis_pipeline(pipeline, "posts")
 
     update_redis_with_similarities(
-        all_post_ids, df_similarity_matrix_tfidf, df_similarity_matrix_sbert
+        all_post_ids,
+        df_similarity_matrix_tfidf,
+        df_similarity_matrix_sbert,
+        sbert_embeddings_existing,
+        pd.Index(all_post_ids),
     )
 
-    print(
-        f"✅ DELETE: Deleted {len(deleted_post_ids)} posts from dataset, similarity matrix, and Redis."
+    logger.info(
+        "DELETE: deleted posts from dataset, similarity matrix, and Redis",
+        extra={"posts": len(deleted_post_ids)},
     )
 
     # return processed deleted post IDs
     return deleted_post_ids
 
 
+def rebuild_lexical_index():
+    """Rebuilds the BM25 inverted index from the posts CSV and the TF-IDF vocabulary."""
+    try:
+        with stage("posts", "lexical_index") as s:
+            df_posts = pd.read_csv(PATH_POSTS_CSV)
+            vectorizer = joblib.load(PATH_TFIDF_MODEL)
+            LexicalIndex.build(df_posts, vectorizer).save(PATH_LEXICAL_INDEX)
+            s.rows = len(df_posts)
+        logger.info("Lexical index rebuilt", extra={"posts": len(df_posts)})
+    except Exception:
+        logger.exception("Error rebuilding lexical index")
+
+
+def publish_search_index_generation():
+    """Publishes the posts, embeddings and lexical index to the API workers."""
+    try:
+        with stage("posts", "search_index_publish"):
+            publish_search_index()
+    except Exception:
+        logger.exception("Error publishing search index")
+
+
 def update_similarity_for_posts():
     post_ids_processed = []
     deleted_post_ids_processed = []
 
-    # Collect processed post IDs
-    post_ids_processed.extend(handle_unprocessed_inserted_posts())
-    post_ids_processed.extend(handle_unprocessed_updated_posts())
-    deleted_post_ids_processed.extend(handle_unprocessed_deleted_posts())
-
-    # Mark processed posts in database
-    if post_ids_processed:
-        mark_as_processed(post_ids_processed)
-
-    if deleted_post_ids_processed:
-        mark_deletions_as_processed(deleted_post_ids_processed)
+    with stage("posts", "tick") as tick:
+        # Matrices from before calibration are made raw before new raw rows are added
+        migrate_sbert_calibration()
+
+        # Collect processed post IDs
+        post_ids_processed.extend(handle_unprocessed_inserted_posts())
+        post_ids_processed.extend(handle_unprocessed_updated_posts())
+        deleted_post_ids_processed.extend(handle_unprocessed_deleted_posts())
+
+        # Keep the search postings in step with the posts CSV
+        if (
+            post_ids_processed
+            or deleted_post_ids_processed
+            or not os.path.exists(PATH_LEXICAL_INDEX)
+        ):
+            rebuild_lexical_index()
+
+        # Hand the new read-side index to the API workers
+        if (
+            post_ids_processed
+            or deleted_post_ids_processed
+            or GenerationStore().current() is None
+        ):
+            publish_search_index_generation()
+
+        # Mark processed posts in database
+        if post_ids_processed:
+            mark_as_processed(post_ids_processed)
+
+        if deleted_post_ids_processed:
+            mark_deletions_as_processed(deleted_post_ids_processed)
+
+        tick.rows = len(post_ids_processed) + len(deleted_post_ids_processed)
 
 
 # initialize_TFIDF_post_similarity_startpoint()
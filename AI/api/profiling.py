@@ -0,0 +1,310 @@
+import cProfile
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from config import (
+    PROFILE_NEXT_JOBS,
+    PROFILE_NEXT_REQUESTS,
+    PROFILE_MODE,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_TRACEMALLOC,
+    PROFILE_TOP_ALLOCATIONS,
+    PROFILE_DIR,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread every `interval` seconds from a background thread
+    and counts identical stacks, in the collapsed format flamegraph tools read
+    ("outer;inner;leaf count" per line, e.g. flamegraph.pl or speedscope).
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                )
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def write_collapsed(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class AllocationTracker:
+    """
+    Traces allocations with tracemalloc and keeps the snapshot taken closest to peak
+    usage (checked every `interval` seconds), so allocation sites that are freed before
+    the run ends still show up. Sites are reported as growth over the start of the run.
+    """
+
+    # Frames of the profiler itself
+    IGNORED = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, threading.__file__),
+        tracemalloc.Filter(False, __file__),
+    ]
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.baseline = None
+        self.snapshot = None
+        self.snapshot_size = 0
+        self.peak = 0
+        self._started_tracing = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.take_snapshot()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._take_if_larger()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._take_if_larger()
+
+    def _take_if_larger(self):
+        # Snapshots of a large heap are costly, only retake after substantial growth
+        size = tracemalloc.get_traced_memory()[0]
+        if self.snapshot is None or size > self.snapshot_size * 1.5 + 32 * 1024**2:
+            self.snapshot = None  # Frees the previous one first
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_size = size
+
+    def write(self, path: str, label: str, top: int):
+        stats = self.snapshot.filter_traces(self.IGNORED).compare_to(
+            self.baseline.filter_traces(self.IGNORED), "lineno"
+        )
+        with open(path, "w") as f:
+            f.write(
+                f"{label}: peak traced memory {self.peak / 1024**2:.1f} MiB, "
+                f"largest snapshot {self.snapshot_size / 1024**2:.1f} MiB\n"
+            )
+            f.write(f"Top {top} allocation sites (growth since the run started):\n")
+            for stat in stats[:top]:
+                frame = stat.traceback[0]
+                f.write(
+                    f"{stat.size_diff / 1024:+12.1f} KiB {stat.count_diff:+9d} blocks  "
+                    f"{frame.filename}:{frame.lineno}\n"
+                )
+
+
+class Profiler:
+    """
+    Opt-in profiling of the next N scheduled job runs and/or API requests.
+
+    Disabled it costs one integer check per job run or request. Armed (from settings or
+    `arm`), each run is profiled with a stack sampler or cProfile, plus tracemalloc, and
+    written to `directory`:
+
+        <time>-<label>.collapsed   sampled stacks, flamegraph collapsed format
+        <time>-<label>.pstats      cProfile stats (deterministic mode, e.g. snakeviz)
+        <time>-<label>.alloc.txt   top allocation sites and peak traced memory
+
+    Only one run is profiled at a time; runs overlapping it are not profiled and do not
+    use up the budget.
+    """
+
+    def __init__(
+        self,
+        jobs: int = PROFILE_NEXT_JOBS,
+        requests: int = PROFILE_NEXT_REQUESTS,
+        mode: str = PROFILE_MODE,
+        sample_interval: float = PROFILE_SAMPLE_INTERVAL_MS / 1000,
+        trace_allocations: bool = PROFILE_TRACEMALLOC,
+        top_allocations: int = PROFILE_TOP_ALLOCATIONS,
+        directory: str = PROFILE_DIR,
+    ):
+        if mode not in ("sampling", "deterministic"):
+            raise ValueError(f"Unknown profiling mode '{mode}'.")
+        self.remaining = {"jobs": jobs, "requests": requests}
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.trace_allocations = trace_allocations
+        self.top_allocations = top_allocations
+        self.directory = directory
+        self.recent_outputs = []
+        self._lock = threading.Lock()
+        self._active = False
+
+    def arm(self, jobs: int = 0, requests: int = 0):
+        """Profiles the next `jobs` job runs and `requests` requests (replacing any rest)."""
+        with self._lock:
+            self.remaining = {"jobs": jobs, "requests": requests}
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "remaining": dict(self.remaining),
+                "directory": os.path.abspath(self.directory),
+                "recent_outputs": list(self.recent_outputs),
+            }
+
+    def _claim(self, kind: str) -> bool:
+        with self._lock:
+            if self._active or self.remaining[kind] <= 0:
+                return False
+            self.remaining[kind] -= 1
+            self._active = True
+            return True
+
+    @contextmanager
+    def profile(self, kind: str, label: str):
+        """Profiles the enclosed block if the `kind` ("jobs"/"requests") budget allows."""
+        if self.remaining[kind] <= 0 or not self._claim(kind):
+            yield
+            return
+
+        try:
+            with self._profiling(label):
+                yield
+        finally:
+            with self._lock:
+                self._active = False
+
+    @contextmanager
+    def _profiling(self, label: str):
+        allocations = None
+        if self.trace_allocations:
+            allocations = AllocationTracker()
+            allocations.start()
+
+        sampler = profile = None
+        if self.mode == "sampling":
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if sampler is not None:
+                sampler.stop()
+            if profile is not None:
+                profile.disable()
+            if allocations is not None:
+                allocations.stop()
+
+            # Allocation statistics of a large heap take seconds, keep them off the run
+            threading.Thread(
+                target=self._write,
+                args=(label, seconds, sampler, profile, allocations),
+                daemon=True,
+            ).start()
+
+    def _write(self, label, seconds, sampler, profile, allocations):
+        try:
+            self._write_outputs(label, seconds, sampler, profile, allocations)
+        except OSError:
+            logger.exception("Writing profile failed", extra={"label": label})
+
+    def _write_outputs(self, label, seconds, sampler, profile, allocations):
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)
+        base = os.path.join(
+            self.directory,
+            f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{safe_label}",
+        )
+
+        outputs = []
+        if sampler is not None:
+            sampler.write_collapsed(f"{base}.collapsed")
+            outputs.append(f"{base}.collapsed")
+        if profile is not None:
+            profile.dump_stats(f"{base}.pstats")
+            outputs.append(f"{base}.pstats")
+        if allocations is not None:
+            allocations.write(f"{base}.alloc.txt", label, self.top_allocations)
+            outputs.append(f"{base}.alloc.txt")
+
+        with self._lock:
+            self.recent_outputs = (self.recent_outputs + outputs)[-20:]
+        logger.info(
+            "Profile written",
+            extra={"label": label, "seconds": round(seconds, 3), "files": outputs},
+        )
+
+    def job(self, func):
+        """Decorator profiling a scheduled job function while the job budget lasts."""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.profile("jobs", func.__name__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests while the request budget lasts. A plain ASGI
+    class rather than an HTTP middleware, so unprofiled requests pass straight through.
+
+    Requests are profiled in the event-loop thread: samples can include other requests
+    served concurrently.
+    """
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.profiler.remaining["requests"] <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']} {scope['path']}"
+        with self.profiler.profile("requests", label):
+            await self.app(scope, receive, send)
+
+
+profiler = Profiler()
@@ -0,0 +1,228 @@
+from abc import ABC, abstractmethod
+import json
+import logging
+import os
+import numpy as np
+from constants import (
+    PATH_SBERT_MODEL,
+    PATH_SBERT_ONNX_MODEL,
+    PATH_SBERT_ONNX_MODEL_QUANTIZED,
+)
+from config import (
+    SBERT_ENCODER_BACKEND,
+    SBERT_ONNX_QUANTIZED,
+    SBERT_ENCODER_THREADS,
+    SBERT_ENCODE_BATCH_SIZE,
+)
+from observability import BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class SbertEncoder(ABC):
+    """Turns post texts into L2-normalized SBERT embeddings (float32, one row per text)."""
+
+    name = "base"
+
+    @abstractmethod
+    def encode(self, texts) -> np.ndarray:
+        """Embeds `texts`, one L2-normalized row per text."""
+
+
+class SentenceTransformerEncoder(SbertEncoder):
+    """Default backend: the stock PyTorch `SentenceTransformer`."""
+
+    name = "pytorch"
+
+    def __init__(
+        self,
+        model_path: str = PATH_SBERT_MODEL,
+        batch_size: int = SBERT_ENCODE_BATCH_SIZE,
+        num_threads: int = SBERT_ENCODER_THREADS,
+    ):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.batch_size = batch_size
+
+    def encode(self, texts) -> np.ndarray:
+        texts = list(texts)
+        BATCH_SIZE.labels("sbert_encode").observe(len(texts))
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+
+
+class OnnxEncoder(SbertEncoder):
+    """
+    ONNX Runtime backend: the exported transformer plus mean pooling and normalization
+    done in NumPy, mirroring the SentenceTransformer pipeline in `PATH_SBERT_MODEL`.
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        onnx_path: str,
+        model_path: str = PATH_SBERT_MODEL,
+        batch_size: int = SBERT_ENCODE_BATCH_SIZE,
+        num_threads: int = SBERT_ENCODER_THREADS,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(
+            onnx_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        with open(os.path.join(model_path, "sentence_bert_config.json")) as f:
+            max_seq_length = json.load(f)["max_seq_length"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding(
+            pad_id=self.tokenizer.token_to_id("[PAD]"), pad_token="[PAD]"
+        )
+        self.batch_size = batch_size
+
+        if "quant" in os.path.basename(onnx_path):
+            self.name = "onnx-int8"
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        inputs = {
+            name: value for name, value in inputs.items() if name in self.input_names
+        }
+
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over non-padding tokens, then L2 normalization
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = summed / counts
+        norms = np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return (embeddings / norms).astype(np.float32)
+
+    def encode(self, texts) -> np.ndarray:
+        texts = [str(t) for t in texts]
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        BATCH_SIZE.labels("sbert_encode").observe(len(texts))
+
+        # Sort by length so each batch pads to a similar size
+        order = np.argsort([len(t) for t in texts])
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            batch_order = order[start : start + self.batch_size]
+            batches.append(self._encode_batch([texts[i] for i in batch_order]))
+
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.vstack(batches)
+        return embeddings
+
+
+def export_onnx_model(
+    model_path: str = PATH_SBERT_MODEL,
+    onnx_path: str = PATH_SBERT_ONNX_MODEL,
+    quantized_path: str = PATH_SBERT_ONNX_MODEL_QUANTIZED,
+    quantize: bool = True,
+):
+    """
+    Exports the transformer of the local SBERT model to ONNX and, optionally,
+    a dynamically int8-quantized copy of it.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [
+        name
+        for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+    logger.info("SBERT ONNX model exported", extra={"path": onnx_path})
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        logger.info("Quantized SBERT ONNX model saved", extra={"path": quantized_path})
+
+
+def create_sbert_encoder(
+    backend: str = SBERT_ENCODER_BACKEND,
+    quantized: bool = SBERT_ONNX_QUANTIZED,
+    batch_size: int = SBERT_ENCODE_BATCH_SIZE,
+    num_threads: int = SBERT_ENCODER_THREADS,
+) -> SbertEncoder:
+    """Builds an encoder for the given backend ("pytorch" or "onnx")."""
+    if backend == "pytorch":
+        return SentenceTransformerEncoder(
+            batch_size=batch_size, num_threads=num_threads
+        )
+
+    if backend == "onnx":
+        onnx_path = (
+            PATH_SBERT_ONNX_MODEL_QUANTIZED if quantized else PATH_SBERT_ONNX_MODEL
+        )
+        if not os.path.exists(onnx_path):
+            logger.warning(
+                "ONNX model not found, exporting SBERT model to ONNX",
+                extra={"path": onnx_path},
+            )
+            export_onnx_model(quantize=quantized)
+        return OnnxEncoder(onnx_path, batch_size=batch_size, num_threads=num_threads)
+
+    raise ValueError(f"Unknown SBERT encoder backend '{backend}'.")
+
+
+_encoder = None
+
+
+def get_sbert_encoder() -> SbertEncoder:
+    """Returns the process-wide encoder for the configured backend, loading it once."""
+    global _encoder
+    if _encoder is None:
+        _encoder = create_sbert_encoder()
+    return _encoder
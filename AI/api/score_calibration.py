@@ -0,0 +1,90 @@
+import json
+import os
+import numpy as np
+from constants import PATH_SBERT_CALIBRATION
+from config import SBERT_RECALIBRATION_THRESHOLD
+
+EPSILON = 1e-9  # Prevents division by zero
+
+
+class ScoreCalibration:
+    """
+    Min-max calibration of raw SBERT similarity scores to the 0-1 range.
+
+    The similarity matrix keeps raw cosine scores; they are rescaled when combined with
+    TF-IDF, always with the same `min`/`max`, so older and newer rows stay comparable.
+    Running `observed_min`/`observed_max` are updated from the rows that changed only.
+    The calibration is moved (and the matrix rescanned) only once they drift beyond
+    `threshold` of the calibrated range.
+    """
+
+    def __init__(
+        self,
+        min_score: float = 0.0,
+        max_score: float = 1.0,
+        observed_min: float = None,
+        observed_max: float = None,
+        threshold: float = SBERT_RECALIBRATION_THRESHOLD,
+    ):
+        self.min = float(min_score)
+        self.max = float(max_score)
+        self.observed_min = self.min if observed_min is None else float(observed_min)
+        self.observed_max = self.max if observed_max is None else float(observed_max)
+        self.threshold = threshold
+
+    @classmethod
+    def from_scores(cls, scores) -> "ScoreCalibration":
+        """Calibration fitted to a full score matrix."""
+        scores = np.asarray(scores, dtype=np.float64)
+        low, high = float(np.nanmin(scores)), float(np.nanmax(scores))
+        return cls(low, high)
+
+    @classmethod
+    def load(cls, path: str = PATH_SBERT_CALIBRATION) -> "ScoreCalibration":
+        """
+        Loads the saved calibration. Without one, the identity: matrices written before
+        calibration existed were normalized to 0-1, and the post similarity job makes
+        them raw (`migrate_sbert_calibration`) before adding any raw rows.
+        """
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def save(self, path: str = PATH_SBERT_CALIBRATION):
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "min_score": self.min,
+                    "max_score": self.max,
+                    "observed_min": self.observed_min,
+                    "observed_max": self.observed_max,
+                },
+                f,
+            )
+
+    def observe(self, scores):
+        """Updates the running statistics with the scores of changed rows."""
+        scores = np.asarray(scores, dtype=np.float64)
+        if scores.size == 0:
+            return
+        self.observed_min = min(self.observed_min, float(np.nanmin(scores)))
+        self.observed_max = max(self.observed_max, float(np.nanmax(scores)))
+
+    def drifted(self) -> bool:
+        """Whether the observed range left the calibrated one by more than `threshold`."""
+        tolerance = self.threshold * (self.max - self.min)
+        return (
+            self.observed_min < self.min - tolerance
+            or self.observed_max > self.max + tolerance
+        )
+
+    def refit(self, scores):
+        """Full renormalisation: recalibrates to the range of the whole matrix."""
+        fitted = ScoreCalibration.from_scores(scores)
+        self.min = self.observed_min = fitted.min
+        self.max = self.observed_max = fitted.max
+
+    def rescale(self, scores):
+        """Calibrated 0-1 scores (arrays or DataFrames); no copy of the stored matrix."""
+        return (scores - self.min) / (self.max - self.min + EPSILON)
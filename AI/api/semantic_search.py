@@ -0,0 +1,357 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from constants import (
+    PATH_POSTS_CSV,
+    PATH_SBERT_MATRIX,
+    PATH_LEXICAL_INDEX,
+    PATH_SEARCH_INDEX,
+    HYBRID_CANDIDATES,
+    HYBRID_WEIGHT_LEXICAL,
+    HYBRID_WEIGHT_SEMANTIC,
+    SEARCH_MAX_BATCH_SIZE,
+    SEARCH_MAX_WAIT_MS,
+    SEARCH_QUERY_CACHE_SIZE,
+)
+from embedding_quantization import QuantizedEmbeddings
+from index_generations import GenerationStore
+from lexical_index import LexicalIndex
+from sbert_encoders import get_sbert_encoder
+from observability import BATCH_SIZE, CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def publish_search_index(store: GenerationStore = None) -> str:
+    """
+    Publishes the saved embeddings, post IDs and lexical index as a new generation of
+    the shared search index (run by the job process after the posts change).
+
+    Returns:
+        str: The generation name, or None if the posts and embeddings are out of step.
+    """
+    import pandas as pd  # Only needed by the job process, keeps it off the API import path
+
+    store = store or GenerationStore()
+    embeddings = QuantizedEmbeddings.load(PATH_SBERT_MATRIX)
+    post_ids = pd.read_csv(PATH_POSTS_CSV, usecols=["PostId"])["PostId"]
+    post_ids = post_ids.astype(str).to_numpy(dtype=str)
+
+    if len(post_ids) != len(embeddings):
+        logger.warning(
+            "Search index not published, posts and embeddings differ",
+            extra={"posts": len(post_ids), "embeddings": len(embeddings)},
+        )
+        return None
+
+    arrays = {"post_ids": post_ids, "embeddings": embeddings.data}
+    if embeddings.scales is not None:
+        arrays["scales"] = embeddings.scales
+
+    if os.path.exists(PATH_LEXICAL_INDEX):
+        lexical_index = LexicalIndex.load(PATH_LEXICAL_INDEX)
+        if lexical_index.n_docs == len(post_ids):
+            arrays.update(lexical_index.arrays())
+        else:
+            logger.warning("Lexical index is out of date, publishing semantic only")
+
+    name = store.publish(arrays, {"precision": embeddings.precision})
+    logger.info(
+        "Search index published", extra={"generation": name, "posts": len(post_ids)}
+    )
+    return name
+
+
+class SemanticSearchIndex:
+    """
+    Warm, pre-normalized SBERT index over all posts, plus the BM25 lexical index
+    used for hybrid retrieval.
+
+    Rows of the embedding matrix and lexical postings follow the order of the posts CSV.
+    The arrays are memory-mapped from the current generation of the shared search index
+    (see `publish_search_index`), so API workers share one copy, and are switched when
+    a new generation is published.
+    """
+
+    def __init__(self, directory: str = PATH_SEARCH_INDEX):
+        self.store = GenerationStore(directory) if directory else None
+        self._lock = threading.Lock()
+        # (version, post_ids, embeddings, lexical_index), swapped atomically
+        self._snapshot = None
+
+    @classmethod
+    def from_arrays(
+        cls, post_ids, embeddings, lexical_index: LexicalIndex = None
+    ) -> "SemanticSearchIndex":
+        """Builds an index from in-memory data instead of files (benchmarks)."""
+        index = cls(directory=None)
+        if not isinstance(embeddings, QuantizedEmbeddings):
+            embeddings = QuantizedEmbeddings.from_float(embeddings, "float32")
+        post_ids = np.asarray(post_ids, dtype=object)
+        index._snapshot = (None, post_ids, embeddings, lexical_index)
+        return index
+
+    def refresh_if_stale(self):
+        """Attaches to the current generation if a newer one was published."""
+        if self.store is None:
+            return
+
+        version = self.store.version()
+        if version is None:
+            return  # Nothing published yet, keep whatever is loaded
+
+        if self._snapshot is not None and self._snapshot[0] == version:
+            return
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot[0] == version:
+                return
+
+            generation = self.store.current()
+            try:
+                meta, arrays = self.store.open(generation)
+            except OSError:
+                # Pruned between reading CURRENT and opening it, retry on the next call
+                logger.warning(
+                    "Search index generation vanished", extra={"generation": generation}
+                )
+                return
+
+            embeddings = QuantizedEmbeddings(
+                arrays["embeddings"], arrays.get("scales"), meta["precision"]
+            )
+            lexical_index = None
+            if "lexical_terms" in arrays:
+                lexical_index = LexicalIndex.from_arrays(arrays)
+
+            self._snapshot = (version, arrays["post_ids"], embeddings, lexical_index)
+            logger.info(
+                "Search index attached",
+                extra={"generation": generation, "posts": len(arrays["post_ids"])},
+            )
+
+    def search(self, query_embeddings: np.ndarray, top_k: int) -> list[list[tuple]]:
+        """
+        Returns the top-k (post_id, score) pairs for each query, best first.
+        Uses argpartition so only the k best rows are sorted.
+        """
+        if self._snapshot is None:
+            return [[] for _ in range(len(query_embeddings))]
+
+        _, post_ids, embeddings, _ = self._snapshot
+        if len(post_ids) == 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        similarities = embeddings.cosine_similarity(query_embeddings)
+
+        results = []
+        for row in similarities:
+            top = top_k_indices(row, top_k)
+            results.append([(str(post_ids[i]), float(row[i])) for i in top])
+        return results
+
+    def search_hybrid(
+        self, query: str, query_embedding: np.ndarray, top_k: int
+    ) -> list[tuple]:
+        """
+        Fuses BM25 and SBERT scores for a single query.
+
+        Candidates are read from the postings of the query terms; only those posts get a
+        dense score. If the postings yield fewer than top_k posts, the dense top-k from a
+        full scan is added to the candidates. Returns (post_id, fused_score), best first.
+        """
+        if self._snapshot is None:
+            return []
+
+        _, post_ids, embeddings, lexical_index = self._snapshot
+        if lexical_index is None:
+            return self.search(query_embedding.reshape(1, -1), top_k)[0]
+
+        candidates, lexical_scores = lexical_index.search(
+            query, max(HYBRID_CANDIDATES, top_k)
+        )
+
+        if len(candidates) < top_k:
+            dense_top = top_k_indices(
+                embeddings.cosine_similarity(query_embedding)[0], top_k
+            )
+            extra = np.setdiff1d(dense_top, candidates)
+            candidates = np.concatenate([candidates, extra]).astype(np.int64)
+            lexical_scores = np.concatenate(
+                [lexical_scores, np.zeros(len(extra), dtype=np.float32)]
+            )
+
+        if len(candidates) == 0:
+            return []
+
+        dense_scores = embeddings.take_rows(candidates).cosine_similarity(
+            query_embedding
+        )[0]
+
+        max_lexical = lexical_scores.max()
+        if max_lexical > 0:
+            lexical_scores = lexical_scores / max_lexical
+
+        fused = (
+            HYBRID_WEIGHT_LEXICAL * lexical_scores
+            + HYBRID_WEIGHT_SEMANTIC * dense_scores
+        )
+
+        top = top_k_indices(fused, top_k)
+        return [(str(post_ids[candidates[i]]), float(fused[i])) for i in top]
+
+
+class SemanticSearchService:
+    """
+    Answers free-text search queries against a SemanticSearchIndex.
+
+    Concurrent queries are collected for up to SEARCH_MAX_WAIT_MS (or until
+    SEARCH_MAX_BATCH_SIZE are waiting) and handled together: one encoder call for the
+    uncached texts and one similarity product for the whole batch, run off the event loop.
+    Query embeddings are kept in a small LRU cache.
+
+    Modes: "semantic" ranks by SBERT cosine only, "hybrid" fuses BM25 and SBERT scores.
+    """
+
+    def __init__(
+        self,
+        index: SemanticSearchIndex = None,
+        encoder=None,
+        max_batch_size: int = SEARCH_MAX_BATCH_SIZE,
+        max_wait_ms: float = SEARCH_MAX_WAIT_MS,
+        cache_size: int = SEARCH_QUERY_CACHE_SIZE,
+    ):
+        self.index = index or SemanticSearchIndex()
+        self._encoder = encoder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending = []  # (query, top_k, mode, future)
+        self._flush_handle = None
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            self._encoder = get_sbert_encoder()
+        return self._encoder
+
+    def warm_up(self):
+        """Loads the index and the encoder so the first query does not pay for it."""
+        self.index.refresh_if_stale()
+        self.encoder.encode(["warm up"])
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    async def search(self, query: str, top_k: int, mode="semantic") -> list[tuple]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((self._normalize_query(query), top_k, mode, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush(loop, immediately=True)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop)
+
+        return await future
+
+    def _schedule_flush(self, loop, immediately=False):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if immediately:
+            loop.create_task(self._flush())
+        else:
+            self._flush_handle = loop.call_later(
+                self.max_wait, lambda: loop.create_task(self._flush())
+            )
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch = self._pending[: self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size :]
+        if not batch:
+            return
+        BATCH_SIZE.labels("search").observe(len(batch))
+
+        if self._pending:
+            # More queries are waiting than fit in one batch, handle them right after
+            self._schedule_flush(asyncio.get_running_loop(), immediately=True)
+
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, self._search_batch, [request[:3] for request in batch]
+            )
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _search_batch(self, requests: list[tuple]) -> list[list[tuple]]:
+        self.index.refresh_if_stale()
+
+        queries = [q for q, _, _ in requests]
+        embeddings = self._embed_queries(queries)
+
+        # All semantic queries share one similarity product
+        semantic = [i for i, (_, _, mode) in enumerate(requests) if mode == "semantic"]
+        results = [None] * len(requests)
+        if semantic:
+            max_k = max(requests[i][1] for i in semantic)
+            for i, result in zip(
+                semantic, self.index.search(embeddings[semantic], max_k)
+            ):
+                results[i] = result[: requests[i][1]]
+
+        for i, (query, top_k, mode) in enumerate(requests):
+            if mode == "hybrid":
+                results[i] = self.index.search_hybrid(query, embeddings[i], top_k)
+
+        return results
+
+    def _embed_queries(self, queries: list[str]) -> np.ndarray:
+        """Embeds the queries, encoding only the ones missing from the LRU cache."""
+        embedded = {}
+        missing = []
+
+        with self._cache_lock:
+            for query in dict.fromkeys(queries):
+                if query in self._cache:
+                    self._cache.move_to_end(query)
+                    embedded[query] = self._cache[query]
+                else:
+                    missing.append(query)
+
+        CACHE_LOOKUPS.labels("search_query", "hit").inc(len(embedded))
+        CACHE_LOOKUPS.labels("search_query", "miss").inc(len(missing))
+        if missing:
+            new_embeddings = self.encoder.encode(missing)
+            with self._cache_lock:
+                for query, embedding in zip(missing, new_embeddings):
+                    embedded[query] = embedding
+                    self._cache[query] = embedding
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return np.vstack([embedded[q] for q in queries])
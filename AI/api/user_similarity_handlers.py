@@ -1,3 +1,4 @@
+import logging
 import numpy as np
 import pandas as pd
 from collections import defaultdict
@@ -8,8 +9,16 @@ from constants import (
     PATH_SIMILARITY_MATRIX_SBERT,
     PATH_SIMILARITY_MATRIX_TFIDF,
 )
-from database_operations import get_post_user_mapping, get_user_followings_map
+from fallback_lists import write_fallback_users
+from follow_graph import FollowGraph, load_follow_graph
+from friends_of_friends import friends_of_friends
+from config import USER_SIMILARITY_GRAPH_WEIGHT
 import redis
+from list_versions import list_fingerprint, lists_changed, mark_lists_updated
+from observability import stage, execute_redis_pipeline
+from score_calibration import ScoreCalibration
+
+logger = logging.getLogger(__name__)
 
 # Connect to Redis
 redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
@@ -18,27 +27,22 @@ redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=T
 def compute_user_similarity_scores(
     tfidf_sim_matrix: pd.DataFrame,
     sbert_sim_matrix: pd.DataFrame,
-) -> dict[str, list[str]]:
+    graph: FollowGraph,
+) -> dict[str, dict[str, float]]:
     """
-    Computes the top-N most similar users for each user, based on average post similarity,
-    excluding the users they follow.
+    Scores each pair of users with posts by their average post similarity, excluding
+    the users they follow.
 
     Returns:
-        dict: A mapping of user_id -> list of top similar user_ids.
+        dict: A mapping of user_id -> {other user_id: average combined similarity}.
     """
-    # Load post-to-user mapping
-    post_user_map = get_post_user_mapping()
-    users_and_followed_ids = get_user_followings_map()
-
-    users_and_their_posts = defaultdict(list)
-
     # Group posts by user
-    for post_id, user_id in post_user_map.items():
-        users_and_their_posts[user_id].append(post_id)
+    users_and_their_posts = graph.posts_by_user()
 
-    # Compute combined similarity matrix
-    combined_sim_matrix = (
-        WEIGHT_TFIDF * tfidf_sim_matrix + WEIGHT_SBERT * sbert_sim_matrix
+    # Compute combined similarity matrix, with SBERT scores calibrated to 0-1
+    calibration = ScoreCalibration.load()
+    combined_sim_matrix = WEIGHT_TFIDF * tfidf_sim_matrix + WEIGHT_SBERT * (
+        calibration.rescale(sbert_sim_matrix)
     )
 
     user_similarity_scores = defaultdict(dict)
@@ -47,7 +51,7 @@ def compute_user_similarity_scores(
 
     for user_a in user_ids:
         posts_a = users_and_their_posts[user_a]
-        followed_users = users_and_followed_ids.get(user_a, set())
+        followed_users = set(graph.followed(user_a).tolist())
 
         for user_b in user_ids:
             # exclude users they follow already and themselves
@@ -70,14 +74,58 @@ def compute_user_similarity_scores(
                 avg_sim = np.mean(sim_scores)
                 user_similarity_scores[user_a][user_b] = avg_sim
 
-    # Select top-N similar users for each user
-    top_similar_users = {}
+    return user_similarity_scores
 
-    for user_id, similarities in user_similarity_scores.items():
-        sorted_users = sorted(similarities.items(), key=lambda x: -x[1])[
+
+def blend_user_similarities(
+    content_scores: dict[str, dict[str, float]], graph: FollowGraph
+) -> dict[str, list[str]]:
+    """
+    Selects the top-N similar users of each user from the content scores blended with
+    the friends-of-friends scores (USER_SIMILARITY_GRAPH_WEIGHT). Both are divided by
+    the user's best score first, so the weight is the share each side gets. Users
+    without posts get the friends-of-friends candidates alone.
+
+    Returns:
+        dict: A mapping of user_id -> list of top similar user_ids.
+    """
+    weight = USER_SIMILARITY_GRAPH_WEIGHT
+    candidates = np.empty((len(graph.user_ids), 0), dtype=np.int32)
+    scores = np.empty((len(graph.user_ids), 0), dtype=np.float32)
+    if weight > 0:
+        with stage("users", "friends_of_friends") as s:
+            candidates, scores = friends_of_friends(graph)
+            s.rows = int((candidates[:, 0] >= 0).sum()) if candidates.size else 0
+
+    top_similar_users = {}
+    for user, row, row_scores in zip(graph.user_ids.tolist(), candidates, scores):
+        found = row >= 0
+        content = content_scores.get(user)
+        if not content:
+            # Follow graph only: candidates are already best first
+            if found.any():
+                top_similar_users[user] = graph.user_ids[
+                    row[found][:TOP_N_SIMILAR_USERS]
+                ].tolist()
+            continue
+        # On the scale of the friends-of-friends scores: the row's best is 1
+        best = max(content.values())
+        scale = (1 - weight) / best if best > 0 else 1 - weight
+        blended = {other: scale * score for other, score in content.items()}
+        for other, score in zip(graph.user_ids[row[found]].tolist(), row_scores[found]):
+            blended[other] = blended.get(other, 0.0) + weight * float(score)
+        sorted_users = sorted(blended.items(), key=lambda x: -x[1])[
             :TOP_N_SIMILAR_USERS
         ]
-        top_similar_users[user_id] = [user for user, _ in sorted_users]
+        top_similar_users[user] = [other for other, _ in sorted_users]
+
+    # Users with posts that the graph does not know yet
+    for user, content in content_scores.items():
+        if user not in top_similar_users and content:
+            sorted_users = sorted(content.items(), key=lambda x: -x[1])
+            top_similar_users[user] = [
+                other for other, _ in sorted_users[:TOP_N_SIMILAR_USERS]
+            ]
 
     return top_similar_users
 
@@ -99,31 +147,60 @@ def store_user_similarities_in_redis(user_sim_map: dict[str, list[str]]):
         value = ",".join(similar_users)
         pipeline.set(key, value)
 
-    pipeline.execute()
-    print("✅ Stored user similarities in Redis.")
+    # Every list is rewritten, the version only moves if one of them changed
+    fingerprint = list_fingerprint(
+        f"{user_id}={','.join(similar_users)}"
+        for user_id, similar_users in sorted(user_sim_map.items())
+    )
+    if lists_changed(redis_client, "similar_users", fingerprint):
+        mark_lists_updated(pipeline, "similar_users", fingerprint=fingerprint)
+    execute_redis_pipeline(pipeline, "users")
+    logger.info("Stored user similarities in Redis", extra={"users": len(user_sim_map)})
 
 
 def update_similarity_for_users():
     """
-    Recomputes and updates top-N similar users based on post similarity matrices.
+    Recomputes and updates top-N similar users based on post similarity matrices and
+    the follow graph.
     """
     try:
-        # Load similarity matrices
-        tfidf_sim_matrix = pd.read_csv(PATH_SIMILARITY_MATRIX_TFIDF, index_col=0)
-        sbert_sim_matrix = pd.read_csv(PATH_SIMILARITY_MATRIX_SBERT, index_col=0)
-
-        # Ensure both matrices are aligned (same post IDs)
-        post_ids = tfidf_sim_matrix.index.tolist()
-        tfidf_sim_matrix = tfidf_sim_matrix.loc[post_ids, post_ids]
-        sbert_sim_matrix = sbert_sim_matrix.loc[post_ids, post_ids]
-
-        # Compute user similarity map
-        user_sim_map = compute_user_similarity_scores(
-            tfidf_sim_matrix, sbert_sim_matrix
-        )
-
-        # Store in Redis
-        store_user_similarities_in_redis(user_sim_map)
-
-    except Exception as e:
-        print(f"❌ Error updating user similarity: {e}")
+        with stage("users", "tick") as tick:
+            # Load similarity matrices
+            with stage("users", "read_csv") as s:
+                tfidf_sim_matrix = pd.read_csv(
+                    PATH_SIMILARITY_MATRIX_TFIDF, index_col=0
+                )
+                sbert_sim_matrix = pd.read_csv(
+                    PATH_SIMILARITY_MATRIX_SBERT, index_col=0
+                )
+                s.rows = len(tfidf_sim_matrix)
+
+            # Ensure both matrices are aligned (same post IDs)
+            post_ids = tfidf_sim_matrix.index.tolist()
+            tfidf_sim_matrix = tfidf_sim_matrix.loc[post_ids, post_ids]
+            sbert_sim_matrix = sbert_sim_matrix.loc[post_ids, post_ids]
+
+            # Follow graph and post authors, updated from the rows added since the last run
+            with stage("users", "fetch_graph") as s:
+                graph = load_follow_graph()
+                s.rows = graph.n_posts
+
+            # Compute user similarity map
+            with stage("users", "compute_similarity") as s:
+                content_scores = compute_user_similarity_scores(
+                    tfidf_sim_matrix, sbert_sim_matrix, graph
+                )
+                s.rows = len(content_scores)
+            user_sim_map = blend_user_similarities(content_scores, graph)
+
+            # Store in Redis
+            store_user_similarities_in_redis(user_sim_map)
+            tick.rows = len(user_sim_map)
+
+            # Most followed users, served to users left without a list
+            with stage("users", "fallback") as s:
+                write_fallback_users(graph)
+                s.rows = graph.n_follows
+
+    except Exception:
+        logger.exception("Error updating user similarity")
@@ -1,3 +1,4 @@
+import logging
 from sqlalchemy import create_engine, text
 import urllib
 import pandas as pd
@@ -13,16 +14,18 @@ DATABASE_URL = f"mssql+pyodbc:///?odbc_connect={params}"
 
 engine = create_engine(DATABASE_URL)
 
+logger = logging.getLogger(__name__)
+
 
 def test_connection():
     """Test the connection to the database and return a success message."""
     try:
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
-            print("✅ SQLAlchemy Connection Successful!")
+            logger.info("SQLAlchemy connection successful")
             return True
-    except Exception as e:
-        print(f"❌ SQLAlchemy Connection Failed: {e}")
+    except Exception:
+        logger.exception("SQLAlchemy Connection Failed")
         return False
 
 
@@ -31,23 +34,23 @@ def update_posts_csv_from_db():
     try:
         path = "../api/data/posts.csv"
         with engine.connect() as conn:
-            query = text("SELECT PostId, Caption, Body FROM Posts")
+            query = text("SELECT PostId, Caption, Body, Location, Tags FROM Posts")
             df = pd.read_sql(query, conn)
             df.to_csv(path, index=False)
-            print(f"✅ CSV updated successfully: {path}")
-    except Exception as e:
-        print(f"❌ Failed to fetch data: {e}")
+            logger.info("Posts CSV updated", extra={"path": path})
+    except Exception:
+        logger.exception("Failed to fetch data")
 
 
 def fetch_posts_from_db():
     """Fetch posts from SQL Server and return as DataFrame."""
     try:
         with engine.connect() as conn:
-            query = text("SELECT PostId, Caption, Body FROM Posts")
+            query = text("SELECT PostId, Caption, Body, Location, Tags FROM Posts")
             df = pd.read_sql(query, conn)
             return df
-    except Exception as e:
-        print(f"❌ Failed to fetch data: {e}")
+    except Exception:
+        logger.exception("Failed to fetch data")
         return None
 
 
@@ -67,7 +70,9 @@ def remove_post_from_similarity_matrix(
 
         # Check if the post ID exists
         if post_id not in df_similarity.index:
-            print(f"⚠️ Post ID {post_id} not found in similarity matrix.")
+            logger.warning(
+                "Post not found in similarity matrix", extra={"post_id": post_id}
+            )
             return
 
         # Drop the row and column
@@ -77,18 +82,16 @@ def remove_post_from_similarity_matrix(
         # Save the updated similarity matrix
         df_similarity.to_csv(path_similarity)
 
-        print(
-            f"✅ Successfully removed post {post_id} from similarity matrix and Redis."
-        )
+        logger.info("Removed post from similarity matrix", extra={"post_id": post_id})
 
-    except Exception as e:
-        print(f"❌ Error removing post {post_id}: {e}")
+    except Exception:
+        logger.exception("Error removing post", extra={"post_id": post_id})
 
 
 def get_similarity_between_posts(
     post_id1, post_id2, similarity_matrix_path="../api/data/posts_similarity_matrix.csv"
 ):
-    """Fetch and print the similarity score between two posts."""
+    """Fetch and log the similarity score between two posts."""
 
     # Load the similarity matrix
     df_similarity = pd.read_csv(similarity_matrix_path, index_col=0)
@@ -98,51 +101,26 @@ def get_similarity_between_posts(
         str(post_id1) not in df_similarity.index
         or str(post_id2) not in df_similarity.columns
     ):
-        print(
-            f"❌ One or both Post IDs ({post_id1}, {post_id2}) not found in the similarity matrix."
+        logger.error(
+            "One or both post IDs not found in the similarity matrix",
+            extra={"post_id1": post_id1, "post_id2": post_id2},
         )
         return None
 
     # Retrieve similarity score
     similarity_score = df_similarity.loc[str(post_id1), str(post_id2)]
 
-    print(
-        f"🔍 Similarity between Post {post_id1} and Post {post_id2}: {similarity_score:.4f}"
+    logger.info(
+        "Similarity between posts",
+        extra={
+            "post_id1": post_id1,
+            "post_id2": post_id2,
+            "similarity": round(float(similarity_score), 4),
+        },
     )
     return similarity_score
 
 
-def normalize_similarity_matrix(
-    matrix: pd.DataFrame, new_ids: list = None
-) -> pd.DataFrame:
-    """
-    Normalizes the similarity matrix to a 0-1 range using the global min and max values.
-
-    Args:
-        matrix (pd.DataFrame): The similarity matrix.
-        new_ids (list, optional): If provided, only normalizes the specified rows and columns.
-
-    Returns:
-        pd.DataFrame: The normalized similarity matrix.
-    """
-    # Calculate global min and max values
-    min_val = matrix.min().min()
-    max_val = matrix.max().max()
-    epsilon = 1e-9  # Prevent division by zero
-
-    if new_ids:
-        # Normalize only the specified rows and columns using the global min/max
-        matrix.loc[new_ids] = (matrix.loc[new_ids] - min_val) / (
-            max_val - min_val + epsilon
-        )
-        matrix[new_ids] = (matrix[new_ids] - min_val) / (max_val - min_val + epsilon)
-    else:
-        # Normalize the entire matrix using the global min/max
-        matrix = (matrix - min_val) / (max_val - min_val + epsilon)
-
-    return matrix
-
-
 # get_similarity_between_posts(
 #     "11d04796-eb9c-4b04-bd5b-a5fcd3898248", "fa23b1aa-3c25-42ef-ac1f-d2082ead5461"
 # )
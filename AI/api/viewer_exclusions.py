@@ -0,0 +1,62 @@
+import logging
+import redis
+from database_operations import get_user_excluded_posts
+from list_versions import list_fingerprint, lists_changed, mark_lists_updated
+from observability import stage, execute_redis_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Connect to Redis
+redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
+
+WRITE_BATCH_SIZE = 1000  # Users written per pipeline round-trip
+
+
+def refresh_viewer_exclusions():
+    """
+    Rebuilds `excluded_posts:{user_id}`, the Redis set of posts each user wrote, liked
+    or saved, which GET /similar-posts/{post_id}?viewer_id=... filters out.
+
+    Each set is written under a staging key and renamed into place, so readers see
+    either the old or the new set, never a partial one. Sets of users who no longer
+    have any such post are removed.
+    """
+    with stage("viewer_exclusions", "fetch") as s:
+        excluded = get_user_excluded_posts()
+        if excluded is None:
+            return  # Keep the current sets rather than wiping them
+        s.rows = len(excluded)
+
+    with stage("viewer_exclusions", "redis_update") as s:
+        stale_keys = {
+            key
+            for key in redis_client.scan_iter(match="excluded_posts:*", count=1000)
+            if not key.endswith(":staging")
+        }
+
+        pipeline = redis_client.pipeline(transaction=False)
+        for i, (user_id, post_ids) in enumerate(excluded.items(), start=1):
+            key = f"excluded_posts:{user_id}"
+            pipeline.delete(f"{key}:staging")
+            pipeline.sadd(f"{key}:staging", *post_ids)
+            pipeline.rename(f"{key}:staging", key)
+            stale_keys.discard(key)
+            if i % WRITE_BATCH_SIZE == 0:
+                execute_redis_pipeline(pipeline, "viewer_exclusions")
+                pipeline = redis_client.pipeline(transaction=False)
+
+        for key in stale_keys:
+            pipeline.delete(key)
+        fingerprint = list_fingerprint(
+            f"{user_id}={','.join(sorted(post_ids))}"
+            for user_id, post_ids in sorted(excluded.items())
+        )
+        if lists_changed(redis_client, "viewer_exclusions", fingerprint):
+            mark_lists_updated(pipeline, "viewer_exclusions", fingerprint=fingerprint)
+        execute_redis_pipeline(pipeline, "viewer_exclusions")
+        s.rows = len(excluded)
+
+    logger.info(
+        "Viewer exclusion sets refreshed",
+        extra={"users": len(excluded), "removed": len(stale_keys)},
+    )
@@ -1,4 +1,7 @@
-﻿using System.Text.Json;
+﻿using System.Collections.Concurrent;
+using System.Net;
+using System.Net.Http.Headers;
+using System.Text.Json;
 using Microsoft.Extensions.Options;
 using BackendAPI.Models;
 using BackendAPI.DTOs.FastApiRelated.FastApiService;
@@ -14,6 +17,15 @@ namespace BackendAPI.Services
             PropertyNameCaseInsensitive = true
         };
 
+        // Similar posts/users responses by URL: reused while fresh (Cache-Control max-age),
+        // otherwise revalidated with their ETag, so an unchanged list is not sent again
+        private static readonly ConcurrentDictionary<string, CachedListResponse> _listCache = new();
+        private const int ListCacheCapacity = 10000;
+        private const int ListCacheEvictionBatch = ListCacheCapacity / 10;
+
+        private sealed record CachedListResponse(
+            string Body, EntityTagHeaderValue? ETag, DateTimeOffset FreshUntil, DateTimeOffset StoredAt);
+
         public FastApiService(HttpClient httpClient, IOptions<FastApiSettings> fastApiSettings)
         {
             _httpClient = httpClient;
@@ -25,14 +37,7 @@ namespace BackendAPI.Services
             try
             {
                 string fastApiUrl = $"{_fastApiBaseUrl}/similar-posts/{postId}";
-                HttpResponseMessage response = await _httpClient.GetAsync(fastApiUrl);
-
-                if (!response.IsSuccessStatusCode)
-                {
-                    throw new Exception($"Failed to fetch similar posts. Status: {response.StatusCode}");
-                }
-
-                string responseContent = await response.Content.ReadAsStringAsync();
+                string responseContent = await GetListAsync(fastApiUrl, "similar posts");
 
                 return JsonSerializer.Deserialize<SimilarPostsFastApiResponseDTO>(responseContent, _jsonOptions);
             }
@@ -47,20 +52,87 @@ namespace BackendAPI.Services
             try
             {
                 string fastApiUrl = $"{_fastApiBaseUrl}/similar-users/{userId}";
-                HttpResponseMessage response = await _httpClient.GetAsync(fastApiUrl);
+                string responseContent = await GetListAsync(fastApiUrl, "similar users");
 
-                if (!response.IsSuccessStatusCode)
+                return JsonSerializer.Deserialize<SimilarUsersFastApiResponseDTO>(responseContent, _jsonOptions);
+            }
+            catch (Exception ex)
+            {
+                throw new Exception($"Error: {ex.Message}");
+            }
+        }
+
+        private async Task<string> GetListAsync(string url, string listName)
+        {
+            _listCache.TryGetValue(url, out CachedListResponse? cached);
+            if (cached != null && cached.FreshUntil > DateTimeOffset.UtcNow)
+            {
+                return cached.Body;
+            }
+
+            using var request = new HttpRequestMessage(HttpMethod.Get, url);
+            if (cached?.ETag != null)
+            {
+                request.Headers.IfNoneMatch.Add(cached.ETag);
+            }
+
+            using HttpResponseMessage response = await _httpClient.SendAsync(request);
+
+            string body;
+            if (response.StatusCode == HttpStatusCode.NotModified && cached != null)
+            {
+                body = cached.Body;
+            }
+            else if (!response.IsSuccessStatusCode)
+            {
+                throw new Exception($"Failed to fetch {listName}. Status: {response.StatusCode}");
+            }
+            else
+            {
+                body = await response.Content.ReadAsStringAsync();
+            }
+
+            TimeSpan maxAge = response.Headers.CacheControl?.MaxAge ?? TimeSpan.Zero;
+            EntityTagHeaderValue? etag = response.Headers.ETag ?? cached?.ETag;
+            if (etag != null || maxAge > TimeSpan.Zero)
+            {
+                if (_listCache.Count >= ListCacheCapacity)
                 {
-                    throw new Exception($"Failed to fetch similar users. Status: {response.StatusCode}");
+                    EvictListCacheEntries();
                 }
+                DateTimeOffset now = DateTimeOffset.UtcNow;
+                _listCache[url] = new CachedListResponse(body, etag, now + maxAge, now);
+            }
 
-                string responseContent = await response.Content.ReadAsStringAsync();
+            return body;
+        }
 
-                return JsonSerializer.Deserialize<SimilarUsersFastApiResponseDTO>(responseContent, _jsonOptions);
+        // Drops the stale entries that cannot be revalidated (no ETag), then the least
+        // recently stored ones, a batch at a time so a full cache is not sorted on every miss
+        private static void EvictListCacheEntries()
+        {
+            DateTimeOffset now = DateTimeOffset.UtcNow;
+            foreach (KeyValuePair<string, CachedListResponse> entry in _listCache)
+            {
+                if (entry.Value.ETag == null && entry.Value.FreshUntil <= now)
+                {
+                    _listCache.TryRemove(entry);
+                }
             }
-            catch (Exception ex)
+
+            int excess = _listCache.Count - ListCacheCapacity + ListCacheEvictionBatch;
+            if (excess <= 0)
             {
-                throw new Exception($"Error: {ex.Message}");
+                return;
+            }
+
+            List<KeyValuePair<string, CachedListResponse>> oldest = _listCache
+                .OrderBy(entry => entry.Value.StoredAt)
+                .Take(excess)
+                .ToList();
+            foreach (KeyValuePair<string, CachedListResponse> entry in oldest)
+            {
+                _listCache.TryRemove(entry);
             }
         }
 